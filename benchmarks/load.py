@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Concurrent mixed-traffic load test with per-route throughput and latency percentiles
+
+    python -m benchmarks.load                                          # in-process ASGI app, 10k seeded users
+    python -m benchmarks.load --mix user_enrollments=70,enroll=20,complete=10 --concurrency 64 --duration 30
+    python -m benchmarks.load --server                                 # same, through a local uvicorn on a free port
+    python -m benchmarks.load --url http://127.0.0.1:8000 --users 1 --courses 1 --enrollments 1
+
+In-process and --server runs seed a fresh backend with --users users first.
+Against --url, --users, --courses and --enrollments must describe the
+server's data, since IDs are drawn from 1..N; the last example targets a
+server holding only the example data.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import socket
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+
+from benchmarks.seed import SeedSizes, default_sizes, seed_database, use_database
+from services.database import Database
+
+DEFAULT_MIX = "user_enrollments=70,enroll=20,complete=10"
+
+
+class Request(NamedTuple):
+    route: str  # route template the request is reported under
+    method: str
+    path: str
+    params: Optional[Dict] = None
+    body: Optional[Dict] = None
+
+
+class Workload:
+    """Builds requests for the named operations, drawing IDs from the seeded ranges.
+
+    Enrollments created during the run are remembered so completions can
+    target them as well as seeded ones.
+    """
+    
+    def __init__(self, sizes: SeedSizes):
+        self.sizes = sizes
+        self.created_enrollments: List[int] = []
+        self.operations: Dict[str, Callable[[random.Random], Request]] = {
+            "user_enrollments": lambda rng: Request(
+                "GET /enrollments/user/{user_id}", "GET", f"/enrollments/user/{self._user(rng)}"
+            ),
+            "course_enrollments": lambda rng: Request(
+                "GET /enrollments/course/{course_id}", "GET", f"/enrollments/course/{self._course(rng)}"
+            ),
+            "get_user": lambda rng: Request("GET /users/{user_id}", "GET", f"/users/{self._user(rng)}"),
+            "get_course": lambda rng: Request("GET /courses/{course_id}", "GET", f"/courses/{self._course(rng)}"),
+            "course_stats": lambda rng: Request(
+                "GET /courses/{course_id}/stats", "GET", f"/courses/{self._course(rng)}/stats"
+            ),
+            "list_enrollments": lambda rng: Request(
+                "GET /enrollments/", "GET", "/enrollments/", params={"course_id": self._course(rng), "limit": 50}
+            ),
+            "search_users": lambda rng: Request(
+                "GET /users/search", "GET", "/users/search", params={"q": rng.choice(("gra", "ada tur", "zulu", "ngo"))}
+            ),
+            "top_courses": lambda rng: Request("GET /courses/top", "GET", "/courses/top"),
+            "enroll": lambda rng: Request(
+                "POST /enrollments/", "POST", "/enrollments/",
+                body={"user_id": self._user(rng), "course_id": self._course(rng)}
+            ),
+            "complete": self._complete,
+        }
+    
+    def _user(self, rng: random.Random) -> int:
+        return rng.randint(1, self.sizes.users)
+    
+    def _course(self, rng: random.Random) -> int:
+        return rng.randint(1, self.sizes.courses)
+    
+    def _complete(self, rng: random.Random) -> Request:
+        if self.created_enrollments and rng.random() < 0.5:
+            enrollment_id = rng.choice(self.created_enrollments)
+        else:
+            enrollment_id = rng.randint(1, self.sizes.enrollments)
+        return Request(
+            "PATCH /enrollments/{enrollment_id}/complete", "PATCH", f"/enrollments/{enrollment_id}/complete"
+        )
+    
+    def parse_mix(self, mix: str) -> Tuple[List[str], List[float]]:
+        """Parse "name=weight,..." into operation names and weights"""
+        names, weights = [], []
+        for part in mix.split(","):
+            name, _, weight = part.partition("=")
+            name = name.strip()
+            if name not in self.operations:
+                raise ValueError(f"Unknown operation {name!r}; choose from {', '.join(self.operations)}")
+            names.append(name)
+            weights.append(float(weight or 1))
+        return names, weights
+
+
+class RouteStats(NamedTuple):
+    route: str
+    requests: int
+    errors: int
+    statuses: Dict[str, int]
+    throughput: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    max_ms: float
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(route: str, latencies: List[float], statuses: Dict[int, int], elapsed: float) -> RouteStats:
+    latencies = sorted(latencies)
+    return RouteStats(
+        route=route,
+        requests=len(latencies),
+        errors=sum(count for status, count in statuses.items() if status >= 400),
+        statuses={str(status): count for status, count in sorted(statuses.items())},
+        throughput=round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        p50_ms=round(percentile(latencies, 0.50) * 1000, 2),
+        p95_ms=round(percentile(latencies, 0.95) * 1000, 2),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 2),
+        mean_ms=round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        max_ms=round(latencies[-1] * 1000, 2) if latencies else 0.0
+    )
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    workload: Workload,
+    mix: str = DEFAULT_MIX,
+    concurrency: int = 32,
+    duration: Optional[float] = 10.0,
+    total_requests: Optional[int] = None,
+    seed: int = 0
+) -> Dict:
+    """Drive `client` with `concurrency` workers until `duration` passes or `total_requests` are sent.
+
+    Returns the overall and per-route statistics. Transport errors are
+    counted under status 0.
+    """
+    names, weights = workload.parse_mix(mix)
+    latencies: Dict[str, List[float]] = {}
+    statuses: Dict[str, Dict[int, int]] = {}
+    remaining = total_requests
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+    
+    async def worker(number: int):
+        nonlocal remaining
+        rng = random.Random(seed * 1_000_003 + number)
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if remaining is not None:
+                if remaining <= 0:
+                    return
+                remaining -= 1
+            request = workload.operations[rng.choices(names, weights)[0]](rng)
+            sent = time.perf_counter()
+            try:
+                response = await client.request(request.method, request.path, params=request.params, json=request.body)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            latencies.setdefault(request.route, []).append(time.perf_counter() - sent)
+            route_statuses = statuses.setdefault(request.route, {})
+            route_statuses[status] = route_statuses.get(status, 0) + 1
+            if request.route == "POST /enrollments/" and status == 201:
+                workload.created_enrollments.append(response.json()["id"])
+    
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    
+    all_latencies = [latency for route_latencies in latencies.values() for latency in route_latencies]
+    all_statuses: Dict[int, int] = {}
+    for route_statuses in statuses.values():
+        for status, count in route_statuses.items():
+            all_statuses[status] = all_statuses.get(status, 0) + count
+    return {
+        "settings": {"mix": mix, "concurrency": concurrency, "duration": duration, "requests": total_requests},
+        "elapsed_s": round(elapsed, 3),
+        "overall": summarize("all", all_latencies, all_statuses, elapsed)._asdict(),
+        "routes": [
+            summarize(route, latencies[route], statuses[route], elapsed)._asdict() for route in sorted(latencies)
+        ],
+    }
+
+
+def format_report(report: Dict) -> str:
+    lines = [
+        f"{'route':<48} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    ]
+    for stats in report["routes"] + [report["overall"]]:
+        lines.append(
+            f"{stats['route']:<48} {stats['requests']:>9} {stats['errors']:>7} {stats['throughput']:>9.1f} "
+            f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}"
+        )
+    return "\n".join(lines)
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_server(app) -> Tuple[str, Callable[[], None]]:
+    """Serve `app` with uvicorn on a free local port in a background thread; returns (url, stop)"""
+    import uvicorn
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn failed to start")
+        time.sleep(0.01)
+    
+    def stop():
+        server.should_exit = True
+        thread.join()
+    
+    return f"http://127.0.0.1:{port}", stop
+
+
+async def _run(args, sizes: SeedSizes) -> Dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    workload = Workload(sizes)
+    options = dict(mix=args.mix, concurrency=args.concurrency, duration=args.duration or None,
+                   total_requests=args.requests, seed=args.seed)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+            return await run_load(client, workload, **options)
+    
+    from main import app
+    if args.server:
+        url, stop = start_server(app)
+        try:
+            async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+                return await run_load(client, workload, **options)
+        finally:
+            stop()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://edutrack") as client:
+        return await run_load(client, workload, **options)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the EduTrack Lite API with concurrent mixed traffic")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help=f"operation=weight list (default: {DEFAULT_MIX}); operations: "
+                             + ", ".join(Workload(default_sizes(1)).operations))
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent workers (default: 32)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run (default: 10)")
+    parser.add_argument("--requests", type=int, help="stop after this many requests instead of after --duration")
+    parser.add_argument("--users", type=int, default=10_000, help="users to seed, or the server's user count with --url")
+    parser.add_argument("--courses", type=int, help="courses (default: one per 100 users, at least 10)")
+    parser.add_argument("--enrollments", type=int, help="enrollments (default: one per user)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--server", action="store_true", help="go through a local uvicorn instead of in-process ASGI")
+    target.add_argument("--url", help="load an already running server instead of a seeded in-process app")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the workload")
+    parser.add_argument("--output", help="also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+    if args.requests:
+        args.duration = 0
+    
+    defaults = default_sizes(args.users)
+    sizes = SeedSizes(
+        args.users,
+        args.courses if args.courses is not None else defaults.courses,
+        args.enrollments if args.enrollments is not None else defaults.enrollments
+    )
+    
+    if args.url:
+        report = asyncio.run(_run(args, sizes))
+    else:
+        database = seed_database(Database(seed_example_data=False), *sizes)
+        with use_database(database):
+            report = asyncio.run(_run(args, sizes))
+    
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
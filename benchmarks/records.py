@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Memory and build time of stored rows: slots records against the pydantic API models
+
+    python -m benchmarks.records                  # 1M rows of each kind
+    python -m benchmarks.records --rows 100k
+
+For users, courses and enrollments it builds --rows instances three ways:
+validated models (the constructor the services used to call), models built
+without validation, and the slots records the backends store now. It
+reports the build time, and the memory the instances retain as measured
+with tracemalloc in a second pass; field values are shared between rows
+and not counted.
+"""
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+from typing import Callable, List, NamedTuple, Optional
+
+from benchmarks.suite import parse_size
+from schemas.course import Course
+from schemas.enrollment import Enrollment
+from schemas.user import User
+from services.records import CourseRecord, EnrollmentRecord, UserRecord
+
+
+class Measurement(NamedTuple):
+    kind: str
+    variant: str
+    seconds: float
+    bytes_per_row: float
+
+
+def measure(kind: str, variant: str, rows: int, build: Callable[[int], object]) -> Measurement:
+    """Time building `rows` instances, then build them again under tracemalloc to measure what they retain"""
+    gc.collect()
+    started = time.perf_counter()
+    instances = [build(number) for number in range(1, rows + 1)]
+    seconds = time.perf_counter() - started
+    del instances
+    
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [build(number) for number in range(1, rows + 1)]
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    # Leave out the list, which holds 8 bytes per row whatever is in it
+    bytes_per_row = (retained - sys.getsizeof(instances)) / rows
+    del instances
+    return Measurement(kind, variant, seconds, bytes_per_row)
+
+
+def run(rows: int) -> List[Measurement]:
+    now = datetime.now()
+    today = date.today()
+    # Values are shared between rows so only the instances themselves are measured
+    name, email, title, description = "Ada Lovelace", "ada@example.com", "Python Basics", "Learn Python"
+    
+    # As in to_model(), every model of a kind shares one fields set
+    user_fields, course_fields, enrollment_fields = (set(model.model_fields) for model in (User, Course, Enrollment))
+    cases = [
+        ("user", "validated model",
+         lambda n: User(id=n, name=name, email=email, is_active=True, created_at=now)),
+        ("user", "unvalidated model",
+         lambda n: User.model_construct(
+             user_fields, id=n, name=name, email=email, is_active=True, created_at=now
+         )),
+        ("user", "slots record",
+         lambda n: UserRecord(n, name, email, True, now)),
+        ("course", "validated model",
+         lambda n: Course(id=n, title=title, description=description, is_open=True, created_at=now)),
+        ("course", "unvalidated model",
+         lambda n: Course.model_construct(
+             course_fields, id=n, title=title, description=description, is_open=True, created_at=now
+         )),
+        ("course", "slots record",
+         lambda n: CourseRecord(n, title, description, True, now)),
+        ("enrollment", "validated model",
+         lambda n: Enrollment(id=n, user_id=n, course_id=1, enrolled_date=today, completed=False, created_at=now)),
+        ("enrollment", "unvalidated model",
+         lambda n: Enrollment.model_construct(
+             enrollment_fields, id=n, user_id=n, course_id=1, enrolled_date=today, completed=False, created_at=now
+         )),
+        ("enrollment", "slots record",
+         lambda n: EnrollmentRecord(n, n, 1, today, False, now)),
+    ]
+    return [measure(kind, variant, rows, build) for kind, variant, build in cases]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare the cost of stored rows as records and as pydantic models")
+    parser.add_argument("--rows", default="1M", help="instances of each kind to build, e.g. 100k or 1M (default: 1M)")
+    args = parser.parse_args(argv)
+    
+    rows = parse_size(args.rows)
+    print(f"{'kind':<12}{'variant':<20}{'build':>10}{'per row':>12}{'memory':>12}{'per row':>12}")
+    for measurement in run(rows):
+        print(
+            f"{measurement.kind:<12}{measurement.variant:<20}"
+            f"{measurement.seconds:>9.2f}s{measurement.seconds / rows * 1e6:>10.2f}us"
+            f"{measurement.bytes_per_row * rows / 2 ** 20:>10.1f}MiB{measurement.bytes_per_row:>10.0f} B"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Synthetic data for benchmarks and load tests
+
+    with use_database(seed_database(Database(seed_example_data=False), users=100_000)) as database:
+        ...  # services and routes now read and write `database`
+"""
+
+import random
+import sys
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Iterator, NamedTuple, Optional
+from services.records import CourseRecord, EnrollmentRecord, UserRecord
+from services.storage import StorageBackend
+
+FIRST_NAMES = (
+    "Ada", "Alan", "Amara", "Chidi", "Grace", "Hedy", "Ivan", "Kwame", "Linus", "Margaret",
+    "Ngozi", "Olu", "Priya", "Radia", "Sofia", "Tariq", "Wei", "Yaw", "Zainab", "Zuri"
+)
+LAST_NAMES = (
+    "Adeyemi", "Banda", "Chen", "Diallo", "Eze", "Hopper", "Kamau", "Lovelace", "Mensah", "Mwangi",
+    "Nkosi", "Okafor", "Owusu", "Perlman", "Ritchie", "Sato", "Torvalds", "Turing", "Uche", "Zulu"
+)
+SUBJECTS = (
+    "Python", "Rust", "SQL", "Statistics", "Design", "Networking", "Security", "Cloud", "Data", "Product"
+)
+LEVELS = ("Basics", "Intermediate", "Advanced", "Bootcamp", "Workshop")
+
+# Enrollment dates rise with the enrollment ID from FIRST_DAY across DATE_SPAN_DAYS
+FIRST_DAY = date(2022, 1, 1)
+DATE_SPAN_DAYS = 3 * 365
+
+SEED_BATCH_SIZE = 10_000
+
+
+class SeedSizes(NamedTuple):
+    users: int
+    courses: int
+    enrollments: int
+
+
+def default_sizes(users: int) -> SeedSizes:
+    """One course per 100 users (at least 10) and one enrollment per user on average"""
+    return SeedSizes(users, max(10, users // 100), users)
+
+
+def seed_database(
+    database: StorageBackend,
+    users: int,
+    courses: Optional[int] = None,
+    enrollments: Optional[int] = None,
+    seed: int = 0
+) -> StorageBackend:
+    """Fill an empty backend with deterministic synthetic data and return it.
+
+    Records are built without validation and stored in batches through the
+    backend's bulk methods. Every user's enrollments are in distinct
+    courses, about 30% of enrollments are completed, 5% of users are
+    inactive and enrollment dates rise with the enrollment ID.
+    """
+    sizes = default_sizes(users)
+    courses = sizes.courses if courses is None else courses
+    enrollments = sizes.enrollments if enrollments is None else enrollments
+    if users and courses and enrollments > users * courses:
+        raise ValueError("More enrollments than distinct (user, course) pairs")
+    
+    rng = random.Random(seed)
+    now = datetime.now()
+    
+    user_ids = []
+    for start in range(0, users, SEED_BATCH_SIZE):
+        batch = []
+        for _ in range(start, min(start + SEED_BATCH_SIZE, users)):
+            user_id = database.allocate_user_id()
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            batch.append(UserRecord(
+                user_id,
+                f"{first} {last}",
+                f"{first.lower()}.{last.lower()}{user_id}@example.com",
+                rng.random() >= 0.05,
+                now
+            ))
+            user_ids.append(user_id)
+        database.add_users(batch)
+    
+    course_ids = []
+    for number in range(courses):
+        course_id = database.allocate_course_id()
+        subject, level = SUBJECTS[number % len(SUBJECTS)], LEVELS[number // len(SUBJECTS) % len(LEVELS)]
+        database.add_course(CourseRecord(
+            course_id,
+            f"{subject} {level} {number + 1}",
+            f"{level} {subject.lower()} course number {number + 1}",
+            True,
+            now
+        ))
+        course_ids.append(course_id)
+    
+    for start in range(0, enrollments, SEED_BATCH_SIZE):
+        batch = []
+        for number in range(start, min(start + SEED_BATCH_SIZE, enrollments)):
+            # The n-th round over the users puts each one in a course it has not taken yet
+            user_index, round_number = number % users, number // users
+            batch.append(EnrollmentRecord(
+                database.allocate_enrollment_id(),
+                user_ids[user_index],
+                course_ids[(user_index * 31 + round_number) % courses],
+                FIRST_DAY + timedelta(days=number * DATE_SPAN_DAYS // enrollments),
+                rng.random() < 0.3,
+                now
+            ))
+        database.add_enrollments(batch)
+    return database
+
+
+@contextmanager
+def use_database(database: StorageBackend) -> Iterator[StorageBackend]:
+    """Point every loaded module that imported the global `db` at another backend for the duration"""
+    from services import database as database_module
+    original = database_module.db
+    patched = [
+        module for module in list(sys.modules.values())
+        if module is not None and module.__dict__.get("db") is original
+    ]
+    for module in patched:
+        module.db = database
+    try:
+        yield database
+    finally:
+        for module in patched:
+            module.db = original
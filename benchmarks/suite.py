@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Latency and allocation benchmarks for every service method and route, at increasing data volumes
+
+    python -m benchmarks.suite                                  # 1k and 10k users, compare with benchmarks/baseline.json
+    python -m benchmarks.suite --sizes 1k,100k,1M --output results.json
+    python -m benchmarks.suite --save-baseline                  # store these results as the new baseline
+
+Each size gets a freshly seeded in-memory (or SQLite) backend. Service
+methods are called directly; routes go through the ASGI app in-process with
+FastAPI's TestClient, so routing, validation and serialization are included.
+Exits with status 1 when a result is slower than the baseline by more than
+the threshold.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi.testclient import TestClient
+
+from benchmarks.seed import DATE_SPAN_DAYS, FIRST_DAY, SeedSizes, default_sizes, seed_database, use_database
+from schemas.course import CourseCreate, CourseUpdate
+from schemas.enrollment import EnrollmentCreate, EnrollmentUpdate
+from schemas.user import UserCreate, UserUpdate
+from services.course_service import CourseService
+from services.database import Database
+from services.enrollment_export import EnrollmentExporter
+from services.enrollment_service import EnrollmentService
+from services.storage import EnrollmentFilter, StorageBackend
+from services.user_import import UserImporter
+from services.user_service import UserService
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Results slower than the baseline by this fraction, and by at least the floor, are regressions
+DEFAULT_THRESHOLD = 0.25
+NOISE_FLOOR_US = 20.0
+
+
+class Case(NamedTuple):
+    kind: str  # "service" or "route"
+    name: str
+    run: Callable[..., Any]
+    # Builds the arguments for iteration i outside the timed section, e.g. a fresh record to delete
+    prepare: Optional[Callable[[int], Tuple]] = None
+    # "METHOD /path/{template}" of the route a route case covers
+    route: Optional[str] = None
+
+
+class Result(NamedTuple):
+    size: int
+    kind: str
+    name: str
+    iterations: int
+    min_us: float
+    median_us: float
+    p95_us: float
+    mean_us: float
+    alloc_peak_kib: float
+    alloc_net_kib: float
+
+
+def parse_size(text: str) -> int:
+    """Parse 1000, 10k or 1M"""
+    text = text.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def create_backend(backend: str, directory: str) -> StorageBackend:
+    if backend == "sqlite":
+        from services.sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(os.path.join(directory, "benchmark.db"))
+    return Database(seed_example_data=False, columnar_enrollments=backend == "columnar")
+
+
+class Fixtures:
+    """Deterministic IDs spread over the seeded data, plus fresh records for destructive cases"""
+    
+    def __init__(self, sizes: SeedSizes, tag: str):
+        self.sizes = sizes
+        self.tag = tag
+        self._serial = 0
+    
+    @staticmethod
+    def _spread(i: int, count: int) -> int:
+        return i * 7919 % count + 1
+    
+    def user_id(self, i: int) -> int:
+        return self._spread(i, self.sizes.users)
+    
+    def course_id(self, i: int) -> int:
+        return self._spread(i, self.sizes.courses)
+    
+    def enrollment_id(self, i: int) -> int:
+        return self._spread(i, self.sizes.enrollments)
+    
+    def email(self) -> str:
+        self._serial += 1
+        return f"bench.{self.tag}.{self._serial}@bench.example"
+    
+    def new_user(self) -> int:
+        return UserService.create_user(UserCreate(name="Bench User", email=self.email())).id
+    
+    def new_course(self) -> int:
+        return CourseService.create_course(CourseCreate(title="Bench Course", description="Benchmark")).id
+    
+    def new_enrollment(self) -> int:
+        return EnrollmentService.enroll_user(EnrollmentCreate(user_id=self.new_user(), course_id=1)).id
+    
+    def import_body(self, rows: int) -> bytes:
+        return ("name,email\n" + "".join(f"Imported,{self.email()}\n" for _ in range(rows))).encode()
+    
+    @property
+    def mid_date(self) -> date:
+        return date.fromordinal(FIRST_DAY.toordinal() + DATE_SPAN_DAYS // 2)
+
+
+def service_cases(fixtures: Fixtures) -> List[Case]:
+    f = fixtures
+    users, courses, enrollments = f.sizes
+    month = EnrollmentFilter(enrolled_from=f.mid_date, enrolled_to=date.fromordinal(f.mid_date.toordinal() + 30))
+    
+    def consume(exporter: EnrollmentExporter) -> int:
+        return sum(len(chunk) for chunk in exporter)
+    
+    def import_users(body: bytes):
+        return UserImporter("csv").run([body])
+    
+    return [
+        Case("service", "UserService.create_user", UserService.create_user,
+             lambda i: (UserCreate(name="Bench User", email=f.email()),)),
+        Case("service", "UserService.get_user", UserService.get_user, lambda i: (f.user_id(i),)),
+        Case("service", "UserService.get_all_users", lambda: UserService.get_all_users(users // 2, 100)),
+        Case("service", "UserService.search_users", lambda: UserService.search_users("grace hop", 20)),
+        Case("service", "UserService.update_user", UserService.update_user,
+             lambda i: (f.user_id(i), UserUpdate(name=f"Renamed {i}"))),
+        Case("service", "UserService.deactivate_user", UserService.deactivate_user, lambda i: (f.user_id(i),)),
+        Case("service", "UserService.delete_user", UserService.delete_user, lambda i: (f.new_user(),)),
+        Case("service", "UserImporter (100 rows)", import_users, lambda i: (f.import_body(100),)),
+        
+        Case("service", "CourseService.create_course", CourseService.create_course,
+             lambda i: (CourseCreate(title="Bench Course", description="Benchmark"),)),
+        Case("service", "CourseService.get_course", CourseService.get_course, lambda i: (f.course_id(i),)),
+        Case("service", "CourseService.get_all_courses", lambda: CourseService.get_all_courses(courses // 2, 100)),
+        Case("service", "CourseService.search_courses", lambda: CourseService.search_courses("pyth adv", 20)),
+        Case("service", "CourseService.get_top_courses", lambda: CourseService.get_top_courses("enrollments", 10)),
+        Case("service", "CourseService.update_course", CourseService.update_course,
+             lambda i: (f.course_id(i), CourseUpdate(description=f"Revised {i}"))),
+        Case("service", "CourseService.close_enrollment", CourseService.close_enrollment,
+             lambda i: (f.new_course(),)),
+        Case("service", "CourseService.get_enrolled_users", CourseService.get_enrolled_users,
+             lambda i: (f.course_id(i),)),
+        Case("service", "CourseService.get_course_stats", CourseService.get_course_stats,
+             lambda i: (f.course_id(i),)),
+        Case("service", "CourseService.delete_course", CourseService.delete_course, lambda i: (f.new_course(),)),
+        
+        Case("service", "EnrollmentService.enroll_user", EnrollmentService.enroll_user,
+             lambda i: (EnrollmentCreate(user_id=f.new_user(), course_id=f.course_id(i)),)),
+        Case("service", "EnrollmentService.bulk_enroll (100)", EnrollmentService.bulk_enroll,
+             lambda i: ([EnrollmentCreate(user_id=f.new_user(), course_id=f.course_id(i)) for _ in range(100)],)),
+        Case("service", "EnrollmentService.get_enrollment", EnrollmentService.get_enrollment,
+             lambda i: (f.enrollment_id(i),)),
+        Case("service", "EnrollmentService.get_all_enrollments",
+             lambda: EnrollmentService.get_all_enrollments(enrollments // 2, 100)),
+        Case("service", "EnrollmentService.get_all_enrollments (course, month)",
+             EnrollmentService.get_all_enrollments,
+             lambda i: (None, 100, month._replace(course_id=f.course_id(i)))),
+        Case("service", "EnrollmentService.get_all_enrollments (completed)",
+             lambda: EnrollmentService.get_all_enrollments(None, 100, EnrollmentFilter(completed=True))),
+        Case("service", "EnrollmentService.get_enrollment_summary", EnrollmentService.get_enrollment_summary),
+        Case("service", "EnrollmentService.get_enrollment_summary (month)",
+             lambda: EnrollmentService.get_enrollment_summary(month.enrolled_from, month.enrolled_to)),
+        Case("service", "EnrollmentService.get_user_enrollments", EnrollmentService.get_user_enrollments,
+             lambda i: (f.user_id(i),)),
+        Case("service", "EnrollmentService.get_course_enrollments", EnrollmentService.get_course_enrollments,
+             lambda i: (f.course_id(i),)),
+        Case("service", "EnrollmentService.mark_completion", EnrollmentService.mark_completion,
+             lambda i: (f.enrollment_id(i), i % 2 == 0)),
+        Case("service", "EnrollmentService.update_enrollment", EnrollmentService.update_enrollment,
+             lambda i: (f.enrollment_id(i), EnrollmentUpdate(completed=i % 2 == 1))),
+        Case("service", "EnrollmentService.delete_enrollment", EnrollmentService.delete_enrollment,
+             lambda i: (f.new_enrollment(),)),
+        Case("service", "EnrollmentExporter (course, ndjson)", consume,
+             lambda i: (EnrollmentExporter("ndjson", course_id=f.course_id(i)),)),
+    ]
+
+
+def route_cases(fixtures: Fixtures, client: TestClient) -> List[Case]:
+    f = fixtures
+    users, courses, enrollments = f.sizes
+    
+    def call(method: str, path: str, **kwargs):
+        response = client.request(method, path, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}: {response.text[:200]}")
+        return response
+    
+    def route(method: str, template: str, make: Callable[[int], Tuple[str, Dict]], label: str = "") -> Case:
+        name = f"{method} {template}" + (f" ({label})" if label else "")
+        return Case("route", name, lambda path, kwargs: call(method, path, **kwargs),
+                    lambda i: make(i), route=f"{method} {template}")
+    
+    def get(path: str, **params) -> Tuple[str, Dict]:
+        return path, {"params": params}
+    
+    def send(path: str, body: Any) -> Tuple[str, Dict]:
+        return path, {"json": body}
+    
+    # A header-only upload, so the status route has an import to report
+    finished_import = UserImporter("csv").run([b"name,email\n"]).id
+    
+    return [
+        route("GET", "/", lambda i: get("/")),
+        route("GET", "/health", lambda i: get("/health")),
+        route("GET", "/metrics", lambda i: get("/metrics")),
+        
+        route("POST", "/users/", lambda i: send("/users/", {"name": "Bench User", "email": f.email()})),
+        route("POST", "/users/import", lambda i: ("/users/import", {
+            "content": f.import_body(100), "headers": {"Content-Type": "text/csv"}
+        }), "100 rows"),
+        route("GET", "/users/import", lambda i: get("/users/import")),
+        route("GET", "/users/import/{import_id}", lambda i: get(f"/users/import/{finished_import}")),
+        route("GET", "/users/", lambda i: get("/users/", limit=100)),
+        route("GET", "/users/search", lambda i: get("/users/search", q="grace hop")),
+        route("GET", "/users/batch", lambda i: get(
+            "/users/batch", ids=",".join(str(f.user_id(i * 100 + k)) for k in range(100))
+        ), "100 ids"),
+        route("GET", "/users/{user_id}", lambda i: get(f"/users/{f.user_id(i)}")),
+        route("PUT", "/users/{user_id}", lambda i: send(f"/users/{f.user_id(i)}", {"name": f"Renamed {i}"})),
+        route("DELETE", "/users/{user_id}", lambda i: (f"/users/{f.new_user()}", {})),
+        route("PATCH", "/users/{user_id}/deactivate", lambda i: (f"/users/{f.user_id(i)}/deactivate", {})),
+        
+        route("POST", "/courses/", lambda i: send("/courses/", {"title": "Bench Course", "description": "Benchmark"})),
+        route("GET", "/courses/", lambda i: get("/courses/", limit=100)),
+        route("GET", "/courses/search", lambda i: get("/courses/search", q="pyth adv")),
+        route("GET", "/courses/top", lambda i: get("/courses/top", by="completions", n=10)),
+        route("GET", "/courses/batch", lambda i: get(
+            "/courses/batch", ids=",".join(str(f.course_id(i * 100 + k)) for k in range(100))
+        ), "100 ids"),
+        route("GET", "/courses/{course_id}", lambda i: get(f"/courses/{f.course_id(i)}")),
+        route("PUT", "/courses/{course_id}",
+              lambda i: send(f"/courses/{f.course_id(i)}", {"description": f"Revised {i}"})),
+        route("DELETE", "/courses/{course_id}", lambda i: (f"/courses/{f.new_course()}", {})),
+        route("PATCH", "/courses/{course_id}/close", lambda i: (f"/courses/{f.new_course()}/close", {})),
+        route("GET", "/courses/{course_id}/enrolled-users", lambda i: get(f"/courses/{f.course_id(i)}/enrolled-users")),
+        route("GET", "/courses/{course_id}/stats", lambda i: get(f"/courses/{f.course_id(i)}/stats")),
+        
+        route("POST", "/enrollments/",
+              lambda i: send("/enrollments/", {"user_id": f.new_user(), "course_id": f.course_id(i)})),
+        route("POST", "/enrollments/bulk", lambda i: send("/enrollments/bulk", [
+            {"user_id": f.new_user(), "course_id": f.course_id(i)} for _ in range(100)
+        ]), "100"),
+        route("GET", "/enrollments/", lambda i: get("/enrollments/", limit=100)),
+        route("GET", "/enrollments/", lambda i: get(
+            "/enrollments/", course_id=f.course_id(i), completed=False, enrolled_from=f.mid_date.isoformat()
+        ), "filtered"),
+        route("GET", "/enrollments/summary", lambda i: get("/enrollments/summary")),
+        route("GET", "/enrollments/export", lambda i: get("/enrollments/export", course_id=f.course_id(i)), "course"),
+        route("GET", "/enrollments/{enrollment_id}", lambda i: get(f"/enrollments/{f.enrollment_id(i)}")),
+        route("PUT", "/enrollments/{enrollment_id}",
+              lambda i: send(f"/enrollments/{f.enrollment_id(i)}", {"completed": i % 2 == 1})),
+        route("DELETE", "/enrollments/{enrollment_id}", lambda i: (f"/enrollments/{f.new_enrollment()}", {})),
+        route("PATCH", "/enrollments/{enrollment_id}/complete",
+              lambda i: (f"/enrollments/{f.enrollment_id(i)}/complete", {"params": {"completed": i % 2 == 0}})),
+        route("GET", "/enrollments/user/{user_id}", lambda i: get(f"/enrollments/user/{f.user_id(i)}")),
+        route("GET", "/enrollments/course/{course_id}", lambda i: get(f"/enrollments/course/{f.course_id(i)}")),
+    ]
+
+
+def uncovered_routes(app, cases: List[Case]) -> List[str]:
+    """Routes of the app's OpenAPI schema that no case exercises"""
+    covered = {case.route for case in cases}
+    return [
+        f"{method.upper()} {path}"
+        for path, operations in app.openapi()["paths"].items()
+        for method in operations
+        if f"{method.upper()} {path}" not in covered
+    ]
+
+
+def measure(case: Case, size: int, repeat: int, max_seconds: float, warmup: int = 2) -> Result:
+    """Time `case` up to `repeat` times (at least 3, fewer if it exceeds `max_seconds`), then trace one call"""
+    iteration = 0
+    
+    def arguments() -> Tuple:
+        nonlocal iteration
+        iteration += 1
+        return case.prepare(iteration) if case.prepare else ()
+    
+    for _ in range(warmup):
+        case.run(*arguments())
+    
+    timings = []
+    deadline = time.perf_counter() + max_seconds
+    gc.collect()
+    while len(timings) < repeat and (len(timings) < 3 or time.perf_counter() < deadline):
+        args = arguments()
+        start = time.perf_counter_ns()
+        case.run(*args)
+        timings.append((time.perf_counter_ns() - start) / 1000)
+    
+    args = arguments()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        case.run(*args)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    timings.sort()
+    return Result(
+        size=size,
+        kind=case.kind,
+        name=case.name,
+        iterations=len(timings),
+        min_us=round(timings[0], 1),
+        median_us=round(statistics.median(timings), 1),
+        p95_us=round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 1),
+        mean_us=round(statistics.fmean(timings), 1),
+        alloc_peak_kib=round((peak - before) / 1024, 1),
+        alloc_net_kib=round((current - before) / 1024, 1)
+    )
+
+
+def run_size(
+    users: int, backend: str, repeat: int, max_seconds: float, kinds: List[str], log: Callable[[str], None]
+) -> List[Result]:
+    """Seed a fresh backend with `users` users and benchmark every case against it"""
+    from main import app
+    
+    sizes = default_sizes(users)
+    with tempfile.TemporaryDirectory() as directory:
+        database = create_backend(backend, directory)
+        started = time.perf_counter()
+        seed_database(database, *sizes)
+        log(f"Seeded {sizes.users} users, {sizes.courses} courses, {sizes.enrollments} enrollments "
+            f"({backend}) in {time.perf_counter() - started:.1f}s")
+        try:
+            with use_database(database):
+                fixtures = Fixtures(sizes, tag=f"{users}-{os.getpid()}")
+                cases = []
+                if "service" in kinds:
+                    cases += service_cases(fixtures)
+                if "route" in kinds:
+                    client = TestClient(app)
+                    routes = route_cases(fixtures, client)
+                    for route in uncovered_routes(app, routes):
+                        log(f"warning: no benchmark covers {route}")
+                    cases += routes
+                
+                results = []
+                for case in cases:
+                    result = measure(case, users, repeat, max_seconds)
+                    log(f"  {case.name:<60} {result.median_us:>10.1f} us  p95 {result.p95_us:>10.1f} us  "
+                        f"peak {result.alloc_peak_kib:>9.1f} KiB")
+                    results.append(result)
+                return results
+        finally:
+            database.close()
+
+
+def compare(
+    results: List[Result], baseline: Dict, threshold: float = DEFAULT_THRESHOLD, floor_us: float = NOISE_FLOOR_US
+) -> Tuple[List[str], List[str]]:
+    """Compare median latencies with a baseline file's; returns (regressions, improvements) as messages"""
+    previous = {(r["size"], r["kind"], r["name"]): r for r in baseline.get("results", [])}
+    regressions, improvements = [], []
+    for result in results:
+        old = previous.get((result.size, result.kind, result.name))
+        if old is None:
+            continue
+        change = result.median_us - old["median_us"]
+        if abs(change) < floor_us or abs(change) <= threshold * old["median_us"]:
+            continue
+        message = (f"{result.name} @ {result.size}: {old['median_us']:.1f} -> {result.median_us:.1f} us "
+                   f"({change / old['median_us']:+.0%})")
+        (regressions if change > 0 else improvements).append(message)
+    return regressions, improvements
+
+
+def write_results(path: str, results: List[Result], args: Dict):
+    document = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": args,
+        "results": [result._asdict() for result in results],
+    }
+    with open(path, "w") as file:
+        json.dump(document, file, indent=2)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark EduTrack Lite services and routes at several data sizes")
+    parser.add_argument("--sizes", default="1k,10k", help="comma-separated user counts, e.g. 1k,100k,1M (default: 1k,10k)")
+    parser.add_argument("--backend", choices=["memory", "columnar", "sqlite"], default="memory")
+    parser.add_argument("--kinds", default="service,route", help="service, route or both (default: both)")
+    parser.add_argument("--repeat", type=int, default=50, help="timed calls per case (default: 50)")
+    parser.add_argument("--max-seconds", type=float, default=2.0,
+                        help="stop timing a case after this long, once it has 3 samples (default: 2)")
+    parser.add_argument("--output", default="benchmark-results.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="results file to compare with, if it exists")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results to --baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown fraction counted as a regression (default: 0.25)")
+    args = parser.parse_args(argv)
+    
+    def log(message: str):
+        print(message, file=sys.stderr, flush=True)
+    
+    kinds = [kind.strip() for kind in args.kinds.split(",")]
+    results: List[Result] = []
+    for users in (parse_size(size) for size in args.sizes.split(",")):
+        log(f"== {users} users")
+        results += run_size(users, args.backend, args.repeat, args.max_seconds, kinds, log)
+    
+    settings = {"sizes": args.sizes, "backend": args.backend, "repeat": args.repeat, "max_seconds": args.max_seconds}
+    write_results(args.output, results, settings)
+    log(f"Results written to {args.output}")
+    
+    status = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as file:
+            regressions, improvements = compare(results, json.load(file), args.threshold)
+        for message in improvements:
+            log(f"faster: {message}")
+        for message in regressions:
+            log(f"SLOWER: {message}")
+        log(f"{len(regressions)} regression(s) against {args.baseline}")
+        status = 1 if regressions else 0
+    if args.save_baseline:
+        write_results(args.baseline, results, settings)
+        log(f"Baseline written to {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
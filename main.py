@@ -1,12 +1,30 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import users, courses, enrollments
+from fastapi.responses import Response
+from routes import users, courses, enrollments, debug, profiles
+from services.config import settings
+from services.database import db
+from services.metrics import PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, render_metrics, request_metrics
+from services.pagination import NEXT_CURSOR_HEADER
+from services.profiling import ProfilingMiddleware, request_profiler
+from services.search_index import start_search_indexes
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the search indexes in the background on startup; flush and close the storage backend on shutdown"""
+    start_search_indexes(db)
+    yield
+    db.close()
+
 
 # Create FastAPI app
 app = FastAPI(
     title="EduTrack Lite API",
     description="A system for managing course enrollments and tracking course completion",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -16,12 +34,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
+# Record per-route request counts and latencies, served at /metrics
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware, metrics=request_metrics)
+
+# Profile requests carrying the profiling header or picked by the sampling rate
+if request_profiler.enabled:
+    app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+
 # Include routers
 app.include_router(users.router)
 app.include_router(courses.router)
 app.include_router(enrollments.router)
+if settings.debug_endpoints:
+    app.include_router(debug.router)
+if request_profiler.enabled:
+    app.include_router(profiles.router)
 
 
 @app.get("/")
@@ -45,6 +76,12 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Request counts, latency histograms and collection sizes in the Prometheus text format"""
+    return Response(render_metrics(request_metrics, db), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
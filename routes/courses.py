@@ -1,49 +1,104 @@
-from typing import List
-from fastapi import APIRouter, status
-from schemas.course import Course, CourseCreate, CourseUpdate
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Query, Request, Response, status
+from schemas.course import Course, CourseBatch, CourseCreate, CourseRanking, CourseStats, CourseUpdate
+from services.batch_loader import parse_ids
 from schemas.user import User
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 from services.course_service import CourseService
+from services.etags import check_etag
+from services.json_cache import json_list_response, json_response
+from services.profiling import ProfiledRoute
+from services.records import to_model, to_models
 
-router = APIRouter(prefix="/courses", tags=["courses"])
+router = APIRouter(prefix="/courses", tags=["courses"], route_class=ProfiledRoute)
 
 
 @router.post("/", response_model=Course, status_code=status.HTTP_201_CREATED)
-async def create_course(course_data: CourseCreate):
+def create_course(course_data: CourseCreate):
     """Create a new course"""
-    return CourseService.create_course(course_data)
+    return to_model(CourseService.create_course(course_data))
 
 
 @router.get("/", response_model=List[Course])
-async def get_all_courses():
-    """Get all courses"""
-    return CourseService.get_all_courses()
+def get_all_courses(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    """Get a page of courses; the next page's cursor is returned in the X-Next-Cursor header"""
+    as_of, = check_etag(request, response, ("courses", None))
+    page = CourseService.get_all_courses(decode_cursor(after), limit)
+    if page.next_after_id is not None:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page.next_after_id)
+    return json_list_response("courses", page.items, as_of, response)
+
+
+@router.get("/search", response_model=List[Course])
+def search_courses(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Find courses by the starts of words in their title or description, e.g. `q=pyth`"""
+    as_of, = check_etag(request, response, ("courses", None))
+    return json_list_response("courses", CourseService.search_courses(q, limit), as_of, response)
+
+
+@router.get("/top", response_model=List[CourseRanking])
+def get_top_courses(
+    by: Literal["enrollments", "completions"] = "enrollments",
+    n: int = Query(10, ge=1, le=100)
+):
+    """Get the open courses with the most enrollments or completions, highest first"""
+    return CourseService.get_top_courses(by, n)
+
+
+@router.get("/batch", response_model=CourseBatch)
+def get_courses_batch(
+    request: Request,
+    response: Response,
+    ids: List[str] = Query(..., description="Course IDs, comma-separated and/or repeated, e.g. `ids=1,2,3`")
+):
+    """Get many courses in one request; IDs without a course are listed in `missing`"""
+    check_etag(request, response, ("courses", None))
+    batch = CourseService.get_courses(parse_ids(ids))
+    return CourseBatch(items=to_models(batch.items), missing=batch.missing)
 
 
 @router.get("/{course_id}", response_model=Course)
-async def get_course(course_id: int):
+def get_course(course_id: int, request: Request, response: Response):
     """Get a course by ID"""
-    return CourseService.get_course(course_id)
+    version, = check_etag(request, response, ("courses", course_id))
+    return json_response("courses", CourseService.get_course(course_id), version, response)
 
 
 @router.put("/{course_id}", response_model=Course)
-async def update_course(course_id: int, course_data: CourseUpdate):
+def update_course(course_id: int, course_data: CourseUpdate):
     """Update a course"""
-    return CourseService.update_course(course_id, course_data)
+    return to_model(CourseService.update_course(course_id, course_data))
 
 
 @router.delete("/{course_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_course(course_id: int):
+def delete_course(course_id: int):
     """Delete a course"""
     CourseService.delete_course(course_id)
 
 
 @router.patch("/{course_id}/close", response_model=Course)
-async def close_enrollment(course_id: int):
+def close_enrollment(course_id: int):
     """Close enrollment for a course"""
-    return CourseService.close_enrollment(course_id)
+    return to_model(CourseService.close_enrollment(course_id))
 
 
 @router.get("/{course_id}/enrolled-users", response_model=List[User])
-async def get_enrolled_users(course_id: int):
+def get_enrolled_users(course_id: int):
     """Get all users enrolled in a particular course"""
-    return CourseService.get_enrolled_users(course_id)
+    return to_models(CourseService.get_enrolled_users(course_id))
+
+
+@router.get("/{course_id}/stats", response_model=CourseStats)
+def get_course_stats(course_id: int):
+    """Get enrollment, completion and active learner counts for a course"""
+    return CourseService.get_course_stats(course_id)
@@ -0,0 +1,18 @@
+from typing import List
+from fastapi import APIRouter, status
+from schemas.scan_cost import OperationScanCost
+from services.scan_cost import scan_costs
+
+router = APIRouter(prefix="/debug", tags=["debug"], include_in_schema=False)
+
+
+@router.get("/scan-costs", response_model=List[OperationScanCost])
+def get_scan_costs():
+    """Records examined and returned per service operation, most examined first"""
+    return scan_costs.snapshot()
+
+
+@router.delete("/scan-costs", status_code=status.HTTP_204_NO_CONTENT)
+def reset_scan_costs():
+    """Start counting afresh, e.g. before replaying a workload"""
+    scan_costs.reset()
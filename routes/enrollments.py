@@ -1,54 +1,119 @@
-from typing import List
-from fastapi import APIRouter, status
-from schemas.enrollment import Enrollment, EnrollmentCreate, EnrollmentUpdate, EnrollmentWithDetails
+from datetime import date
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from schemas.enrollment import (
+    BulkEnrollmentResult, Enrollment, EnrollmentCreate, EnrollmentSummary, EnrollmentUpdate,
+    EnrollmentWithDetails
+)
+from services.enrollment_export import EnrollmentExporter
+from services.enrollment_view import details_list_response
+from services.etags import check_etag
+from services.json_cache import json_list_response, json_response
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from services.storage import EnrollmentFilter
 from services.enrollment_service import EnrollmentService
+from services.profiling import ProfiledRoute
+from services.records import to_model
 
-router = APIRouter(prefix="/enrollments", tags=["enrollments"])
+router = APIRouter(prefix="/enrollments", tags=["enrollments"], route_class=ProfiledRoute)
 
 
 @router.post("/", response_model=Enrollment, status_code=status.HTTP_201_CREATED)
-async def enroll_user(enrollment_data: EnrollmentCreate):
+def enroll_user(enrollment_data: EnrollmentCreate):
     """Enroll a user in a course"""
-    return EnrollmentService.enroll_user(enrollment_data)
+    return to_model(EnrollmentService.enroll_user(enrollment_data))
+
+
+@router.post("/bulk", response_model=List[BulkEnrollmentResult])
+def bulk_enroll(items: List[EnrollmentCreate]):
+    """Enroll many users at once; returns a created/rejected result per item"""
+    return [
+        BulkEnrollmentResult(index=index, status="rejected", reason=outcome) if isinstance(outcome, str)
+        else BulkEnrollmentResult(index=index, status="created", enrollment=to_model(outcome))
+        for index, outcome in enumerate(EnrollmentService.bulk_enroll(items))
+    ]
 
 
 @router.get("/", response_model=List[Enrollment])
-async def get_all_enrollments():
-    """Get all enrollments"""
-    return EnrollmentService.get_all_enrollments()
+def get_all_enrollments(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    course_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    completed: Optional[bool] = None,
+    enrolled_from: Optional[date] = None,
+    enrolled_to: Optional[date] = None
+):
+    """Get a page of enrollments, optionally filtered; the next page's cursor is returned in the X-Next-Cursor header"""
+    as_of, = check_etag(request, response, ("enrollments", None))
+    filters = EnrollmentFilter(course_id, user_id, completed, enrolled_from, enrolled_to)
+    page = EnrollmentService.get_all_enrollments(decode_cursor(after), limit, filters)
+    if page.next_after_id is not None:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page.next_after_id)
+    return json_list_response("enrollments", page.items, as_of, response)
+
+
+@router.get("/summary", response_model=EnrollmentSummary)
+def get_enrollment_summary(enrolled_from: Optional[date] = None, enrolled_to: Optional[date] = None):
+    """Get enrollment and completion counts per course, optionally within a date range"""
+    return EnrollmentService.get_enrollment_summary(enrolled_from, enrolled_to)
+
+
+@router.get("/export")
+def export_enrollments(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    course_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    completed: Optional[bool] = None
+):
+    """Stream enrollments with user and course details as NDJSON or CSV"""
+    exporter = EnrollmentExporter(format, course_id=course_id, user_id=user_id, completed=completed)
+    return StreamingResponse(
+        iter(exporter),
+        media_type=exporter.media_type,
+        headers={"Content-Disposition": f'attachment; filename="enrollments.{format}"'}
+    )
 
 
 @router.get("/{enrollment_id}", response_model=Enrollment)
-async def get_enrollment(enrollment_id: int):
+def get_enrollment(enrollment_id: int, request: Request, response: Response):
     """Get an enrollment by ID"""
-    return EnrollmentService.get_enrollment(enrollment_id)
+    version, = check_etag(request, response, ("enrollments", enrollment_id))
+    return json_response("enrollments", EnrollmentService.get_enrollment(enrollment_id), version, response)
 
 
 @router.put("/{enrollment_id}", response_model=Enrollment)
-async def update_enrollment(enrollment_id: int, enrollment_data: EnrollmentUpdate):
+def update_enrollment(enrollment_id: int, enrollment_data: EnrollmentUpdate):
     """Update an enrollment"""
-    return EnrollmentService.update_enrollment(enrollment_id, enrollment_data)
+    return to_model(EnrollmentService.update_enrollment(enrollment_id, enrollment_data))
 
 
 @router.delete("/{enrollment_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_enrollment(enrollment_id: int):
+def delete_enrollment(enrollment_id: int):
     """Delete an enrollment"""
     EnrollmentService.delete_enrollment(enrollment_id)
 
 
 @router.patch("/{enrollment_id}/complete", response_model=Enrollment)
-async def mark_completion(enrollment_id: int, completed: bool = True):
+def mark_completion(enrollment_id: int, completed: bool = True):
     """Mark a course as completed"""
-    return EnrollmentService.mark_completion(enrollment_id, completed)
+    return to_model(EnrollmentService.mark_completion(enrollment_id, completed))
 
 
 @router.get("/user/{user_id}", response_model=List[EnrollmentWithDetails])
-async def get_user_enrollments(user_id: int):
+def get_user_enrollments(user_id: int, request: Request, response: Response):
     """Get all enrollments for a specific user"""
-    return EnrollmentService.get_user_enrollments(user_id)
+    # Course titles are part of the response, so any course change invalidates it too
+    check_etag(request, response, ("enrollments", None), ("users", user_id), ("courses", None))
+    return details_list_response(EnrollmentService.get_user_enrollments(user_id), response)
 
 
 @router.get("/course/{course_id}", response_model=List[EnrollmentWithDetails])
-async def get_course_enrollments(course_id: int):
+def get_course_enrollments(course_id: int, request: Request, response: Response):
     """Get all enrollments for a specific course"""
-    return EnrollmentService.get_course_enrollments(course_id)
+    # User names are part of the response, so any user change invalidates it too
+    check_etag(request, response, ("enrollments", None), ("courses", course_id), ("users", None))
+    return details_list_response(EnrollmentService.get_course_enrollments(course_id), response)
@@ -0,0 +1,41 @@
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import FileResponse, PlainTextResponse
+from schemas.profile import ProfileInfo
+from services.profiling import PROFILE_HEADER, request_profiler
+
+DEFAULT_PROFILE_LIMIT = 50
+
+
+def require_profile_token(token: Optional[str] = Header(None, alias=PROFILE_HEADER)):
+    """Only callers holding the profiling token may read profiles"""
+    if not request_profiler.authorized(token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"A valid {PROFILE_HEADER} header is required"
+        )
+
+
+router = APIRouter(
+    prefix="/profiles", tags=["profiling"], include_in_schema=False, dependencies=[Depends(require_profile_token)]
+)
+
+
+@router.get("/", response_model=List[ProfileInfo])
+def list_profiles(limit: int = Query(DEFAULT_PROFILE_LIMIT, ge=1, le=1000)):
+    """List the most recent request profiles, newest first"""
+    return request_profiler.list_profiles(limit)
+
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: str, format: Literal["pstats", "text"] = "pstats"):
+    """Download a profile as a pstats file, or as text listing the costliest functions"""
+    path = request_profiler.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Profile {profile_id} not found"
+        )
+    if format == "text":
+        return PlainTextResponse(request_profiler.render(path))
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
@@ -1,42 +1,115 @@
-from typing import List
-from fastapi import APIRouter, status
-from schemas.user import User, UserCreate, UserUpdate
+from typing import AsyncIterator, Iterator, List, Literal, Optional
+from anyio import from_thread
+from fastapi import APIRouter, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from schemas.user import User, UserBatch, UserCreate, UserImportProgress, UserImportResult, UserUpdate
+from services.batch_loader import parse_ids
+from services.etags import check_etag
+from services.json_cache import json_list_response, json_response
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from services.records import to_model, to_models
+from services.user_import import UserImporter, get_import_progress, list_import_progress
 from services.user_service import UserService
+from services.profiling import ProfiledRoute
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=ProfiledRoute)
 
 
 @router.post("/", response_model=User, status_code=status.HTTP_201_CREATED)
-async def create_user(user_data: UserCreate):
+def create_user(user_data: UserCreate):
     """Create a new user"""
-    return UserService.create_user(user_data)
+    return to_model(UserService.create_user(user_data))
+
+
+@router.post("/import", response_model=UserImportResult)
+async def import_users(request: Request, format: Optional[Literal["csv", "ndjson"]] = None):
+    """Import users from a streamed CSV or NDJSON upload; its progress is listed at GET /users/import meanwhile"""
+    importer = UserImporter(UserImporter.detect_format(format, request.headers.get("content-type")))
+    # Parsing and committing take database locks, so the import runs off the
+    # event loop, pulling the upload from it one chunk at a time
+    return await run_in_threadpool(importer.run, _blocking_iter(request.stream()))
+
+
+@router.get("/import", response_model=List[UserImportProgress])
+def list_imports():
+    """Get the progress of the running and recent imports, newest first"""
+    return list_import_progress()
+
+
+@router.get("/import/{import_id}", response_model=UserImportProgress)
+def get_import(import_id: int):
+    """Get the progress of a running or recent import"""
+    return get_import_progress(import_id)
+
+
+def _blocking_iter(stream: AsyncIterator[bytes]) -> Iterator[bytes]:
+    """Iterate an async stream from a worker thread, awaiting each item on the event loop"""
+    async def next_item():
+        return await anext(stream, None)
+    
+    while (item := from_thread.run(next_item)) is not None:
+        yield item
 
 
 @router.get("/", response_model=List[User])
-async def get_all_users():
-    """Get all users"""
-    return UserService.get_all_users()
+def get_all_users(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    """Get a page of users; the next page's cursor is returned in the X-Next-Cursor header"""
+    as_of, = check_etag(request, response, ("users", None))
+    page = UserService.get_all_users(decode_cursor(after), limit)
+    if page.next_after_id is not None:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page.next_after_id)
+    return json_list_response("users", page.items, as_of, response)
+
+
+@router.get("/search", response_model=List[User])
+def search_users(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Find users by the starts of words in their name or email, e.g. `q=ali smi`"""
+    as_of, = check_etag(request, response, ("users", None))
+    return json_list_response("users", UserService.search_users(q, limit), as_of, response)
+
+
+@router.get("/batch", response_model=UserBatch)
+def get_users_batch(
+    request: Request,
+    response: Response,
+    ids: List[str] = Query(..., description="User IDs, comma-separated and/or repeated, e.g. `ids=1,2,3`")
+):
+    """Get many users in one request; IDs without a user are listed in `missing`"""
+    check_etag(request, response, ("users", None))
+    batch = UserService.get_users(parse_ids(ids))
+    return UserBatch(items=to_models(batch.items), missing=batch.missing)
 
 
 @router.get("/{user_id}", response_model=User)
-async def get_user(user_id: int):
+def get_user(user_id: int, request: Request, response: Response):
     """Get a user by ID"""
-    return UserService.get_user(user_id)
+    version, = check_etag(request, response, ("users", user_id))
+    return json_response("users", UserService.get_user(user_id), version, response)
 
 
 @router.put("/{user_id}", response_model=User)
-async def update_user(user_id: int, user_data: UserUpdate):
+def update_user(user_id: int, user_data: UserUpdate):
     """Update a user"""
-    return UserService.update_user(user_id, user_data)
+    return to_model(UserService.update_user(user_id, user_data))
 
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user(user_id: int):
+def delete_user(user_id: int):
     """Delete a user"""
     UserService.delete_user(user_id)
 
 
 @router.patch("/{user_id}/deactivate", response_model=User)
-async def deactivate_user(user_id: int):
+def deactivate_user(user_id: int):
     """Deactivate a user"""
-    return UserService.deactivate_user(user_id)
+    return to_model(UserService.deactivate_user(user_id))
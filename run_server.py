@@ -1,20 +1,51 @@
 #!/usr/bin/env python3
 """
 Simple script to run the EduTrack Lite API server
+
+    python run_server.py                            # development: one process, auto-reload
+    python run_server.py --production --workers 4   # production: N worker processes
 """
 
+import argparse
+import os
+import sys
+
 import uvicorn
 
+from services.config import settings
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the EduTrack Lite API server")
+    parser.add_argument("--production", action="store_true", help="run without auto-reload, with worker processes")
+    parser.add_argument("--workers", type=int, default=settings.workers,
+                        help="worker processes in production mode; 0 means one per CPU (default: EDUTRACK_WORKERS or 1)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    
+    workers = 1
+    if args.production:
+        workers = args.workers or os.cpu_count() or 1
+        # Each worker is a separate process, so they can only share data through the SQLite file
+        if workers > 1 and settings.storage_backend != "sqlite":
+            sys.exit("Multiple workers need a shared store: set EDUTRACK_STORAGE_BACKEND=sqlite")
+        if workers > 1:
+            # Create and seed the database once, before the workers race to open it
+            from services.database import db
+            db.close()
+    
     print("Starting EduTrack Lite API server...")
-    print("API Documentation will be available at: http://localhost:8000/docs")
-    print("ReDoc Documentation will be available at: http://localhost:8000/redoc")
+    if args.production:
+        print(f"Production mode with {workers} worker process(es)")
+    print(f"API Documentation will be available at: http://localhost:{args.port}/docs")
+    print(f"ReDoc Documentation will be available at: http://localhost:{args.port}/redoc")
     print("Press Ctrl+C to stop the server")
     
     uvicorn.run(
         "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,  # Enable auto-reload for development
+        host=args.host,
+        port=args.port,
+        reload=not args.production,  # Enable auto-reload for development
+        workers=workers,
         log_level="info"
     )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -25,3 +25,25 @@ class Course(CourseBase):
 
     class Config:
         from_attributes = True
+
+
+class CourseStats(BaseModel):
+    course_id: int
+    enrolled: int
+    completed: int
+    active_learners: int
+    completion_rate: float
+
+
+class CourseRanking(BaseModel):
+    rank: int
+    course_id: int
+    title: str
+    enrolled: int
+    completed: int
+
+
+class CourseBatch(BaseModel):
+    items: List[Course]
+    # Requested IDs without a course
+    missing: List[int]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import date, datetime
 
 
@@ -31,3 +31,24 @@ class Enrollment(EnrollmentBase):
 class EnrollmentWithDetails(Enrollment):
     user_name: str
     course_title: str
+
+
+class BulkEnrollmentResult(BaseModel):
+    index: int
+    status: Literal["created", "rejected"]
+    enrollment: Optional[Enrollment] = None
+    reason: Optional[str] = None
+
+
+class CourseEnrollmentCounts(BaseModel):
+    course_id: int
+    enrolled: int
+    completed: int
+
+
+class EnrollmentSummary(BaseModel):
+    enrolled_from: Optional[date] = None
+    enrolled_to: Optional[date] = None
+    enrolled: int
+    completed: int
+    courses: List[CourseEnrollmentCounts]
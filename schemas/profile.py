@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+
+class ProfileInfo(BaseModel):
+    id: str
+    method: str
+    path: str
+    route: str
+    status: int
+    duration_ms: float
+    started_at: datetime
+    # "header" when requested with the profiling header, "sample" when picked by the sampling rate
+    trigger: str
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import Optional
+
+
+class OperationScanCost(BaseModel):
+    operation: str
+    calls: int
+    # Records read or index entries probed, over all calls
+    examined: int
+    returned: int
+    max_examined: int
+    examined_per_call: float
+    # None while the operation has returned nothing
+    examined_per_returned: Optional[float] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 
@@ -25,3 +25,35 @@ class User(UserBase):
 
     class Config:
         from_attributes = True
+
+
+class UserBatch(BaseModel):
+    items: List[User]
+    # Requested IDs without a user
+    missing: List[int]
+
+
+class UserImportError(BaseModel):
+    row: int
+    error: str
+
+
+class UserImportProgress(BaseModel):
+    id: int
+    format: Literal["csv", "ndjson"]
+    status: Literal["running", "done", "failed"]
+    rows: int
+    created: int
+    rejected: int
+    chunks: int
+
+
+class UserImportResult(BaseModel):
+    id: int
+    format: Literal["csv", "ndjson"]
+    rows: int
+    created: int
+    rejected: int
+    chunks: int
+    errors: List[UserImportError]
+    errors_truncated: bool = False
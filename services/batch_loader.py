@@ -0,0 +1,61 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+from fastapi import HTTPException, status
+from services.pagination import MAX_PAGE_SIZE
+from services.storage import StorageBackend
+
+# Most IDs one batch lookup may ask for
+MAX_BATCH_IDS = MAX_PAGE_SIZE
+
+
+def parse_ids(values: List[str]) -> List[int]:
+    """Parse `ids` query values, repeated and/or comma-separated, into distinct IDs in request order"""
+    try:
+        ids = [int(part) for value in values for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be integers"
+        )
+    ids = list(dict.fromkeys(ids))
+    if not ids or len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Between 1 and {MAX_BATCH_IDS} ids are required"
+        )
+    return ids
+
+
+class Batch(NamedTuple):
+    """Records found by a batch lookup, in request order, and the requested IDs without a record"""
+    items: List[Any]
+    missing: List[int]
+
+
+class BatchLoader:
+    """Request-scoped, DataLoader-style lookups of one collection's records by ID.
+
+    Every `load_many` fetches the IDs the loader has not seen yet with one
+    `get_many` call, and each ID is fetched at most once, so resolving the
+    user and course of each row of a list costs one lookup per distinct ID
+    rather than one per row. Results (including misses) are cached for the
+    loader's lifetime; create one per request, never share one across
+    requests, or writes made meanwhile would be missed.
+    """
+    
+    def __init__(self, database: StorageBackend, collection: str):
+        self._database = database
+        self._collection = collection
+        self._cache: Dict[int, Optional[Any]] = {}
+    
+    def load_many(self, ids: Iterable[int]) -> List[Optional[Any]]:
+        """The records with these IDs, in the same order, with None for IDs without a record"""
+        ids = list(ids)
+        unseen = [record_id for record_id in dict.fromkeys(ids) if record_id not in self._cache]
+        if unseen:
+            found = self._database.get_many(self._collection, unseen)
+            for record_id in unseen:
+                self._cache[record_id] = found.get(record_id)
+        return [self._cache[record_id] for record_id in ids]
+    
+    def load(self, record_id: int) -> Optional[Any]:
+        return self.load_many((record_id,))[0]
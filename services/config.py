@@ -0,0 +1,63 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class Settings:
+    # "memory" keeps everything in process-local dicts, "sqlite" persists to a file
+    storage_backend: str = "memory"
+    sqlite_path: str = "edutrack.db"
+    # Matches the default size of the threadpool uvicorn runs sync endpoints in
+    sqlite_pool_size: int = 40
+    # "dict" keeps one Enrollment model per row, "columnar" packs enrollments into typed arrays
+    enrollment_store: str = "dict"
+    # Directory for the in-memory backend's write-ahead log and snapshots; unset means no durability
+    data_dir: Optional[str] = None
+    # Seconds between group-commit fsyncs of the log (0 syncs every write)
+    wal_fsync_interval: float = 0.05
+    # Seconds between full snapshots, after which the log is truncated
+    snapshot_interval: float = 300.0
+    # Worker processes started by run_server.py in production mode; more than one requires "sqlite"
+    workers: int = 1
+    # Seconds between polls for changes written by other worker processes
+    change_poll_interval: float = 0.05
+    # Record per-route request counts and latencies for GET /metrics
+    metrics_enabled: bool = True
+    # Directory for request profiles; unset disables profiling
+    profile_dir: Optional[str] = None
+    # Value of the X-EduTrack-Profile header that profiles a request and unlocks GET /profiles/
+    profile_token: Optional[str] = None
+    # Fraction of requests profiled without the header
+    profile_sample_rate: float = 0.0
+    # Newest profiles kept on disk
+    profile_keep: int = 100
+    # Service calls examining at least this many records, and far more than they return, are logged as scans
+    scan_warn_examined: int = 10_000
+    # Serve the per-operation scan costs at /debug/scan-costs; off by default, as it is unauthenticated
+    debug_endpoints: bool = False
+    
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Build settings from EDUTRACK_* environment variables"""
+        return cls(
+            storage_backend=os.getenv("EDUTRACK_STORAGE_BACKEND", cls.storage_backend),
+            sqlite_path=os.getenv("EDUTRACK_SQLITE_PATH", cls.sqlite_path),
+            sqlite_pool_size=int(os.getenv("EDUTRACK_SQLITE_POOL_SIZE", cls.sqlite_pool_size)),
+            enrollment_store=os.getenv("EDUTRACK_ENROLLMENT_STORE", cls.enrollment_store),
+            data_dir=os.getenv("EDUTRACK_DATA_DIR") or None,
+            wal_fsync_interval=float(os.getenv("EDUTRACK_WAL_FSYNC_INTERVAL", cls.wal_fsync_interval)),
+            snapshot_interval=float(os.getenv("EDUTRACK_SNAPSHOT_INTERVAL", cls.snapshot_interval)),
+            workers=int(os.getenv("EDUTRACK_WORKERS", cls.workers)),
+            change_poll_interval=float(os.getenv("EDUTRACK_CHANGE_POLL_INTERVAL", cls.change_poll_interval)),
+            metrics_enabled=os.getenv("EDUTRACK_METRICS", "1").lower() not in ("0", "false", "no", "off"),
+            profile_dir=os.getenv("EDUTRACK_PROFILE_DIR") or None,
+            profile_token=os.getenv("EDUTRACK_PROFILE_TOKEN") or None,
+            profile_sample_rate=float(os.getenv("EDUTRACK_PROFILE_SAMPLE_RATE", cls.profile_sample_rate)),
+            profile_keep=int(os.getenv("EDUTRACK_PROFILE_KEEP", cls.profile_keep)),
+            scan_warn_examined=int(os.getenv("EDUTRACK_SCAN_WARN_EXAMINED", cls.scan_warn_examined)),
+            debug_endpoints=os.getenv("EDUTRACK_DEBUG_ENDPOINTS", "0").lower() in ("1", "true", "yes", "on"),
+        )
+
+
+settings = Settings.from_env()
@@ -1,120 +1,177 @@
 from datetime import datetime
 from typing import List, Optional
 from fastapi import HTTPException, status
-from schemas.course import Course, CourseCreate, CourseUpdate
-from schemas.user import User
+from schemas.course import CourseCreate, CourseRanking, CourseStats, CourseUpdate
+from services.batch_loader import Batch, BatchLoader
 from services.database import db
+from services.pagination import DEFAULT_PAGE_SIZE, Page
+from services.records import CourseRecord, UserRecord
+from services.search_index import get_search_index
+from services.scan_cost import accounted
 
 
 class CourseService:
     @staticmethod
-    def create_course(course_data: CourseCreate) -> Course:
+    @accounted
+    def create_course(course_data: CourseCreate) -> CourseRecord:
         """Create a new course"""
-        course_id = db.get_next_course_id()
-        course = Course(
-            id=course_id,
+        course = CourseRecord(
+            id=db.allocate_course_id(),
             title=course_data.title,
             description=course_data.description,
             is_open=course_data.is_open,
             created_at=datetime.now()
         )
         
-        db.courses[course_id] = course
-        db.increment_course_counter()
+        db.add_course(course)
         return course
     
     @staticmethod
-    def get_course(course_id: int) -> Course:
+    @accounted
+    def get_course(course_id: int) -> CourseRecord:
         """Get a course by ID"""
-        if course_id not in db.courses:
+        course = db.courses.get(course_id)
+        if course is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Course not found"
             )
-        return db.courses[course_id]
+        return course
+    
+    @staticmethod
+    @accounted
+    def get_courses(course_ids: List[int]) -> Batch:
+        """Get many courses by ID at once, in the requested order, listing the IDs without a course"""
+        courses = BatchLoader(db, "courses").load_many(course_ids)
+        return Batch(
+            items=[course for course in courses if course is not None],
+            missing=[course_id for course_id, course in zip(course_ids, courses) if course is None]
+        )
     
     @staticmethod
-    def get_all_courses() -> List[Course]:
-        """Get all courses"""
-        return list(db.courses.values())
+    @accounted
+    def get_all_courses(after_id: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE) -> Page:
+        """Get a page of courses in ID order, starting after `after_id`"""
+        return db.get_courses_page(after_id, limit)
     
     @staticmethod
-    def update_course(course_id: int, course_data: CourseUpdate) -> Course:
+    @accounted
+    def search_courses(query: str, limit: int = 20) -> List[CourseRecord]:
+        """Find courses whose title or description has words starting with every word of `query`"""
+        return get_search_index(db, "courses").search(query, limit)
+    
+    @staticmethod
+    @accounted
+    def update_course(course_id: int, course_data: CourseUpdate) -> CourseRecord:
         """Update a course"""
-        if course_id not in db.courses:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Course not found"
-            )
-        
-        course = db.courses[course_id]
-        
-        # Update fields
-        if course_data.title is not None:
-            course.title = course_data.title
-        if course_data.description is not None:
-            course.description = course_data.description
-        if course_data.is_open is not None:
-            course.is_open = course_data.is_open
-        
-        return course
+        with db.locked("courses"):
+            if course_id not in db.courses:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Course not found"
+                )
+            
+            # Update fields
+            changes = {}
+            if course_data.title is not None:
+                changes["title"] = course_data.title
+            if course_data.description is not None:
+                changes["description"] = course_data.description
+            if course_data.is_open is not None:
+                changes["is_open"] = course_data.is_open
+            
+            return db.update_course(course_id, **changes)
     
     @staticmethod
+    @accounted
     def delete_course(course_id: int) -> None:
         """Delete a course"""
-        if course_id not in db.courses:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Course not found"
-            )
-        
-        # Check if course has any enrollments
-        for enrollment in db.enrollments.values():
-            if enrollment.course_id == course_id:
+        with db.locked("courses", "enrollments"):
+            if course_id not in db.courses:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Course not found"
+                )
+            
+            # Check if course has any enrollments
+            if db.course_has_enrollments(course_id):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Cannot delete course with existing enrollments"
                 )
-        
-        del db.courses[course_id]
+            
+            db.delete_course(course_id)
     
     @staticmethod
-    def close_enrollment(course_id: int) -> Course:
+    @accounted
+    def close_enrollment(course_id: int) -> CourseRecord:
         """Close enrollment for a course"""
+        with db.locked("courses"):
+            if course_id not in db.courses:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Course not found"
+                )
+            
+            return db.update_course(course_id, is_open=False)
+    
+    @staticmethod
+    @accounted
+    def get_enrolled_users(course_id: int) -> List[UserRecord]:
+        """Get all users enrolled in a particular course"""
         if course_id not in db.courses:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Course not found"
             )
         
-        course = db.courses[course_id]
-        course.is_open = False
-        return course
+        with db.locked("enrollments"):
+            enrollments = BatchLoader(db, "enrollments").load_many(db.get_course_enrollment_ids(course_id))
+        
+        users = BatchLoader(db, "users").load_many(enrollment.user_id for enrollment in enrollments)
+        return [user for user in users if user is not None]
     
     @staticmethod
-    def get_enrolled_users(course_id: int) -> List[User]:
-        """Get all users enrolled in a particular course"""
+    @accounted
+    def get_course_stats(course_id: int) -> CourseStats:
+        """Get enrollment, completion and active learner counts for a course"""
         if course_id not in db.courses:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Course not found"
             )
         
-        enrolled_user_ids = set()
-        for enrollment in db.enrollments.values():
-            if enrollment.course_id == course_id:
-                enrolled_user_ids.add(enrollment.user_id)
-        
-        enrolled_users = []
-        for user_id in enrolled_user_ids:
-            if user_id in db.users:
-                enrolled_users.append(db.users[user_id])
-        
-        return enrolled_users
+        enrolled, completed, active_learners = db.get_course_stats(course_id)
+        return CourseStats(
+            course_id=course_id,
+            enrolled=enrolled,
+            completed=completed,
+            active_learners=active_learners,
+            completion_rate=completed / enrolled if enrolled else 0.0
+        )
+    
+    @staticmethod
+    @accounted
+    def get_top_courses(by: str = "enrollments", n: int = 10) -> List[CourseRanking]:
+        """Get the open courses with the most enrollments or completions"""
+        rankings = []
+        top_courses = db.get_top_courses(by, n)
+        for course_id, _ in top_courses:
+            course = db.courses.get(course_id)
+            if course is None:
+                continue
+            enrolled, completed, _ = db.get_course_stats(course_id)
+            rankings.append(CourseRanking(
+                rank=len(rankings) + 1,
+                course_id=course_id,
+                title=course.title,
+                enrolled=enrolled,
+                completed=completed
+            ))
+        return rankings
     
     @staticmethod
     def is_course_open(course_id: int) -> bool:
         """Check if a course is open for enrollment"""
-        if course_id not in db.courses:
-            return False
-        return db.courses[course_id].is_open
+        course = db.courses.get(course_id)
+        return course is not None and course.is_open
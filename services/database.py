@@ -1,57 +1,539 @@
-from datetime import datetime
-from typing import Dict, List, Optional
-from schemas.user import User
-from schemas.course import Course
-from schemas.enrollment import Enrollment
+import threading
+import math
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from datetime import date
+from typing import Any, Dict, Iterator, List, MutableMapping, Optional, Set, Tuple
+from services.columnar_store import ColumnarEnrollments
+from services.config import Settings, settings
+from services.leaderboard import Leaderboard
+from services.pagination import Page
+from services.records import CourseRecord, EnrollmentRecord, UserRecord
+from services.scan_cost import CountingDict, examined
+from services.storage import LOCK_ORDER, TOP_COURSE_METRICS, EnrollmentFilter, StorageBackend
 
+# A journaled write's inverse: the name of the method to call, its positional and its keyword arguments
+UndoEntry = Tuple[str, tuple, Dict[str, Any]]
 
-class Database:
+
+class _UndoState(threading.local):
+    """Per-thread state of the undo journal"""
+    
     def __init__(self):
-        self.users: Dict[int, User] = {}
-        self.courses: Dict[int, Course] = {}
-        self.enrollments: Dict[int, Enrollment] = {}
+        # Undo lists of the atomic() blocks this thread is in, outermost first
+        self.scopes: List[List[UndoEntry]] = []
+        # Set while restore() replays the journal, whose entries are not journaled again
+        self.replaying = False
+
+
+class Database(StorageBackend):
+    def __init__(self, seed_example_data: bool = True, columnar_enrollments: bool = False):
+        super().__init__()
+        # Both kinds of store count the records read towards the running service operation
+        self.users: Dict[int, UserRecord] = CountingDict()
+        self.courses: Dict[int, CourseRecord] = CountingDict()
+        self.enrollments: MutableMapping[int, EnrollmentRecord] = (
+            ColumnarEnrollments() if columnar_enrollments else CountingDict()
+        )
         self._user_counter = 1
         self._course_counter = 1
         self._enrollment_counter = 1
+        self._id_lock = threading.Lock()
         
-        # Initialize with example data
-        self._initialize_example_data()
-    
-    def _initialize_example_data(self):
-        """Initialize with the example data provided in requirements"""
-        # Create example user
-        user = User(
-            id=self._user_counter,
-            name="Alice",
-            email="alice@example.com",
-            is_active=True,
-            created_at=datetime.now()
-        )
-        self.users[self._user_counter] = user
-        self._user_counter += 1
+        # Secondary indexes, kept in sync by the add/update/delete methods below
+        self._email_index: Dict[str, int] = {}
+        self._enrollment_index: Dict[Tuple[int, int], int] = {}
+        self._user_enrollments: Dict[int, Set[int]] = {}
+        self._course_enrollments: Dict[int, Set[int]] = {}
         
-        # Create example course
-        course = Course(
-            id=self._course_counter,
-            title="Python Basics",
-            description="Learn Python",
-            is_open=True,
-            created_at=datetime.now()
-        )
-        self.courses[self._course_counter] = course
-        self._course_counter += 1
+        # Per-course [enrolled, completed, active learners], kept up to date by every write
+        self._course_stats: Dict[int, List[int]] = {}
+        # Open courses ranked by each of the first two counters, guarded by the enrollments lock
+        self._top_courses: Dict[str, Leaderboard] = {metric: Leaderboard() for metric in TOP_COURSE_METRICS}
+        
+        # ID-ordered keys for keyset pagination
+        self._user_ids: List[int] = []
+        self._course_ids: List[int] = []
+        self._enrollment_ids: List[int] = []
+        # (enrolled_date, enrollment ID) pairs, sorted, for date range lookups
+        self._enrollment_dates: List[Tuple[date, int]] = []
+        
+        # Undo journal, kept only while a checkpoint exists: checkpoint name ->
+        # (journal length, ID counters) at the time it was taken
+        self._undo_log: Optional[List[UndoEntry]] = None
+        self._checkpoints: Dict[str, Tuple[int, Tuple[int, int, int]]] = {}
+        self._undo_state = _UndoState()
         
-        # Create example enrollment
-        enrollment = Enrollment(
-            id=self._enrollment_counter,
-            user_id=1,
-            course_id=1,
-            enrolled_date=datetime.now().date(),
-            completed=False,
-            created_at=datetime.now()
+        # Initialize with example data
+        if seed_example_data:
+            self._initialize_example_data()
+    
+    def clear(self):
+        """Remove all data and indexes and reset the ID counters"""
+        with self.locked("users", "courses", "enrollments"):
+            if self._journaling():
+                self._record_undo(
+                    "_refill", list(self.users.values()), list(self.courses.values()),
+                    list(self.enrollments.values()), self._counters()
+                )
+            self.users.clear()
+            self.courses.clear()
+            self.enrollments.clear()
+            self._email_index.clear()
+            self._enrollment_index.clear()
+            self._user_enrollments.clear()
+            self._course_enrollments.clear()
+            self._course_stats.clear()
+            for leaderboard in self._top_courses.values():
+                leaderboard.clear()
+            self._user_ids.clear()
+            self._course_ids.clear()
+            self._enrollment_ids.clear()
+            self._enrollment_dates.clear()
+            self._user_counter = 1
+            self._course_counter = 1
+            self._enrollment_counter = 1
+            for collection in ("users", "courses", "enrollments"):
+                self._notify(collection, None, "c")
+    
+    # Users
+    
+    def add_user(self, user: UserRecord):
+        """Store a new user and index its email"""
+        with self.locked("users"):
+            self.users[user.id] = user
+            self._email_index[user.email] = user.id
+            self._insert_id(self._user_ids, user.id)
+            self._record_undo("delete_user", user.id)
+            self._notify("users", user.id, "i")
+    
+    def update_user(self, user_id: int, **fields) -> UserRecord:
+        """Apply field changes to a stored user, keeping the email index and course stats in sync"""
+        with self.locked("users", "enrollments"):
+            user = self.users[user_id]
+            new_email = fields.get("email")
+            if new_email is not None and new_email != user.email:
+                del self._email_index[user.email]
+                self._email_index[new_email] = user_id
+            was_active = user.is_active
+            if self._journaling():
+                self._record_undo("update_user", user_id, **{name: getattr(user, name) for name in fields})
+            for name, value in fields.items():
+                setattr(user, name, value)
+            if user.is_active != was_active:
+                # The user's unfinished enrollments stop or start counting as active learners
+                change = 1 if user.is_active else -1
+                for enrollment_id in self._user_enrollments.get(user_id, ()):
+                    enrollment = self.enrollments[enrollment_id]
+                    if not enrollment.completed:
+                        self._adjust_course_stats(enrollment.course_id, 0, 0, change)
+            self._notify("users", user_id, "u")
+            return user
+    
+    def delete_user(self, user_id: int):
+        """Remove a user and its index entries"""
+        with self.locked("users", "enrollments"):
+            user = self.users.pop(user_id)
+            self._email_index.pop(user.email, None)
+            self._user_enrollments.pop(user_id, None)
+            self._remove_id(self._user_ids, user_id)
+            self._record_undo("add_user", user)
+            self._notify("users", user_id, "d")
+    
+    def get_user_id_by_email(self, email: str) -> Optional[int]:
+        """Look up a user ID by email in O(1)"""
+        examined()
+        return self._email_index.get(email)
+    
+    def get_users_page(self, after_id: Optional[int], limit: int) -> Page:
+        """Get up to `limit` users with an ID greater than `after_id`"""
+        with self.locked("users"):
+            return self._page(self._user_ids, self.users, after_id, limit)
+    
+    # Courses
+    
+    def add_course(self, course: CourseRecord):
+        """Store a new course"""
+        with self.locked("courses", "enrollments"):
+            self.courses[course.id] = course
+            self._insert_id(self._course_ids, course.id)
+            self._rank_course(course.id)
+            self._record_undo("delete_course", course.id)
+            self._notify("courses", course.id, "i")
+    
+    def update_course(self, course_id: int, **fields) -> CourseRecord:
+        """Apply field changes to a stored course"""
+        with self.locked("courses", "enrollments"):
+            course = self.courses[course_id]
+            if self._journaling():
+                self._record_undo("update_course", course_id, **{name: getattr(course, name) for name in fields})
+            for name, value in fields.items():
+                setattr(course, name, value)
+            if "is_open" in fields:
+                self._rank_course(course_id)
+            self._notify("courses", course_id, "u")
+            return course
+    
+    def delete_course(self, course_id: int):
+        """Remove a course and its index entries"""
+        with self.locked("courses", "enrollments"):
+            course = self.courses.pop(course_id)
+            self._course_enrollments.pop(course_id, None)
+            self._course_stats.pop(course_id, None)
+            self._rank_course(course_id)
+            self._remove_id(self._course_ids, course_id)
+            self._record_undo("add_course", course)
+            self._notify("courses", course_id, "d")
+    
+    def get_courses_page(self, after_id: Optional[int], limit: int) -> Page:
+        """Get up to `limit` courses with an ID greater than `after_id`"""
+        with self.locked("courses"):
+            return self._page(self._course_ids, self.courses, after_id, limit)
+    
+    # Enrollments
+    
+    def add_enrollment(self, enrollment: EnrollmentRecord):
+        """Store a new enrollment and add it to the pair and posting-list indexes"""
+        with self.locked("enrollments"):
+            self.enrollments[enrollment.id] = enrollment
+            self._enrollment_index[(enrollment.user_id, enrollment.course_id)] = enrollment.id
+            self._user_enrollments.setdefault(enrollment.user_id, set()).add(enrollment.id)
+            self._course_enrollments.setdefault(enrollment.course_id, set()).add(enrollment.id)
+            self._adjust_course_stats(
+                enrollment.course_id, 1, enrollment.completed, self._is_active_learner(enrollment)
+            )
+            self._insert_id(self._enrollment_ids, enrollment.id)
+            self._insert_date(enrollment.enrolled_date, enrollment.id)
+            self._record_undo("delete_enrollment", enrollment.id)
+            self._notify("enrollments", enrollment.id, "i")
+    
+    def update_enrollment(self, enrollment_id: int, **fields) -> EnrollmentRecord:
+        """Apply field changes to a stored enrollment"""
+        with self.locked("enrollments"):
+            enrollment = self.enrollments[enrollment_id]
+            was_completed = enrollment.completed
+            was_active = self._is_active_learner(enrollment)
+            old_date = enrollment.enrolled_date
+            if self._journaling():
+                self._record_undo(
+                    "update_enrollment", enrollment_id, **{name: getattr(enrollment, name) for name in fields}
+                )
+            for name, value in fields.items():
+                setattr(enrollment, name, value)
+            if enrollment.enrolled_date != old_date:
+                self._remove_date(old_date, enrollment_id)
+                self._insert_date(enrollment.enrolled_date, enrollment_id)
+            self._adjust_course_stats(
+                enrollment.course_id, 0, enrollment.completed - was_completed,
+                self._is_active_learner(enrollment) - was_active
+            )
+            # Write back so stores that hand out copies (the columnar one) see the change
+            self.enrollments[enrollment_id] = enrollment
+            self._notify("enrollments", enrollment_id, "u")
+            return enrollment
+    
+    def delete_enrollment(self, enrollment_id: int):
+        """Remove an enrollment and its index entries"""
+        with self.locked("enrollments"):
+            enrollment = self.enrollments.pop(enrollment_id)
+            self._enrollment_index.pop((enrollment.user_id, enrollment.course_id), None)
+            self._discard_posting(self._user_enrollments, enrollment.user_id, enrollment_id)
+            self._discard_posting(self._course_enrollments, enrollment.course_id, enrollment_id)
+            self._adjust_course_stats(
+                enrollment.course_id, -1, -enrollment.completed, -self._is_active_learner(enrollment)
+            )
+            self._remove_id(self._enrollment_ids, enrollment_id)
+            self._remove_date(enrollment.enrolled_date, enrollment_id)
+            self._record_undo("add_enrollment", enrollment)
+            self._notify("enrollments", enrollment_id, "d")
+    
+    def get_enrollment_id(self, user_id: int, course_id: int) -> Optional[int]:
+        """Look up the enrollment of a user in a course in O(1)"""
+        examined()
+        return self._enrollment_index.get((user_id, course_id))
+    
+    def get_user_enrollment_ids(self, user_id: int) -> List[int]:
+        """Get the IDs of a user's enrollments in ID order"""
+        with self.locked("enrollments"):
+            enrollment_ids = sorted(self._user_enrollments.get(user_id, ()))
+        examined(len(enrollment_ids))
+        return enrollment_ids
+    
+    def get_course_enrollment_ids(self, course_id: int) -> List[int]:
+        """Get the IDs of a course's enrollments in ID order"""
+        with self.locked("enrollments"):
+            enrollment_ids = sorted(self._course_enrollments.get(course_id, ()))
+        examined(len(enrollment_ids))
+        return enrollment_ids
+    
+    def get_enrollments_page(self, after_id: Optional[int], limit: int) -> Page:
+        """Get up to `limit` enrollments with an ID greater than `after_id`"""
+        with self.locked("enrollments"):
+            return self._page(self._enrollment_ids, self.enrollments, after_id, limit)
+    
+    def find_enrollments_page(self, filters: EnrollmentFilter, after_id: Optional[int], limit: int) -> Page:
+        """Get a page of matching enrollments, starting from the most selective index.
+
+        The candidates come from the user's or the course's posting set or
+        the date range, whichever is smallest, and are checked against the
+        other conditions in ID order, so the cost follows the size of that
+        set rather than the number of enrollments.
+        """
+        with self.locked("enrollments"):
+            candidates = None
+            for key, postings in (
+                (filters.user_id, self._user_enrollments),
+                (filters.course_id, self._course_enrollments)
+            ):
+                if key is not None:
+                    posting = postings.get(key, ())
+                    if candidates is None or len(posting) < len(candidates):
+                        candidates = posting
+            if filters.enrolled_from is not None or filters.enrolled_to is not None:
+                start, stop = self._date_range(filters.enrolled_from, filters.enrolled_to)
+                if candidates is None or stop - start < len(candidates):
+                    candidates = [pair[1] for pair in self._enrollment_dates[start:stop]]
+            
+            if candidates is not None:
+                candidate_ids = sorted(
+                    record_id for record_id in candidates if after_id is None or record_id > after_id
+                )
+            else:
+                # Only `completed` (or nothing) to go on: walk IDs until the page is full
+                start = 0 if after_id is None else bisect_right(self._enrollment_ids, after_id)
+                candidate_ids = (self._enrollment_ids[index] for index in range(start, len(self._enrollment_ids)))
+            
+            items = []
+            has_more = False
+            for record_id in candidate_ids:
+                enrollment = self.enrollments[record_id]
+                if filters.matches(enrollment):
+                    if len(items) == limit:
+                        has_more = True
+                        break
+                    items.append(enrollment)
+            return Page(items, items[-1].id if has_more else None)
+    
+    def count_enrollments_by_course(
+        self, enrolled_from: Optional[date], enrolled_to: Optional[date]
+    ) -> Dict[int, Tuple[int, int]]:
+        """Count (enrolled, completed) per course, vectorized over the columns when columnar"""
+        with self.locked("enrollments"):
+            if isinstance(self.enrollments, ColumnarEnrollments):
+                return self.enrollments.count_by_course(enrolled_from, enrolled_to)
+            return super().count_enrollments_by_course(enrolled_from, enrolled_to)
+    
+    def get_course_stats(self, course_id: int) -> Tuple[int, int, int]:
+        """Get (enrolled, completed, active learners) for a course in O(1)"""
+        examined()
+        enrolled, completed, active = self._course_stats.get(course_id, (0, 0, 0))
+        return enrolled, completed, active
+    
+    def _is_active_learner(self, enrollment: EnrollmentRecord) -> bool:
+        if enrollment.completed:
+            return False
+        user = self.users.get(enrollment.user_id)
+        return user is not None and user.is_active
+    
+    def _adjust_course_stats(self, course_id: int, enrolled: int, completed: int, active: int):
+        """Add deltas to a course's counters; caller holds the enrollments lock"""
+        stats = self._course_stats.get(course_id)
+        if stats is None:
+            stats = self._course_stats[course_id] = [0, 0, 0]
+        stats[0] += enrolled
+        stats[1] += completed
+        stats[2] += active
+        if enrolled or completed:
+            self._rank_course(course_id)
+    
+    def _rank_course(self, course_id: int):
+        """Move a course to its current counts in the rankings, or out of them
+        if it is closed or gone; caller holds the enrollments lock"""
+        course = self.courses.get(course_id)
+        stats = self._course_stats.get(course_id, (0, 0, 0))
+        for column, leaderboard in enumerate(self._top_courses.values()):
+            if course is not None and course.is_open:
+                leaderboard.set(course_id, stats[column])
+            else:
+                leaderboard.remove(course_id)
+    
+    def get_top_courses(self, by: str, n: int) -> List[Tuple[int, int]]:
+        """Rank open courses by enrollment or completion count in O(n log courses)"""
+        with self.locked("enrollments"):
+            top_courses = self._top_courses[by].top(n)
+        examined(len(top_courses))
+        return top_courses
+    
+    def user_has_enrollments(self, user_id: int) -> bool:
+        """Check if a user has any enrollments"""
+        examined()
+        return bool(self._user_enrollments.get(user_id))
+    
+    def course_has_enrollments(self, course_id: int) -> bool:
+        """Check if a course has any enrollments"""
+        examined()
+        return bool(self._course_enrollments.get(course_id))
+    
+    @staticmethod
+    def _discard_posting(postings: Dict[int, Set[int]], key: int, enrollment_id: int):
+        """Remove an enrollment ID from a posting list, dropping the list once empty"""
+        ids = postings.get(key)
+        if ids is not None:
+            ids.discard(enrollment_id)
+            if not ids:
+                del postings[key]
+    
+    @staticmethod
+    def _insert_id(ids: List[int], record_id: int):
+        """Insert an ID into a sorted ID list; new IDs are appended in O(1)"""
+        if not ids or record_id > ids[-1]:
+            ids.append(record_id)
+        else:
+            insort(ids, record_id)
+    
+    @staticmethod
+    def _remove_id(ids: List[int], record_id: int):
+        """Remove an ID from a sorted ID list"""
+        index = bisect_left(ids, record_id)
+        if index < len(ids) and ids[index] == record_id:
+            del ids[index]
+    
+    def _insert_date(self, enrolled_date: date, enrollment_id: int):
+        """Add to the date index; today's enrollments land at the end in O(1)"""
+        key = (enrolled_date, enrollment_id)
+        if not self._enrollment_dates or key > self._enrollment_dates[-1]:
+            self._enrollment_dates.append(key)
+        else:
+            insort(self._enrollment_dates, key)
+    
+    def _remove_date(self, enrolled_date: date, enrollment_id: int):
+        key = (enrolled_date, enrollment_id)
+        index = bisect_left(self._enrollment_dates, key)
+        if index < len(self._enrollment_dates) and self._enrollment_dates[index] == key:
+            del self._enrollment_dates[index]
+    
+    def _date_range(self, enrolled_from: Optional[date], enrolled_to: Optional[date]) -> Tuple[int, int]:
+        """Get the slice of the date index between two inclusive bounds"""
+        start = 0 if enrolled_from is None else bisect_left(self._enrollment_dates, (enrolled_from,))
+        stop = len(self._enrollment_dates) if enrolled_to is None else bisect_right(
+            self._enrollment_dates, (enrolled_to, math.inf)
         )
-        self.enrollments[self._enrollment_counter] = enrollment
-        self._enrollment_counter += 1
+        return start, stop
+    
+    @staticmethod
+    def _page(ids: List[int], records: Dict, after_id: Optional[int], limit: int) -> Page:
+        """Seek past `after_id` in a sorted ID list and return the next page"""
+        start = 0 if after_id is None else bisect_right(ids, after_id)
+        page_ids = ids[start:start + limit]
+        has_more = start + limit < len(ids)
+        next_after_id = page_ids[-1] if has_more and page_ids else None
+        return Page([records[record_id] for record_id in page_ids], next_after_id)
+    
+    # Checkpoints
+    
+    def checkpoint(self, name: str):
+        """Mark the current state as `name`, for restore() to return to.
+
+        From the first checkpoint on, every write also journals the call
+        that reverses it, so a restore costs O(writes since the checkpoint)
+        rather than a rebuild. Release checkpoints that are no longer needed;
+        journaling stops once none are left.
+        """
+        with self.locked(*LOCK_ORDER):
+            if self._undo_log is None:
+                self._undo_log = []
+            self._checkpoints[name] = (len(self._undo_log), self._counters())
+    
+    def restore(self, name: str):
+        """Undo every write made since checkpoint `name` and reset the ID counters to what they were.
+
+        The checkpoint can be restored again later; checkpoints taken after
+        it are dropped. Writes are undone through the add/update/delete
+        methods, so indexes, change listeners and caches follow. Undoing an
+        insert is a delete, which leaves the ID a version of its own, so a
+        record given the ID again does not match the old record's ETags.
+        """
+        with self.locked(*LOCK_ORDER):
+            position, counters = self._checkpoints[name]
+            entries = self._undo_log[position:]
+            del self._undo_log[position:]
+            self._undo_state.replaying = True
+            try:
+                self._undo(entries)
+            finally:
+                self._undo_state.replaying = False
+            self._user_counter, self._course_counter, self._enrollment_counter = counters
+            for other, (other_position, _) in list(self._checkpoints.items()):
+                if other_position > position:
+                    del self._checkpoints[other]
+    
+    def release(self, name: str):
+        """Forget checkpoint `name`"""
+        with self.locked(*LOCK_ORDER):
+            del self._checkpoints[name]
+            if not self._checkpoints:
+                self._undo_log = None
+    
+    @contextmanager
+    def atomic(self, *collections: str) -> Iterator[None]:
+        """Hold the write locks of `collections`; if the block raises, undo the writes this thread made in it.
+
+        IDs allocated in a rolled back block are not handed out again.
+        Blocks nest: an inner rollback undoes only the inner block's writes.
+        """
+        scopes = self._undo_state.scopes
+        with self.locked(*collections):
+            scope: List[UndoEntry] = []
+            scopes.append(scope)
+            try:
+                yield
+            except BaseException:
+                scopes.pop()
+                self._undo(scope)
+                raise
+            scopes.pop()
+    
+    def _journaling(self) -> bool:
+        """Whether writes are being journaled, to skip collecting old values when not"""
+        state = self._undo_state
+        return (self._undo_log is not None or bool(state.scopes)) and not state.replaying
+    
+    def _record_undo(self, method: str, *args, **fields):
+        """Journal the call that reverses a write; caller holds the collection's lock"""
+        if not self._journaling():
+            return
+        entry = (method, args, fields)
+        if self._undo_log is not None:
+            self._undo_log.append(entry)
+        for scope in self._undo_state.scopes:
+            scope.append(entry)
+    
+    def _undo(self, entries: List[UndoEntry]):
+        for method, args, fields in reversed(entries):
+            getattr(self, method)(*args, **fields)
+    
+    def _refill(
+        self,
+        users: List[UserRecord],
+        courses: List[CourseRecord],
+        enrollments: List[EnrollmentRecord],
+        counters: Tuple[int, int, int]
+    ):
+        """Undo a clear() by adding back what it removed"""
+        with self.locked(*LOCK_ORDER):
+            for user in users:
+                self.add_user(user)
+            for course in courses:
+                self.add_course(course)
+            for enrollment in enrollments:
+                self.add_enrollment(enrollment)
+            # Never move a counter back below IDs handed out since
+            self._user_counter, self._course_counter, self._enrollment_counter = (
+                max(pair) for pair in zip(counters, self._counters())
+            )
+    
+    def _counters(self) -> Tuple[int, int, int]:
+        return self._user_counter, self._course_counter, self._enrollment_counter
     
     def get_next_user_id(self) -> int:
         """Get the next available user ID"""
@@ -65,6 +547,27 @@ class Database:
         """Get the next available enrollment ID"""
         return self._enrollment_counter
     
+    def allocate_user_id(self) -> int:
+        """Atomically take the next user ID"""
+        with self._id_lock:
+            user_id = self._user_counter
+            self._user_counter += 1
+            return user_id
+    
+    def allocate_course_id(self) -> int:
+        """Atomically take the next course ID"""
+        with self._id_lock:
+            course_id = self._course_counter
+            self._course_counter += 1
+            return course_id
+    
+    def allocate_enrollment_id(self) -> int:
+        """Atomically take the next enrollment ID"""
+        with self._id_lock:
+            enrollment_id = self._enrollment_counter
+            self._enrollment_counter += 1
+            return enrollment_id
+    
     def increment_user_counter(self):
         """Increment the user counter"""
         self._user_counter += 1
@@ -78,5 +581,21 @@ class Database:
         self._enrollment_counter += 1
 
 
+def create_database(config: Settings = settings) -> StorageBackend:
+    """Create the storage backend selected by the configuration"""
+    if config.storage_backend == "memory":
+        columnar = config.enrollment_store == "columnar"
+        if config.data_dir:
+            from services.durable_database import DurableDatabase
+            return DurableDatabase(
+                config.data_dir, config.wal_fsync_interval, config.snapshot_interval, columnar
+            )
+        return Database(columnar_enrollments=columnar)
+    if config.storage_backend == "sqlite":
+        from services.sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(config.sqlite_path, config.sqlite_pool_size, config.change_poll_interval)
+    raise ValueError(f"Unknown storage backend: {config.storage_backend!r}")
+
+
 # Global database instance
-db = Database()
+db = create_database()
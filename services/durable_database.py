@@ -0,0 +1,336 @@
+import json
+import logging
+import os
+import pickle
+import re
+import threading
+from typing import Iterator, List, Optional, Tuple
+from services.database import Database
+from services.records import CourseRecord, EnrollmentRecord, UserRecord, record_from_json, record_to_json
+from services.storage import LOCK_ORDER
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "snapshot.pkl"
+SNAPSHOT_VERSION = 1
+SEGMENT_NAME = "wal-{:08d}.log"
+SEGMENT_PATTERN = re.compile(r"^wal-(\d{8})\.log$")
+
+# Log and snapshot table names mapped to their record type and singular method suffix
+TABLES = {
+    "users": (UserRecord, "user"),
+    "courses": (CourseRecord, "course"),
+    "enrollments": (EnrollmentRecord, "enrollment"),
+}
+
+
+def list_segments(directory: str) -> List[Tuple[int, str]]:
+    """List the log segments in a directory, oldest first"""
+    segments = []
+    for name in os.listdir(directory):
+        match = SEGMENT_PATTERN.match(name)
+        if match:
+            segments.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def read_segment(path: str) -> Iterator[list]:
+    """Yield the records of one log segment, stopping at a torn final write"""
+    with open(path, "rb") as segment:
+        for line in segment:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning("Ignoring truncated record at the end of %s", path)
+                return
+
+
+class WriteAheadLog:
+    """Append-only, segmented mutation log with group commit.
+
+    Appends only queue an encoded line; a background thread writes and
+    fsyncs everything queued once per `fsync_interval`, so many writes share
+    one fsync. An interval of 0 writes and fsyncs on every append.
+    """
+    
+    def __init__(self, directory: str, segment: int, fsync_interval: float):
+        self._directory = directory
+        self._fsync_interval = fsync_interval
+        self._pending: List[bytes] = []
+        self._pending_lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self.segment = segment
+        self._file = open(os.path.join(directory, SEGMENT_NAME.format(segment)), "ab")
+        self._stopped = threading.Event()
+        self._flusher = None
+        if fsync_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="wal-flusher", daemon=True)
+            self._flusher.start()
+    
+    def append(self, record: tuple):
+        """Queue one record for the next group commit"""
+        line = json.dumps(record, separators=(",", ":"), default=str).encode() + b"\n"
+        with self._pending_lock:
+            self._pending.append(line)
+        if self._fsync_interval <= 0:
+            self.sync()
+    
+    def sync(self):
+        """Write and fsync every queued record"""
+        with self._io_lock:
+            self._write_pending()
+    
+    def rotate(self) -> int:
+        """Sync the current segment and start a new one; returns the new segment number"""
+        with self._io_lock:
+            self._write_pending()
+            self._file.close()
+            self.segment += 1
+            self._file = open(os.path.join(self._directory, SEGMENT_NAME.format(self.segment)), "ab")
+            return self.segment
+    
+    def close(self):
+        """Stop the flusher and sync what is left"""
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._io_lock:
+            self._write_pending()
+            self._file.close()
+    
+    def _write_pending(self):
+        """Write queued records to the current segment; caller holds the I/O lock"""
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._file.write(b"".join(batch))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+    
+    def _flush_loop(self):
+        while not self._stopped.wait(self._fsync_interval):
+            try:
+                self.sync()
+            except OSError:
+                logger.exception("Write-ahead log flush failed")
+
+
+class DurableDatabase(Database):
+    """In-memory database made durable by a write-ahead log and periodic snapshots.
+
+    Startup loads the latest snapshot and replays the log segments written
+    since. Snapshots are fuzzy: the log is rotated first, then the state is
+    copied while writes continue, which is safe because every log record
+    replays idempotently (inserts are upserts, updates and deletes of
+    missing records are skipped).
+    """
+    
+    def __init__(
+        self,
+        data_dir: str,
+        fsync_interval: float = 0.05,
+        snapshot_interval: float = 300.0,
+        columnar_enrollments: bool = False
+    ):
+        super().__init__(seed_example_data=False, columnar_enrollments=columnar_enrollments)
+        os.makedirs(data_dir, exist_ok=True)
+        self._data_dir = data_dir
+        self._log: Optional[WriteAheadLog] = None
+        self._snapshot_lock = threading.Lock()
+        
+        segment, recovered = self._recover()
+        self._log = WriteAheadLog(data_dir, segment, fsync_interval)
+        if not recovered:
+            self._initialize_example_data()
+        
+        self._stopped = threading.Event()
+        self._snapshotter = None
+        if snapshot_interval > 0:
+            self._snapshotter = threading.Thread(
+                target=self._snapshot_loop, args=(snapshot_interval,), name="snapshotter", daemon=True
+            )
+            self._snapshotter.start()
+    
+    def close(self):
+        """Stop the snapshotter and flush the log"""
+        self._stopped.set()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        self._log.close()
+    
+    # Logged mutations. Each override holds the collection lock across the
+    # change and the append, so records reach the log in the order applied.
+    
+    def _append(self, *record):
+        # Recovery replays through the same methods with the log detached
+        if self._log is not None:
+            self._log.append(record)
+    
+    def clear(self):
+        with self.locked("users", "courses", "enrollments"):
+            super().clear()
+            self._append("c")
+    
+    def add_user(self, user: UserRecord):
+        with self.locked("users"):
+            super().add_user(user)
+            self._append("i", "users", record_to_json(user))
+    
+    def update_user(self, user_id: int, **fields) -> UserRecord:
+        with self.locked("users", "enrollments"):
+            user = super().update_user(user_id, **fields)
+            self._append("u", "users", user_id, fields)
+            return user
+    
+    def delete_user(self, user_id: int):
+        with self.locked("users", "enrollments"):
+            super().delete_user(user_id)
+            self._append("d", "users", user_id)
+    
+    def add_course(self, course: CourseRecord):
+        with self.locked("courses", "enrollments"):
+            super().add_course(course)
+            self._append("i", "courses", record_to_json(course))
+    
+    def update_course(self, course_id: int, **fields) -> CourseRecord:
+        with self.locked("courses", "enrollments"):
+            course = super().update_course(course_id, **fields)
+            self._append("u", "courses", course_id, fields)
+            return course
+    
+    def delete_course(self, course_id: int):
+        with self.locked("courses", "enrollments"):
+            super().delete_course(course_id)
+            self._append("d", "courses", course_id)
+    
+    def add_enrollment(self, enrollment: EnrollmentRecord):
+        with self.locked("enrollments"):
+            super().add_enrollment(enrollment)
+            self._append("i", "enrollments", record_to_json(enrollment))
+    
+    def update_enrollment(self, enrollment_id: int, **fields) -> EnrollmentRecord:
+        with self.locked("enrollments"):
+            enrollment = super().update_enrollment(enrollment_id, **fields)
+            self._append("u", "enrollments", enrollment_id, fields)
+            return enrollment
+    
+    def delete_enrollment(self, enrollment_id: int):
+        with self.locked("enrollments"):
+            super().delete_enrollment(enrollment_id)
+            self._append("d", "enrollments", enrollment_id)
+    
+    # Snapshots
+    
+    def snapshot(self):
+        """Write the full state to disk and drop the log segments it covers"""
+        with self._snapshot_lock:
+            segment = self._log.rotate()
+            # The copy is taken under the collection locks, since iterating a
+            # columnar store is not atomic; records changed after the rotation
+            # are fixed up by replaying the new segment
+            with self.locked(*LOCK_ORDER):
+                state = {
+                    "version": SNAPSHOT_VERSION,
+                    "segment": segment,
+                    "counters": (self._user_counter, self._course_counter, self._enrollment_counter),
+                    "users": [
+                        (user.id, user.name, user.email, user.is_active, user.created_at)
+                        for user in self.users.values()
+                    ],
+                    "courses": [
+                        (course.id, course.title, course.description, course.is_open, course.created_at)
+                        for course in self.courses.values()
+                    ],
+                    "enrollments": [
+                        (e.id, e.user_id, e.course_id, e.enrolled_date, e.completed, e.created_at)
+                        for e in self.enrollments.values()
+                    ],
+                }
+            
+            path = os.path.join(self._data_dir, SNAPSHOT_FILE)
+            with open(path + ".tmp", "wb") as snapshot_file:
+                pickle.dump(state, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+                snapshot_file.flush()
+                os.fsync(snapshot_file.fileno())
+            os.replace(path + ".tmp", path)
+            
+            for number, segment_path in list_segments(self._data_dir):
+                if number < segment:
+                    os.remove(segment_path)
+            logger.info(
+                "Snapshot written: %d users, %d courses, %d enrollments",
+                len(state["users"]), len(state["courses"]), len(state["enrollments"])
+            )
+    
+    def _snapshot_loop(self, interval: float):
+        while not self._stopped.wait(interval):
+            try:
+                self.snapshot()
+            except Exception:
+                # Keep the thread alive so a later snapshot can still trim the log
+                logger.exception("Snapshot failed")
+    
+    # Recovery
+    
+    def _recover(self) -> Tuple[int, bool]:
+        """Load the snapshot and replay the log; returns the next segment number and whether any state was found"""
+        first_segment = 1
+        recovered = False
+        path = os.path.join(self._data_dir, SNAPSHOT_FILE)
+        if os.path.exists(path):
+            with open(path, "rb") as snapshot_file:
+                state = pickle.load(snapshot_file)
+            self._load_snapshot(state)
+            first_segment = state["segment"]
+            recovered = True
+        
+        # Always continue in a fresh segment so a torn tail is never followed by new records
+        next_segment = first_segment
+        replayed = 0
+        for number, segment_path in list_segments(self._data_dir):
+            if number < first_segment:
+                continue
+            for record in read_segment(segment_path):
+                self._apply(record)
+                replayed += 1
+            next_segment = number + 1
+            recovered = True
+        
+        if recovered:
+            logger.info("Recovered %d log records on top of the snapshot", replayed)
+        return next_segment, recovered
+    
+    def _load_snapshot(self, state: dict):
+        """Rebuild the collections and indexes from a snapshot"""
+        if state["version"] != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {state['version']}")
+        for table, (record_type, name) in TABLES.items():
+            # The base class methods index the rows without logging them again
+            add = getattr(Database, f"add_{name}")
+            for row in state[table]:
+                # Rows hold the fields in the record's declaration order
+                add(self, record_type(*row))
+        self._user_counter, self._course_counter, self._enrollment_counter = state["counters"]
+    
+    def _apply(self, record: list):
+        """Replay one log record idempotently"""
+        if record[0] == "c":
+            self.clear()
+            return
+        
+        operation, table = record[0], record[1]
+        record_type, name = TABLES[table]
+        collection = getattr(self, table)
+        if operation == "i":
+            item = record_from_json(record_type, record[2])
+            if item.id in collection:
+                getattr(self, f"delete_{name}")(item.id)
+            getattr(self, f"add_{name}")(item)
+            counter = f"_{name}_counter"
+            setattr(self, counter, max(getattr(self, counter), item.id + 1))
+        elif operation == "u":
+            if record[2] in collection:
+                getattr(self, f"update_{name}")(record[2], **record[3])
+        elif operation == "d":
+            if record[2] in collection:
+                getattr(self, f"delete_{name}")(record[2])
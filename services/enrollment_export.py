@@ -0,0 +1,103 @@
+import csv
+import io
+from typing import Iterator, List, Optional
+from schemas.enrollment import EnrollmentWithDetails
+from services.batch_loader import BatchLoader
+from services.database import db
+from services.records import EnrollmentRecord
+from services.storage import EnrollmentFilter
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+EXPORT_COLUMNS = tuple(EnrollmentWithDetails.model_fields)
+
+
+class EnrollmentExporter:
+    """Stream every enrollment matching the filters, joined with user and course details.
+
+    Enrollments are read one batch at a time by resuming after the last ID,
+    and the joined names are looked up per batch, so memory stays constant
+    however many rows are exported. Rows changed during the export show up
+    as they are when their batch is read.
+    """
+    
+    def __init__(
+        self,
+        format: str,
+        course_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        completed: Optional[bool] = None,
+        batch_size: int = EXPORT_BATCH_SIZE
+    ):
+        self.format = format
+        self.media_type = EXPORT_MEDIA_TYPES[format]
+        self.course_id = course_id
+        self.user_id = user_id
+        self.completed = completed
+        self.batch_size = batch_size
+    
+    def __iter__(self) -> Iterator[bytes]:
+        """Yield the encoded export, one chunk per batch"""
+        if self.format == "csv":
+            yield self._encode_csv([EXPORT_COLUMNS])
+        for rows in self._joined_batches():
+            if not rows:
+                continue
+            if self.format == "csv":
+                yield self._encode_csv(
+                    [[self._csv_value(getattr(row, column)) for column in EXPORT_COLUMNS] for row in rows]
+                )
+            else:
+                yield b"".join(row.__pydantic_serializer__.to_json(row) + b"\n" for row in rows)
+    
+    def _batches(self) -> Iterator[List[EnrollmentRecord]]:
+        """Yield the matching enrollments in ID order, one batch at a time"""
+        filters = EnrollmentFilter(self.course_id, self.user_id, self.completed)
+        after_id = None
+        while True:
+            page = db.find_enrollments_page(filters, after_id, self.batch_size)
+            yield page.items
+            if page.next_after_id is None:
+                return
+            after_id = page.next_after_id
+    
+    def _joined_batches(self) -> Iterator[List[EnrollmentWithDetails]]:
+        """Join each batch with user names and course titles, loading each distinct user and course once per batch"""
+        for batch in self._batches():
+            users = BatchLoader(db, "users").load_many(enrollment.user_id for enrollment in batch)
+            courses = BatchLoader(db, "courses").load_many(enrollment.course_id for enrollment in batch)
+            # Rows whose user or course was deleted mid-export are skipped
+            yield [
+                EnrollmentWithDetails.model_construct(
+                    id=enrollment.id,
+                    user_id=enrollment.user_id,
+                    course_id=enrollment.course_id,
+                    enrolled_date=enrollment.enrolled_date,
+                    completed=enrollment.completed,
+                    created_at=enrollment.created_at,
+                    user_name=user.name,
+                    course_title=course.title
+                )
+                for enrollment, user, course in zip(batch, users, courses)
+                if user is not None and course is not None
+            ]
+    
+    @staticmethod
+    def _csv_value(value) -> str:
+        """Format a value the way the JSON responses do"""
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return str(value)
+    
+    @staticmethod
+    def _encode_csv(rows: List[list]) -> bytes:
+        output = io.StringIO()
+        csv.writer(output, lineterminator="\n").writerows(rows)
+        return output.getvalue().encode()
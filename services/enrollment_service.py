@@ -1,166 +1,227 @@
 from datetime import datetime, date
-from typing import List, Optional
+from typing import List, Optional, Union
 from fastapi import HTTPException, status
-from schemas.enrollment import Enrollment, EnrollmentCreate, EnrollmentUpdate, EnrollmentWithDetails
+from schemas.enrollment import EnrollmentCreate, EnrollmentSummary, EnrollmentUpdate
 from services.database import db
+from services.enrollment_view import get_enrollment_view
+from services.pagination import DEFAULT_PAGE_SIZE, Page
+from services.records import EnrollmentDetailsRecord, EnrollmentRecord
+from services.storage import EnrollmentFilter
 from services.user_service import UserService
 from services.course_service import CourseService
+from services.scan_cost import accounted
 
 
 class EnrollmentService:
     @staticmethod
-    def enroll_user(enrollment_data: EnrollmentCreate) -> Enrollment:
+    @accounted
+    def enroll_user(enrollment_data: EnrollmentCreate) -> EnrollmentRecord:
         """Enroll a user in a course"""
-        # Validate user exists and is active
-        if not UserService.is_user_active(enrollment_data.user_id):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="User not found or not active"
-            )
-        
-        # Validate course exists and is open
-        if not CourseService.is_course_open(enrollment_data.course_id):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Course not found or not open for enrollment"
-            )
-        
-        # Check if user is already enrolled in this course
-        for enrollment in db.enrollments.values():
-            if (enrollment.user_id == enrollment_data.user_id and 
-                enrollment.course_id == enrollment_data.course_id):
+        with db.locked("enrollments"):
+            # Validate user exists and is active
+            if not UserService.is_user_active(enrollment_data.user_id):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="User not found or not active"
+                )
+            
+            # Validate course exists and is open
+            if not CourseService.is_course_open(enrollment_data.course_id):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Course not found or not open for enrollment"
+                )
+            
+            # Check if user is already enrolled in this course
+            if db.get_enrollment_id(enrollment_data.user_id, enrollment_data.course_id) is not None:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="User is already enrolled in this course"
                 )
-        
-        enrollment_id = db.get_next_enrollment_id()
-        enrolled_date = enrollment_data.enrolled_date or date.today()
-        
-        enrollment = Enrollment(
-            id=enrollment_id,
-            user_id=enrollment_data.user_id,
-            course_id=enrollment_data.course_id,
-            enrolled_date=enrolled_date,
-            completed=False,
-            created_at=datetime.now()
-        )
-        
-        db.enrollments[enrollment_id] = enrollment
-        db.increment_enrollment_counter()
-        return enrollment
+            
+            enrolled_date = enrollment_data.enrolled_date or date.today()
+            
+            enrollment = EnrollmentRecord(
+                id=db.allocate_enrollment_id(),
+                user_id=enrollment_data.user_id,
+                course_id=enrollment_data.course_id,
+                enrolled_date=enrolled_date,
+                completed=False,
+                created_at=datetime.now()
+            )
+            
+            db.add_enrollment(enrollment)
+            return enrollment
+    
+    @staticmethod
+    @accounted
+    def bulk_enroll(items: List[EnrollmentCreate]) -> List[Union[EnrollmentRecord, str]]:
+        """Enroll many users at once, validating each distinct user and course only once.
+
+        Returns, per item, the created enrollment or the reason it was rejected.
+        """
+        # Nothing of the batch is kept if storing part of it fails
+        with db.atomic("enrollments"):
+            active_users = {
+                user_id: UserService.is_user_active(user_id)
+                for user_id in {item.user_id for item in items}
+            }
+            open_courses = {
+                course_id: CourseService.is_course_open(course_id)
+                for course_id in {item.course_id for item in items}
+            }
+            
+            results = []
+            new_enrollments = []
+            batch_pairs = set()
+            today = date.today()
+            for item in items:
+                pair = (item.user_id, item.course_id)
+                if not active_users[item.user_id]:
+                    reason = "User not found or not active"
+                elif not open_courses[item.course_id]:
+                    reason = "Course not found or not open for enrollment"
+                elif pair in batch_pairs or db.get_enrollment_id(*pair) is not None:
+                    reason = "User is already enrolled in this course"
+                else:
+                    reason = None
+                
+                if reason is not None:
+                    results.append(reason)
+                    continue
+                
+                batch_pairs.add(pair)
+                enrollment = EnrollmentRecord(
+                    id=db.allocate_enrollment_id(),
+                    user_id=item.user_id,
+                    course_id=item.course_id,
+                    enrolled_date=item.enrolled_date or today,
+                    completed=False,
+                    created_at=datetime.now()
+                )
+                new_enrollments.append(enrollment)
+                results.append(enrollment)
+            
+            db.add_enrollments(new_enrollments)
+            return results
     
     @staticmethod
-    def get_enrollment(enrollment_id: int) -> Enrollment:
+    @accounted
+    def get_enrollment(enrollment_id: int) -> EnrollmentRecord:
         """Get an enrollment by ID"""
-        if enrollment_id not in db.enrollments:
+        enrollment = db.enrollments.get(enrollment_id)
+        if enrollment is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Enrollment not found"
             )
-        return db.enrollments[enrollment_id]
+        return enrollment
     
     @staticmethod
-    def get_all_enrollments() -> List[Enrollment]:
-        """Get all enrollments"""
-        return list(db.enrollments.values())
+    @accounted
+    def get_all_enrollments(
+        after_id: Optional[int] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        filters: EnrollmentFilter = EnrollmentFilter()
+    ) -> Page:
+        """Get a page of enrollments matching `filters` in ID order, starting after `after_id`"""
+        if (
+            filters.enrolled_from is not None and filters.enrolled_to is not None
+            and filters.enrolled_from > filters.enrolled_to
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="enrolled_from must not be after enrolled_to"
+            )
+        return db.find_enrollments_page(filters, after_id, limit)
     
     @staticmethod
-    def get_user_enrollments(user_id: int) -> List[EnrollmentWithDetails]:
-        """Get all enrollments for a specific user"""
-        if user_id not in db.users:
+    @accounted
+    def get_enrollment_summary(
+        enrolled_from: Optional[date] = None, enrolled_to: Optional[date] = None
+    ) -> EnrollmentSummary:
+        """Get enrollment and completion counts per course, optionally within a date range"""
+        if enrolled_from is not None and enrolled_to is not None and enrolled_from > enrolled_to:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="enrolled_from must not be after enrolled_to"
             )
-        
-        user_enrollments = []
-        for enrollment in db.enrollments.values():
-            if enrollment.user_id == user_id:
-                # Get user and course details
-                user = db.users[enrollment.user_id]
-                course = db.courses[enrollment.course_id]
-                
-                enrollment_with_details = EnrollmentWithDetails(
-                    id=enrollment.id,
-                    user_id=enrollment.user_id,
-                    course_id=enrollment.course_id,
-                    enrolled_date=enrollment.enrolled_date,
-                    completed=enrollment.completed,
-                    created_at=enrollment.created_at,
-                    user_name=user.name,
-                    course_title=course.title
+        return db.summarize_enrollments(enrolled_from, enrolled_to)
+    
+    @staticmethod
+    @accounted
+    def get_user_enrollments(user_id: int) -> List[EnrollmentDetailsRecord]:
+        """Get all enrollments for a specific user"""
+        with db.locked("enrollments"):
+            if user_id not in db.users:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User not found"
                 )
-                user_enrollments.append(enrollment_with_details)
-        
-        return user_enrollments
+            
+            return EnrollmentService._with_details(db.get_user_enrollment_ids(user_id))
     
     @staticmethod
-    def get_course_enrollments(course_id: int) -> List[EnrollmentWithDetails]:
+    @accounted
+    def get_course_enrollments(course_id: int) -> List[EnrollmentDetailsRecord]:
         """Get all enrollments for a specific course"""
-        if course_id not in db.courses:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Course not found"
-            )
-        
-        course_enrollments = []
-        for enrollment in db.enrollments.values():
-            if enrollment.course_id == course_id:
-                # Get user and course details
-                user = db.users[enrollment.user_id]
-                course = db.courses[enrollment.course_id]
-                
-                enrollment_with_details = EnrollmentWithDetails(
-                    id=enrollment.id,
-                    user_id=enrollment.user_id,
-                    course_id=enrollment.course_id,
-                    enrolled_date=enrollment.enrolled_date,
-                    completed=enrollment.completed,
-                    created_at=enrollment.created_at,
-                    user_name=user.name,
-                    course_title=course.title
+        with db.locked("enrollments"):
+            if course_id not in db.courses:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Course not found"
                 )
-                course_enrollments.append(enrollment_with_details)
-        
-        return course_enrollments
+            
+            return EnrollmentService._with_details(db.get_course_enrollment_ids(course_id))
     
     @staticmethod
-    def mark_completion(enrollment_id: int, completed: bool = True) -> Enrollment:
+    def _with_details(enrollment_ids: List[int]) -> List[EnrollmentDetailsRecord]:
+        """Join enrollments with their user's name and course's title.
+
+        Rows come from the materialized enrollment view, which builds only
+        those it has not seen and keeps names and titles up to date.
+        """
+        return get_enrollment_view(db).rows(enrollment_ids)
+    
+    @staticmethod
+    @accounted
+    def mark_completion(enrollment_id: int, completed: bool = True) -> EnrollmentRecord:
         """Mark a course as completed or not completed"""
-        if enrollment_id not in db.enrollments:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Enrollment not found"
-            )
-        
-        enrollment = db.enrollments[enrollment_id]
-        enrollment.completed = completed
-        return enrollment
+        with db.locked("enrollments"):
+            if enrollment_id not in db.enrollments:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Enrollment not found"
+                )
+            
+            return db.update_enrollment(enrollment_id, completed=completed)
     
     @staticmethod
-    def update_enrollment(enrollment_id: int, enrollment_data: EnrollmentUpdate) -> Enrollment:
+    @accounted
+    def update_enrollment(enrollment_id: int, enrollment_data: EnrollmentUpdate) -> EnrollmentRecord:
         """Update an enrollment"""
-        if enrollment_id not in db.enrollments:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Enrollment not found"
-            )
-        
-        enrollment = db.enrollments[enrollment_id]
-        
-        if enrollment_data.completed is not None:
-            enrollment.completed = enrollment_data.completed
-        
-        return enrollment
+        with db.locked("enrollments"):
+            if enrollment_id not in db.enrollments:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Enrollment not found"
+                )
+            
+            changes = {}
+            if enrollment_data.completed is not None:
+                changes["completed"] = enrollment_data.completed
+            
+            return db.update_enrollment(enrollment_id, **changes)
     
     @staticmethod
+    @accounted
     def delete_enrollment(enrollment_id: int) -> None:
         """Delete an enrollment"""
-        if enrollment_id not in db.enrollments:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Enrollment not found"
-            )
-        
-        del db.enrollments[enrollment_id]
+        with db.locked("enrollments"):
+            if enrollment_id not in db.enrollments:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Enrollment not found"
+                )
+            
+            db.delete_enrollment(enrollment_id)
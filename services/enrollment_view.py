@@ -0,0 +1,209 @@
+import threading
+from dataclasses import replace
+from typing import Dict, List, Optional, Set, Tuple
+from fastapi import Response
+from services.batch_loader import BatchLoader
+from services.database import db
+from services.records import EnrollmentDetailsRecord, to_model
+from services.scan_cost import examined
+
+# Rows kept materialized; the least recently built are dropped beyond this
+MAX_VIEW_ROWS = 200_000
+
+
+class EnrollmentDetailsView:
+    """Materialized EnrollmentDetailsRecord rows, with their encoded JSON.
+
+    Rows are built on first read and then kept. Reverse indexes from user
+    and course IDs to row IDs let a change to a user or course patch just
+    the rows showing its name or title, and a change to an enrollment
+    drops its row to be rebuilt on the next read. As in the search index,
+    change notifications only queue the changed IDs; each read applies
+    them first.
+    
+    Notifications of changes made by other processes sharing a SQLite file
+    come late, so each row also keeps the enrollment, user and course
+    versions it was built from, read before the data as in JsonCache. Every
+    read checks them against the current versions and rebuilds the rows
+    that are behind.
+    """
+    
+    def __init__(self, database, max_rows: int = MAX_VIEW_ROWS):
+        self._database = database
+        self._max_rows = max_rows
+        # enrollment ID -> (row, its JSON or None until first encoded,
+        # the (enrollment, user, course) versions it was built from)
+        self._rows: Dict[int, Tuple[EnrollmentDetailsRecord, Optional[bytes], Tuple[int, int, int]]] = {}
+        self._by_user: Dict[int, Set[int]] = {}
+        self._by_course: Dict[int, Set[int]] = {}
+        self._lock = threading.Lock()
+        
+        # Written by change listeners, which may hold collection locks, so
+        # guarded by its own lock that is never held while taking another
+        self._pending_lock = threading.Lock()
+        self._pending: Dict[str, Set[int]] = {"users": set(), "courses": set(), "enrollments": set()}
+        self._reset = False
+        database.add_change_listener(self._on_change)
+    
+    def rows(self, enrollment_ids: List[int]) -> List[EnrollmentDetailsRecord]:
+        """The rows of these enrollments, in the same order, building the ones not materialized yet"""
+        with self._lock:
+            self._catch_up()
+            self._drop_stale(enrollment_ids)
+            missing = [enrollment_id for enrollment_id in enrollment_ids if enrollment_id not in self._rows]
+            examined(len(enrollment_ids) - len(missing))
+            if missing:
+                self._build(missing)
+            return [self._rows[enrollment_id][0] for enrollment_id in enrollment_ids if enrollment_id in self._rows]
+    
+    def encode_list(self, rows: List[EnrollmentDetailsRecord]) -> bytes:
+        """Assemble a JSON array of rows, reusing the JSON of materialized ones"""
+        fragments = []
+        with self._lock:
+            for row in rows:
+                entry = self._rows.get(row.id)
+                if entry is None or entry[0] is not row:
+                    # Patched or dropped since it was read
+                    fragments.append(self._encode(row))
+                    continue
+                encoded = entry[1]
+                if encoded is None:
+                    encoded = self._encode(row)
+                    self._rows[row.id] = (row, encoded, entry[2])
+                fragments.append(encoded)
+        return b"[" + b",".join(fragments) + b"]"
+    
+    def reset(self):
+        """Drop every materialized row; each is rebuilt when next read"""
+        with self._pending_lock:
+            self._reset = True
+    
+    @staticmethod
+    def _encode(row: EnrollmentDetailsRecord) -> bytes:
+        # The response model is only built to be encoded, once per row version
+        model = to_model(row)
+        return model.__pydantic_serializer__.to_json(model)
+    
+    def _drop_stale(self, enrollment_ids: List[int]):
+        """Drop the rows built from older versions than the current ones; caller holds self._lock"""
+        entries = [self._rows[enrollment_id] for enrollment_id in enrollment_ids if enrollment_id in self._rows]
+        if not entries:
+            return
+        enrollment_versions = self._database.get_versions("enrollments", [row.id for row, _, _ in entries])
+        user_versions = self._database.get_versions("users", {row.user_id for row, _, _ in entries})
+        course_versions = self._database.get_versions("courses", {row.course_id for row, _, _ in entries})
+        for row, _, versions in entries:
+            if versions != (enrollment_versions[row.id], user_versions[row.user_id], course_versions[row.course_id]):
+                self._drop(row.id)
+    
+    def _build(self, enrollment_ids: List[int]):
+        """Materialize rows, loading each distinct user and course once; caller holds self._lock"""
+        enrollment_versions = self._database.get_versions("enrollments", enrollment_ids)
+        enrollments = [
+            enrollment for enrollment in BatchLoader(self._database, "enrollments").load_many(enrollment_ids)
+            if enrollment is not None
+        ]
+        user_versions = self._database.get_versions("users", {enrollment.user_id for enrollment in enrollments})
+        users = BatchLoader(self._database, "users").load_many(enrollment.user_id for enrollment in enrollments)
+        course_versions = self._database.get_versions("courses", {enrollment.course_id for enrollment in enrollments})
+        courses = BatchLoader(self._database, "courses").load_many(enrollment.course_id for enrollment in enrollments)
+        for enrollment, user, course in zip(enrollments, users, courses):
+            if user is None or course is None:
+                continue
+            row = EnrollmentDetailsRecord(
+                id=enrollment.id,
+                user_id=enrollment.user_id,
+                course_id=enrollment.course_id,
+                enrolled_date=enrollment.enrolled_date,
+                completed=enrollment.completed,
+                created_at=enrollment.created_at,
+                user_name=user.name,
+                course_title=course.title
+            )
+            versions = (enrollment_versions[row.id], user_versions[row.user_id], course_versions[row.course_id])
+            self._rows[row.id] = (row, None, versions)
+            self._by_user.setdefault(row.user_id, set()).add(row.id)
+            self._by_course.setdefault(row.course_id, set()).add(row.id)
+        while len(self._rows) > self._max_rows:
+            self._drop(next(iter(self._rows)))
+    
+    def _drop(self, enrollment_id: int):
+        entry = self._rows.pop(enrollment_id, None)
+        if entry is None:
+            return
+        row = entry[0]
+        for index, key in ((self._by_user, row.user_id), (self._by_course, row.course_id)):
+            row_ids = index[key]
+            row_ids.discard(enrollment_id)
+            if not row_ids:
+                del index[key]
+    
+    def _patch(self, index: Dict[int, Set[int]], key: int, field: str, value: Optional[str], version: int):
+        """Set `field` on the rows of a user or course, or drop them if it no longer exists.
+        
+        `version` is the user or course version read before `value`; it
+        replaces the one the rows were built from.
+        """
+        position = 1 if field == "user_name" else 2
+        for enrollment_id in list(index.get(key, ())):
+            row, encoded, versions = self._rows[enrollment_id]
+            if value is None:
+                self._drop(enrollment_id)
+                continue
+            versions = versions[:position] + (version,) + versions[position + 1:]
+            if getattr(row, field) != value:
+                row, encoded = replace(row, **{field: value}), None
+            self._rows[enrollment_id] = (row, encoded, versions)
+    
+    def _on_change(self, collection: str, record_id):
+        if collection not in self._pending:
+            return
+        with self._pending_lock:
+            if record_id is None:
+                self._reset = True
+            elif not self._reset:
+                self._pending[collection].add(record_id)
+    
+    def _catch_up(self):
+        """Apply queued changes; caller holds self._lock"""
+        with self._pending_lock:
+            reset, self._reset = self._reset, False
+            pending = self._pending
+            self._pending = {collection: set() for collection in pending}
+        
+        if reset:
+            self._rows.clear()
+            self._by_user.clear()
+            self._by_course.clear()
+            return
+        for enrollment_id in pending["enrollments"]:
+            self._drop(enrollment_id)
+        for user_id in pending["users"]:
+            if user_id in self._by_user:
+                version = self._database.get_version("users", user_id)
+                user = self._database.users.get(user_id)
+                self._patch(self._by_user, user_id, "user_name", user and user.name, version)
+        for course_id in pending["courses"]:
+            if course_id in self._by_course:
+                version = self._database.get_version("courses", course_id)
+                course = self._database.courses.get(course_id)
+                self._patch(self._by_course, course_id, "course_title", course and course.title, version)
+
+
+_create_lock = threading.Lock()
+
+
+def get_enrollment_view(database) -> EnrollmentDetailsView:
+    """Get the enrollment details view of a storage backend, creating it on first use"""
+    view = getattr(database, "_enrollment_view", None)
+    if view is None:
+        with _create_lock:
+            view = getattr(database, "_enrollment_view", None)
+            if view is None:
+                view = database._enrollment_view = EnrollmentDetailsView(database)
+    return view
+
+
+def details_list_response(rows: List[EnrollmentDetailsRecord], response: Response) -> Response:
+    """Respond with a JSON array of view rows, keeping the headers already set on `response`"""
+    return Response(get_enrollment_view(db).encode_list(rows), media_type="application/json", headers=response.headers)
@@ -0,0 +1,53 @@
+from typing import Optional, Tuple
+from fastapi import HTTPException, Request, Response, status
+from services.database import db
+
+# A (collection, record_id) pair; a record_id of None stands for the whole collection
+VersionKey = Tuple[str, Optional[int]]
+
+
+def read_versions(*keys: VersionKey) -> Tuple[int, ...]:
+    """Read the current versions of the given collections and entities"""
+    return tuple(db.get_version(collection, record_id) for collection, record_id in keys)
+
+
+def compute_etag(*keys: VersionKey, versions: Optional[Tuple[int, ...]] = None) -> str:
+    """Build an ETag from the versions of the given collections and entities, read now unless given"""
+    if versions is None:
+        versions = read_versions(*keys)
+    return f'"{db.version_epoch}-{".".join(map(str, versions))}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag, using weak comparison"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def check_etag(request: Request, response: Response, *keys: VersionKey) -> Tuple[int, ...]:
+    """Tag the response, or answer 304 Not Modified if the client's copy is current.
+
+    Versions are read before any data, so a change racing with the request
+    can only make the tag older than the body, never newer. They are
+    returned for json_response and json_list_response, which need versions
+    read before the data for the same reason. An entity that
+    does not exist has no current copy: it gets no 304, whatever the tag,
+    and the route answers 404 as usual.
+    """
+    versions = read_versions(*keys)
+    etag = compute_etag(*keys, versions=versions)
+    if etag_matches(request.headers.get("if-none-match"), etag) and all(
+        record_id is None or record_id in getattr(db, collection) for collection, record_id in keys
+    ):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return versions
@@ -0,0 +1,109 @@
+import threading
+from typing import Any, Dict, List, Tuple
+from fastapi import Response
+from services.database import db
+from services.records import to_model
+
+# Encoded entities kept per collection; the oldest entries are dropped beyond this
+MAX_CACHED_ENTITIES = 100_000
+
+
+class JsonCache:
+    """Encoded JSON of stored entities, so reads skip validation and encoding.
+
+    Each entry remembers the entity version it was encoded at and is only
+    used while that is still the current version. Callers pass versions
+    read before the entity itself, so an entry can hold a newer copy than
+    its version but never an older one: a fragment encoded from a read
+    that raced with a write is never served once the write is visible.
+    Change notifications drop entries as soon as their entity changes.
+    """
+    
+    def __init__(self, database, max_entities: int = MAX_CACHED_ENTITIES):
+        self._database = database
+        self._max_entities = max_entities
+        self._entries: Dict[str, Dict[int, Tuple[int, bytes]]] = {}
+        self._lock = threading.Lock()
+        database.add_change_listener(self.invalidate)
+    
+    def encode(self, collection: str, item: Any, version: int) -> bytes:
+        """Get the JSON of a stored entity, encoding it only when it changed.
+
+        `version` is the entity's version read before `item` was.
+        """
+        entries = self._entries.setdefault(collection, {})
+        entry = entries.get(item.id)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        
+        encoded = self._encode(item)
+        with self._lock:
+            entries[item.id] = (version, encoded)
+            if len(entries) > self._max_entities:
+                del entries[next(iter(entries))]
+        return encoded
+    
+    def encode_list(self, collection: str, items: List[Any], as_of: int) -> bytes:
+        """Assemble a JSON array from the cached fragments of `items`.
+
+        `as_of` is the collection's version read before `items` were. An
+        entity whose version is not newer has not changed since, so its copy
+        is that version; a newer one may have changed after it was read, so
+        its copy is encoded but not cached.
+        """
+        # One lookup for all versions, which is one query rather than one per item on SQLite
+        versions = self._database.get_versions(collection, [item.id for item in items])
+        return b"[" + b",".join([
+            self.encode(collection, item, versions[item.id]) if versions[item.id] <= as_of else self._encode(item)
+            for item in items
+        ]) + b"]"
+    
+    @staticmethod
+    def _encode(item: Any) -> bytes:
+        # The response model is only built to be encoded, on a miss
+        model = to_model(item)
+        return model.__pydantic_serializer__.to_json(model)
+    
+    def invalidate(self, collection: str, record_id):
+        with self._lock:
+            entries = self._entries.get(collection)
+            if entries is None:
+                return
+            if record_id is None:
+                entries.clear()
+            else:
+                entries.pop(record_id, None)
+
+
+_create_lock = threading.Lock()
+
+
+def get_json_cache(database) -> JsonCache:
+    """Get the cache of a storage backend, creating it on first use"""
+    cache = getattr(database, "_json_cache", None)
+    if cache is None:
+        with _create_lock:
+            cache = getattr(database, "_json_cache", None)
+            if cache is None:
+                cache = database._json_cache = JsonCache(database)
+    return cache
+
+
+def json_response(collection: str, item: Any, version: int, response: Response) -> Response:
+    """Respond with the cached JSON of one entity, keeping the headers already set on `response`.
+
+    `version` is the entity's version read before `item`, as check_etag returns it.
+    """
+    return Response(
+        get_json_cache(db).encode(collection, item, version), media_type="application/json", headers=response.headers
+    )
+
+
+def json_list_response(collection: str, items: List[Any], as_of: int, response: Response) -> Response:
+    """Respond with a JSON array of cached entity fragments, keeping the headers already set on `response`.
+
+    `as_of` is the collection's version read before `items`, as check_etag returns it.
+    """
+    return Response(
+        get_json_cache(db).encode_list(collection, items, as_of), media_type="application/json", headers=response.headers
+    )
@@ -0,0 +1,66 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Tuple
+
+
+class Leaderboard:
+    """Items ranked by a count, highest first, ties broken by lowest ID.
+
+    Items are kept in buckets of equal count, each a sorted list of IDs,
+    plus a sorted list of the distinct counts. Counts move one step per
+    enrollment change, so an update is a couple of bisections, and top(k)
+    reads the first IDs of buckets from the highest count down, touching
+    k items however many share a count.
+    """
+    
+    def __init__(self):
+        self._counts: Dict[int, int] = {}
+        self._buckets: Dict[int, List[int]] = {}  # count -> item IDs, ascending
+        self._levels: List[int] = []  # distinct counts, ascending
+    
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._counts
+    
+    def __len__(self) -> int:
+        return len(self._counts)
+    
+    def set(self, item_id: int, count: int):
+        """Add an item or move it to a new count"""
+        old_count = self._counts.get(item_id)
+        if old_count == count:
+            return
+        if old_count is not None:
+            self._leave(item_id, old_count)
+        self._counts[item_id] = count
+        bucket = self._buckets.get(count)
+        if bucket is None:
+            bucket = self._buckets[count] = []
+            insort(self._levels, count)
+        insort(bucket, item_id)
+    
+    def remove(self, item_id: int):
+        """Drop an item if it is ranked"""
+        count = self._counts.pop(item_id, None)
+        if count is not None:
+            self._leave(item_id, count)
+    
+    def clear(self):
+        self._counts.clear()
+        self._buckets.clear()
+        self._levels.clear()
+    
+    def top(self, k: int) -> List[Tuple[int, int]]:
+        """Get up to k (item_id, count) pairs, highest count first"""
+        ranked: List[Tuple[int, int]] = []
+        for count in reversed(self._levels):
+            wanted = k - len(ranked)
+            if wanted <= 0:
+                break
+            ranked.extend((item_id, count) for item_id in self._buckets[count][:wanted])
+        return ranked
+    
+    def _leave(self, item_id: int, count: int):
+        bucket = self._buckets[count]
+        del bucket[bisect_left(bucket, item_id)]
+        if not bucket:
+            del self._buckets[count]
+            del self._levels[bisect_left(self._levels, count)]
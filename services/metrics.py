@@ -0,0 +1,158 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets; a final +Inf bucket is implied
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Route label of requests no route matched, so unknown paths cannot grow the label set
+UNMATCHED_ROUTE = "<unmatched>"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Shard:
+    """Counters written by a single thread"""
+    
+    __slots__ = ("requests", "latencies")
+    
+    def __init__(self):
+        # (method, route, status) -> requests
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        # (method, route) -> per-bucket counts, the +Inf count, then the sum of seconds
+        self.latencies: Dict[Tuple[str, str], List[float]] = {}
+
+
+class RequestMetrics:
+    """Request counts and latency histograms per route template.
+
+    Each thread records into its own shard, so the hot path takes no lock;
+    a scrape adds the shards up. Requests are recorded by the middleware on
+    the event loop thread, so in practice there is one shard per process.
+    """
+    
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()  # only taken when a thread records its first request
+    
+    def observe(self, method: str, route: str, status: int, seconds: float):
+        """Record one finished request"""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        key = (method, route, status)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        histogram = shard.latencies.get((method, route))
+        if histogram is None:
+            histogram = shard.latencies[(method, route)] = [0] * (len(self.buckets) + 2)
+        histogram[bisect_left(self.buckets, seconds)] += 1
+        histogram[-1] += seconds
+    
+    def snapshot(self) -> Tuple[Dict[Tuple[str, str, int], int], Dict[Tuple[str, str], List[float]]]:
+        """Add up every shard's counters"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        requests: Dict[Tuple[str, str, int], int] = {}
+        latencies: Dict[Tuple[str, str], List[float]] = {}
+        for shard in shards:
+            for key, count in list(shard.requests.items()):
+                requests[key] = requests.get(key, 0) + count
+            for key, histogram in list(shard.latencies.items()):
+                total = latencies.get(key)
+                if total is None:
+                    latencies[key] = list(histogram)
+                else:
+                    for index, value in enumerate(histogram):
+                        total[index] += value
+        return requests, latencies
+    
+    def reset(self):
+        with self._shards_lock:
+            for shard in self._shards:
+                shard.requests.clear()
+                shard.latencies.clear()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording every HTTP request's route template, status and duration"""
+    
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        started = time.perf_counter()
+        status = 500  # unless a response starts, the request failed
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            self.metrics.observe(scope["method"], route, status, time.perf_counter() - started)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(metrics: RequestMetrics, database) -> str:
+    """Render request metrics and collection sizes in the Prometheus text format"""
+    requests, latencies = metrics.snapshot()
+    lines = [
+        "# HELP edutrack_http_requests_total HTTP requests handled, by route template and status.",
+        "# TYPE edutrack_http_requests_total counter",
+    ]
+    for (method, route, status), count in sorted(requests.items()):
+        lines.append(f"edutrack_http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+    
+    lines += [
+        "# HELP edutrack_http_request_duration_seconds Time to handle HTTP requests, by route template.",
+        "# TYPE edutrack_http_request_duration_seconds histogram",
+    ]
+    for (method, route), histogram in sorted(latencies.items()):
+        cumulative = 0
+        for bound, count in zip(metrics.buckets + (float("inf"),), histogram):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(
+                f"edutrack_http_request_duration_seconds_bucket{_labels(method=method, route=route, le=le)} {cumulative}"
+            )
+        labels = _labels(method=method, route=route)
+        lines.append(f"edutrack_http_request_duration_seconds_sum{labels} {_number(histogram[-1])}")
+        lines.append(f"edutrack_http_request_duration_seconds_count{labels} {cumulative}")
+    
+    lines += [
+        "# HELP edutrack_collection_size Records stored per collection.",
+        "# TYPE edutrack_collection_size gauge",
+    ]
+    for collection in ("users", "courses", "enrollments"):
+        lines.append(f"edutrack_collection_size{_labels(collection=collection)} {len(getattr(database, collection))}")
+    return "\n".join(lines) + "\n"
+
+
+# Process-wide registry the middleware records into
+request_metrics = RequestMetrics()
@@ -0,0 +1,39 @@
+import base64
+import binascii
+from typing import Any, List, NamedTuple, Optional
+from fastapi import HTTPException, status
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Page(NamedTuple):
+    items: List[Any]
+    next_after_id: Optional[int]
+
+
+def encode_cursor(after_id: Optional[int]) -> Optional[str]:
+    """Encode the last ID of a page as an opaque cursor"""
+    if after_id is None:
+        return None
+    return base64.urlsafe_b64encode(f"id:{after_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    """Decode an opaque cursor back into the ID to resume after"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, _, after_id = raw.partition(":")
+        if prefix != "id":
+            raise ValueError(raw)
+        return int(after_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
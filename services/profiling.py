@@ -0,0 +1,241 @@
+import cProfile
+import functools
+import hmac
+import inspect
+import io
+import os
+import pstats
+import random
+import re
+import secrets
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from schemas.profile import ProfileInfo
+from services.config import Settings, settings
+
+# Request header that asks for a profile; its value must equal the configured token
+PROFILE_HEADER = "X-EduTrack-Profile"
+
+_PROFILE_ID = re.compile(r"^\d{13}-[0-9a-f]{6}$")
+
+# Profile of the request being handled, if it is being profiled
+_current_session: ContextVar[Optional["ProfileSession"]] = ContextVar("profile_session", default=None)
+
+
+class ProfileSession:
+    """Profiles of one request's handler and threadpool calls, each taken in the thread that ran it"""
+    
+    def __init__(self):
+        self.profiles: List[cProfile.Profile] = []
+    
+    def run(self, call, *args, **kwargs):
+        # Only one profiler can be active per thread
+        if sys.getprofile() is not None:
+            return call(*args, **kwargs)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            profile.disable()
+            self.profiles.append(profile)
+    
+    async def run_async(self, call, *args, **kwargs):
+        # Other requests' tasks interleave on the event loop and are profiled too
+        if sys.getprofile() is not None:
+            return await call(*args, **kwargs)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return await call(*args, **kwargs)
+        finally:
+            profile.disable()
+            self.profiles.append(profile)
+
+
+class RequestProfiler:
+    """Decides which requests to profile and keeps their profiles in a directory.
+
+    Each profile is a pstats file `<id>.prof` next to `<id>.json` with the
+    request's metadata. IDs start with the millisecond timestamp, so they
+    sort by age; only the newest `keep` profiles are kept.
+    """
+    
+    def __init__(
+        self,
+        directory: Optional[str],
+        token: Optional[str] = None,
+        sample_rate: float = 0.0,
+        keep: int = 100
+    ):
+        self.directory = Path(directory) if directory else None
+        self.token = token
+        self.sample_rate = sample_rate
+        self.keep = keep
+    
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+    
+    def authorized(self, header_value: Optional[str]) -> bool:
+        """Whether a request carrying this profiling header value may request or read profiles"""
+        return bool(self.token and header_value and hmac.compare_digest(header_value, self.token))
+    
+    def trigger(self, scope) -> Optional[str]:
+        """Why the request in this ASGI scope should be profiled, or None to leave it alone"""
+        header = PROFILE_HEADER.lower().encode()
+        for name, value in scope["headers"]:
+            if name == header and self.authorized(value.decode("latin-1")):
+                return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sample"
+        return None
+    
+    def save(self, session: ProfileSession, info: dict) -> ProfileInfo:
+        """Write a request's profiles and metadata, then drop the oldest profiles over `keep`"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile_id = f"{int(time.time() * 1000):013d}-{secrets.token_hex(3)}"
+        profile = ProfileInfo(id=profile_id, **info)
+        stats = pstats.Stats(session.profiles[0])
+        for other in session.profiles[1:]:
+            stats.add(other)
+        stats.dump_stats(str(self.directory / f"{profile_id}.prof"))
+        # The metadata is written last, so listings only see complete profiles
+        temporary = self.directory / f"{profile_id}.json.tmp"
+        temporary.write_text(profile.model_dump_json())
+        os.replace(temporary, self.directory / f"{profile_id}.json")
+        self._prune()
+        return profile
+    
+    def _prune(self):
+        for stale in sorted(self.directory.glob("*.json"))[:-self.keep or None]:
+            stale.unlink(missing_ok=True)
+            stale.with_suffix(".prof").unlink(missing_ok=True)
+    
+    def list_profiles(self, limit: int = 50) -> List[ProfileInfo]:
+        """Newest profiles first"""
+        profiles = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True)[:limit] if self.directory.exists() else []:
+            try:
+                profiles.append(ProfileInfo.model_validate_json(path.read_text()))
+            except FileNotFoundError:
+                continue  # pruned meanwhile
+        return profiles
+    
+    def profile_path(self, profile_id: str) -> Optional[Path]:
+        """The pstats file of a profile, or None if there is no such profile"""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}.prof"
+        return path if path.exists() else None
+    
+    def render(self, path: Path, limit: int = 40) -> str:
+        """The `limit` functions with the most cumulative time, as printed by pstats"""
+        output = io.StringIO()
+        pstats.Stats(str(path), stream=output).sort_stats("cumulative").print_stats(limit)
+        return output.getvalue()
+
+
+def _profiled(endpoint):
+    """Wrap a route handler or endpoint to run under the current request's profile session, if there is one"""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            session = _current_session.get()
+            if session is None:
+                return await endpoint(*args, **kwargs)
+            return await session.run_async(endpoint, *args, **kwargs)
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            session = _current_session.get()
+            if session is None:
+                return endpoint(*args, **kwargs)
+            return session.run(endpoint, *args, **kwargs)
+    wrapper.profiled = True
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose whole request handling can be profiled per request.
+
+    The handler returned by get_route_handler() runs under the request's
+    profile session, so request parsing and validation, dependencies and
+    response serialization are profiled along with the endpoint. FastAPI
+    runs sync endpoints, and the validation of what they return, in the
+    threadpool, out of reach of a profiler on the event loop, so those calls
+    enable the profiler in the thread that runs them. Routes are only
+    instrumented while profiling is enabled.
+    """
+    
+    def __init__(self, path: str, endpoint, **kwargs):
+        instrument = request_profiler.enabled
+        if instrument and not getattr(endpoint, "profiled", False):
+            endpoint = _profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+        if instrument and self.response_field is not None:
+            self.response_field.validate = _profiled(self.response_field.validate)
+    
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        return _profiled(handler) if request_profiler.enabled else handler
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests picked by the profiler and saves their profiles"""
+    
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+    
+    async def __call__(self, scope, receive, send):
+        trigger = self.profiler.trigger(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+        
+        session = ProfileSession()
+        reset_token = _current_session.set(session)
+        started_at = datetime.now()
+        started = time.perf_counter()
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_session.reset(reset_token)
+            duration = time.perf_counter() - started
+            # Requests to routes that are not profiled leave nothing to save
+            if session.profiles:
+                await run_in_threadpool(self.profiler.save, session, {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": getattr(scope.get("route"), "path", scope["path"]),
+                    "status": status,
+                    "duration_ms": round(duration * 1000, 3),
+                    "started_at": started_at,
+                    "trigger": trigger,
+                })
+
+
+def create_profiler(config: Settings = settings) -> RequestProfiler:
+    """Create the request profiler configured by the settings; disabled without a profile directory"""
+    return RequestProfiler(
+        config.profile_dir, config.profile_token, config.profile_sample_rate, config.profile_keep
+    )
+
+
+# Global profiler; routes are only instrumented when it is enabled at import time
+request_profiler = create_profiler()
@@ -0,0 +1,107 @@
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+from operator import attrgetter
+from typing import Any, Dict, List, Type, TypeVar, Union
+from pydantic import TypeAdapter
+from schemas.course import Course
+from schemas.enrollment import Enrollment, EnrollmentWithDetails
+from schemas.user import User
+
+
+@dataclass(slots=True)
+class UserRecord:
+    """A stored user; `User` is its API form"""
+    id: int
+    name: str
+    email: str
+    is_active: bool
+    created_at: datetime
+
+
+@dataclass(slots=True)
+class CourseRecord:
+    """A stored course; `Course` is its API form"""
+    id: int
+    title: str
+    description: str
+    is_open: bool
+    created_at: datetime
+
+
+@dataclass(slots=True)
+class EnrollmentRecord:
+    """A stored enrollment; `Enrollment` is its API form"""
+    id: int
+    user_id: int
+    course_id: int
+    enrolled_date: date
+    completed: bool
+    created_at: datetime
+
+
+@dataclass(slots=True)
+class EnrollmentDetailsRecord:
+    """An enrollment joined with its user's name and course's title; `EnrollmentWithDetails` is its API form"""
+    id: int
+    user_id: int
+    course_id: int
+    enrolled_date: date
+    completed: bool
+    created_at: datetime
+    user_name: str
+    course_title: str
+
+
+Record = Union[UserRecord, CourseRecord, EnrollmentRecord, EnrollmentDetailsRecord]
+RecordType = TypeVar("RecordType", UserRecord, CourseRecord, EnrollmentRecord)
+
+# Field names of each record type, in declaration order, which is also the
+# order of the row tuples the backends and snapshots store
+RECORD_FIELDS = {
+    record_type: tuple(field.name for field in fields(record_type))
+    for record_type in (UserRecord, CourseRecord, EnrollmentRecord)
+}
+
+
+class _ModelMapping:
+    """How to build the API model of one record type without validation"""
+    
+    def __init__(self, model):
+        self.model = model
+        self.field_names = tuple(model.model_fields)
+        # Every field is set, so all models of a type can share one fields set
+        self.fields_set = set(self.field_names)
+        # Reads the record's values in the model's field order
+        self.values = attrgetter(*self.field_names)
+
+
+_MODELS = {
+    UserRecord: _ModelMapping(User),
+    CourseRecord: _ModelMapping(Course),
+    EnrollmentRecord: _ModelMapping(Enrollment),
+    EnrollmentDetailsRecord: _ModelMapping(EnrollmentWithDetails),
+}
+
+_ADAPTERS = {record_type: TypeAdapter(record_type) for record_type in RECORD_FIELDS}
+
+
+def to_model(record: Record):
+    """Build the API model of a record; records are trusted, so nothing is validated again"""
+    mapping = _MODELS[type(record)]
+    return mapping.model.model_construct(
+        _fields_set=mapping.fields_set, **dict(zip(mapping.field_names, mapping.values(record)))
+    )
+
+
+def to_models(records: List[Record]) -> list:
+    return [to_model(record) for record in records]
+
+
+def record_to_json(record: Record) -> Dict[str, Any]:
+    """Field values of a record as JSON types, with dates and times in ISO format"""
+    return _ADAPTERS[type(record)].dump_python(record, mode="json")
+
+
+def record_from_json(record_type: Type[RecordType], data: Dict[str, Any]) -> RecordType:
+    """Parse what record_to_json returned (or the JSON of the API model) back into a record"""
+    return _ADAPTERS[record_type].validate_python(data)
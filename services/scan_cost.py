@@ -0,0 +1,181 @@
+import functools
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional
+from schemas.scan_cost import OperationScanCost
+from services.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Operations examining this many times more records than they return are logged as probable scans
+SCAN_RATIO_WARNING = 10
+
+
+class _OperationCost:
+    __slots__ = ("examined",)
+    
+    def __init__(self):
+        self.examined = 0
+
+
+# Cost of the service operation running in this context, if any
+_current_cost: ContextVar[Optional[_OperationCost]] = ContextVar("operation_cost", default=None)
+
+
+def examined(count: int = 1):
+    """Count records read (or index entries probed) by the current service operation"""
+    cost = _current_cost.get()
+    if cost is not None:
+        cost.examined += count
+
+
+def _counting(iterator: Iterator, cost: _OperationCost) -> Iterator:
+    for item in iterator:
+        cost.examined += 1
+        yield item
+
+
+def counted(iterable: Iterable) -> Iterable:
+    """Count each item taken from `iterable` as examined by the current service operation, if any"""
+    cost = _current_cost.get()
+    if cost is None:
+        return iterable
+    return _counting(iter(iterable), cost)
+
+
+class CountingDict(dict):
+    """A dict of records that counts its reads towards the current service operation.
+
+    Each `[]`, `get` and `in` counts one record, and walking the keys,
+    values or items counts every one yielded, so a scan is counted
+    wherever it happens. Writes are not counted. Outside a service
+    operation this costs one context variable lookup per read.
+    """
+    
+    __slots__ = ()
+    
+    def __getitem__(self, key):
+        examined()
+        return dict.__getitem__(self, key)
+    
+    def get(self, key, default=None):
+        examined()
+        return dict.get(self, key, default)
+    
+    def __contains__(self, key) -> bool:
+        examined()
+        return dict.__contains__(self, key)
+    
+    def __iter__(self) -> Iterator:
+        return iter(counted(dict.keys(self)))
+    
+    def keys(self):
+        return counted(dict.keys(self))
+    
+    def values(self):
+        return counted(dict.values(self))
+    
+    def items(self):
+        return counted(dict.items(self))
+
+
+def _returned(result) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    # Pages and batches
+    items = getattr(result, "items", None)
+    if isinstance(items, list):
+        return len(items)
+    return 1
+
+
+class ScanCostRecorder:
+    """Per-operation totals of records examined and returned by service calls.
+
+    Every call is logged at DEBUG with its counts; calls examining at least
+    `warn_examined` records and more than SCAN_RATIO_WARNING times what they
+    return are logged as warnings, as they are probably full scans.
+    """
+    
+    def __init__(self, warn_examined: int = 10_000):
+        self.warn_examined = warn_examined
+        # operation -> [calls, examined, returned, max examined]
+        self._totals: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, operation: str, examined: int, returned: int):
+        with self._lock:
+            totals = self._totals.get(operation)
+            if totals is None:
+                totals = self._totals[operation] = [0, 0, 0, 0]
+            totals[0] += 1
+            totals[1] += examined
+            totals[2] += returned
+            if examined > totals[3]:
+                totals[3] = examined
+        if examined >= self.warn_examined and examined > SCAN_RATIO_WARNING * max(returned, 1):
+            logger.warning(
+                "Probable full scan: operation=%s examined=%d returned=%d", operation, examined, returned,
+                extra={"scan_cost": {"operation": operation, "examined": examined, "returned": returned}}
+            )
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "operation=%s examined=%d returned=%d", operation, examined, returned,
+                extra={"scan_cost": {"operation": operation, "examined": examined, "returned": returned}}
+            )
+    
+    def snapshot(self) -> List[OperationScanCost]:
+        """Totals per operation, most records examined first"""
+        with self._lock:
+            totals = {operation: list(values) for operation, values in self._totals.items()}
+        costs = [
+            OperationScanCost(
+                operation=operation,
+                calls=calls,
+                examined=examined_total,
+                returned=returned,
+                max_examined=max_examined,
+                examined_per_call=examined_total / calls,
+                examined_per_returned=examined_total / returned if returned else None
+            )
+            for operation, (calls, examined_total, returned, max_examined) in totals.items()
+        ]
+        costs.sort(key=lambda cost: (-cost.examined, cost.operation))
+        return costs
+    
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+
+def accounted(function):
+    """Record the records a service method examines and returns under its qualified name.
+
+    A nested accounted call also adds its examined records to the caller's.
+    Calls that raise are recorded with nothing returned.
+    """
+    operation = function.__qualname__
+    
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        cost = _OperationCost()
+        token = _current_cost.set(cost)
+        result = None
+        try:
+            result = function(*args, **kwargs)
+            return result
+        finally:
+            _current_cost.reset(token)
+            outer = _current_cost.get()
+            if outer is not None:
+                outer.examined += cost.examined
+            scan_costs.record(operation, cost.examined, _returned(result))
+    
+    return wrapper
+
+
+# Process-wide totals
+scan_costs = ScanCostRecorder(settings.scan_warn_examined)
@@ -0,0 +1,299 @@
+import heapq
+import logging
+import re
+import threading
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Set, Tuple
+from services.scan_cost import examined
+
+logger = logging.getLogger(__name__)
+
+# Text fields indexed for each searchable collection
+SEARCH_FIELDS = {
+    "users": ("name", "email"),
+    "courses": ("title", "description"),
+}
+
+# Records read per page when the index is (re)built
+BUILD_PAGE_SIZE = 1000
+
+# Most posting entries a query word may match for its postings to be
+# gathered; when every word matches more, records are walked in ID order
+UNION_LIMIT = 20_000
+# Records checked one by one before switching to intersecting postings;
+# candidates already in ID order may check up to a quarter of themselves
+CHECK_LIMIT = 2_000
+# Vocabulary entries counted per step when estimating how many records a word matches
+COUNT_CHUNK = 1_000
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase words; "alice.smith@example.com" gives alice, smith, example, com"""
+    return _TOKEN_PATTERN.findall(text.casefold())
+
+
+class SearchIndex:
+    """Inverted index over the text fields of one collection, for prefix search.
+
+    Every distinct token maps to the sorted IDs of the records containing it,
+    and a sorted list of the distinct tokens turns each query word into a bisect
+    range of tokens it is a prefix of. The index is built from the backend
+    in the background at startup, or by the first search otherwise, without
+    holding the lock searches take. After that, change notifications only
+    queue the changed IDs, and each search re-reads just those records
+    before answering.
+    """
+    
+    def __init__(self, database, collection: str):
+        self._database = database
+        self._collection = collection
+        self._fields = SEARCH_FIELDS[collection]
+        self._postings: Dict[str, List[int]] = {}  # token -> record IDs, ascending
+        self._vocabulary: List[str] = []  # distinct tokens, sorted
+        # Each record's distinct tokens, joined after a leading space
+        self._record_text: Dict[int, str] = {}
+        self._ids: List[int] = []  # indexed record IDs, sorted
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        
+        # Written by change listeners, which may hold collection locks, so
+        # guarded by its own lock that is never held while taking another
+        self._pending_lock = threading.Lock()
+        self._pending: Set[int] = set()
+        self._rebuild = True
+        self._building = False
+        database.add_change_listener(self._on_change)
+    
+    def search(self, query: str, limit: int) -> List[Any]:
+        """Get up to `limit` records, in ID order, where every query word starts one of their words"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        
+        table = getattr(self._database, self._collection)
+        self.build()
+        with self._lock:
+            self._catch_up(table)
+            record_ids = self._match(list(dict.fromkeys(terms)), limit)
+        
+        records = []
+        for record_id in record_ids:
+            record = table.get(record_id)
+            if record is not None:
+                records.append(record)
+        return records
+    
+    def build(self):
+        """Build the index from the backend if it was never built or its collection was reset since.
+
+        Searches keep answering from the old index until the new one is
+        swapped in; changes made meanwhile stay queued and are applied after.
+        """
+        with self._build_lock:
+            with self._pending_lock:
+                if not self._rebuild:
+                    return
+                self._rebuild = False
+                self._building = True
+                self._pending.clear()
+            built = False
+            try:
+                postings: Dict[str, List[int]] = {}
+                record_text: Dict[int, str] = {}
+                ids: List[int] = []
+                page_method = getattr(self._database, f"get_{self._collection}_page")
+                after_id = None
+                while True:
+                    page = page_method(after_id, BUILD_PAGE_SIZE)
+                    for record in page.items:
+                        tokens = self._tokens_of(record)
+                        record_text[record.id] = self._text_of(tokens)
+                        ids.append(record.id)
+                        for token in tokens:
+                            # Pages come in ID order, so appending keeps postings sorted
+                            postings.setdefault(token, []).append(record.id)
+                    if page.next_after_id is None:
+                        break
+                    after_id = page.next_after_id
+                vocabulary = sorted(postings)
+                with self._lock:
+                    self._postings, self._vocabulary = postings, vocabulary
+                    self._record_text, self._ids = record_text, ids
+                built = True
+            finally:
+                with self._pending_lock:
+                    self._building = False
+                    if not built:
+                        self._rebuild = True
+    
+    def _on_change(self, collection: str, record_id):
+        if collection != self._collection:
+            return
+        with self._pending_lock:
+            if record_id is None:
+                self._rebuild = True
+                self._pending.clear()
+            elif not self._rebuild:
+                self._pending.add(record_id)
+    
+    def _catch_up(self, table):
+        """Apply queued changes; caller holds self._lock"""
+        with self._pending_lock:
+            if self._building or self._rebuild:
+                # Changes wait for the build under way or due
+                return
+            pending, self._pending = self._pending, set()
+        
+        # A few changes insert and delete single vocabulary entries; a large
+        # batch (such as an import) re-sorts the vocabulary once instead
+        update_vocabulary = len(pending) <= BUILD_PAGE_SIZE
+        for record_id in pending:
+            indexed = record_id in self._record_text
+            self._remove(record_id, update_vocabulary)
+            record = table.get(record_id)
+            if record is not None:
+                self._add(record_id, self._tokens_of(record), update_vocabulary)
+                if not indexed:
+                    insort(self._ids, record_id)
+            elif indexed:
+                del self._ids[bisect_left(self._ids, record_id)]
+        if not update_vocabulary:
+            self._vocabulary[:] = sorted(self._postings)
+    
+    def _match(self, terms: List[str], limit: int) -> List[int]:
+        """Get the first `limit` IDs, in order, of records matching every term; caller holds self._lock"""
+        ranges = {term: self._token_range(term) for term in terms}
+        counts = {term: self._count_postings(*ranges[term], UNION_LIMIT) for term in terms}
+        terms = sorted(terms, key=counts.__getitem__)
+        if counts[terms[0]] > UNION_LIMIT:
+            # Every word matches many records, so walking the records in ID
+            # order usually finds `limit` matches after a few of them
+            record_ids, read = self._check(islice(self._ids, CHECK_LIMIT), terms, limit)
+            examined(read)
+            if len(record_ids) == limit or len(self._ids) <= CHECK_LIMIT:
+                return record_ids
+        
+        start, stop = ranges[terms[0]]
+        candidates = None
+        if stop - start == 1:
+            # A single token: its postings are already in ID order
+            ordered = self._postings[self._vocabulary[start]]
+            if len(terms) == 1:
+                examined(min(limit, len(ordered)))
+                return ordered[:limit]
+        else:
+            candidates = self._union(start, stop)
+            examined(len(candidates))
+            if len(terms) == 1:
+                return heapq.nsmallest(limit, candidates)
+            ordered = sorted(candidates)
+        
+        # Check the other words per candidate, in ID order
+        record_ids, read = self._check(islice(ordered, max(CHECK_LIMIT, len(ordered) // 4)), terms[1:], limit)
+        examined(read)
+        if read == len(ordered) or len(record_ids) == limit:
+            return record_ids
+        
+        # Few candidates match the other words, so intersecting their postings is cheaper than checking on
+        if candidates is None:
+            candidates = set(ordered)
+        for term in terms[1:]:
+            postings = self._union(*ranges[term])
+            examined(len(postings))
+            candidates &= postings
+        return heapq.nsmallest(limit, candidates)
+    
+    def _check(self, record_ids: Iterable[int], terms: List[str], limit: int) -> Tuple[List[int], int]:
+        """Keep the first `limit` records with a word starting with every term; also returns how many were read"""
+        # A word starting with the term follows a space in the record's text
+        prefixes = [" " + term for term in terms]
+        matched = []
+        read = 0
+        for record_id in record_ids:
+            read += 1
+            if all(map(self._record_text[record_id].__contains__, prefixes)):
+                matched.append(record_id)
+                if len(matched) == limit:
+                    break
+        return matched, read
+    
+    def _union(self, start: int, stop: int) -> Set[int]:
+        """Get the IDs posted under a range of the vocabulary"""
+        return set().union(*map(self._postings.__getitem__, self._vocabulary[start:stop]))
+    
+    def _count_postings(self, start: int, stop: int, cap: int) -> int:
+        """Count the IDs posted under a range of the vocabulary, stopping once past `cap`"""
+        total = 0
+        for chunk_start in range(start, stop, COUNT_CHUNK):
+            tokens = self._vocabulary[chunk_start:min(chunk_start + COUNT_CHUNK, stop)]
+            total += sum(map(len, map(self._postings.__getitem__, tokens)))
+            if total > cap:
+                break
+        return total
+    
+    def _tokens_of(self, record) -> Tuple[str, ...]:
+        tokens = set()
+        for field in self._fields:
+            tokens.update(tokenize(getattr(record, field)))
+        return tuple(tokens)
+    
+    @staticmethod
+    def _text_of(tokens: Tuple[str, ...]) -> str:
+        return " " + " ".join(tokens)
+    
+    def _add(self, record_id: int, tokens: Tuple[str, ...], update_vocabulary: bool):
+        self._record_text[record_id] = self._text_of(tokens)
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = []
+                if update_vocabulary:
+                    insort(self._vocabulary, token)
+            insort(posting, record_id)
+    
+    def _remove(self, record_id: int, update_vocabulary: bool):
+        for token in self._record_text.pop(record_id, "").split():
+            posting = self._postings[token]
+            del posting[bisect_left(posting, record_id)]
+            if not posting:
+                del self._postings[token]
+                if update_vocabulary:
+                    del self._vocabulary[bisect_left(self._vocabulary, token)]
+    
+    def _token_range(self, term: str) -> Tuple[int, int]:
+        """Get the slice of the vocabulary holding the tokens that start with `term`"""
+        # Every token starting with `term` sorts before `term` followed by the highest code point
+        return bisect_left(self._vocabulary, term), bisect_left(self._vocabulary, term + "\U0010ffff")
+
+
+_create_lock = threading.Lock()
+
+
+def get_search_index(database, collection: str) -> SearchIndex:
+    """Get the search index of a collection, creating it on first use"""
+    indexes = getattr(database, "_search_indexes", None)
+    if indexes is None or collection not in indexes:
+        with _create_lock:
+            indexes = database.__dict__.setdefault("_search_indexes", {})
+            if collection not in indexes:
+                indexes[collection] = SearchIndex(database, collection)
+    return indexes[collection]
+
+
+def start_search_indexes(database):
+    """Create the search indexes of a backend and build them in background threads"""
+    for collection in SEARCH_FIELDS:
+        index = get_search_index(database, collection)
+        threading.Thread(
+            target=_build_logged, args=(index, collection), name=f"search-index-{collection}", daemon=True
+        ).start()
+
+
+def _build_logged(index: SearchIndex, collection: str):
+    try:
+        index.build()
+    except Exception:
+        logger.exception("Building the %s search index failed", collection)
@@ -0,0 +1,777 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+from services.pagination import Page
+from services.records import CourseRecord, EnrollmentRecord, UserRecord
+from services.scan_cost import examined
+from services.storage import LOCK_ORDER, ChangeListener, EnrollmentFilter, StorageBackend
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; locks then only cover one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds a change stays in the changes table for other processes to pick up
+CHANGE_RETENTION = 60.0
+
+# IDs bound per `IN (...)` lookup, well below SQLite's limit on query parameters
+MAX_IN_IDS = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    is_active INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS users_email ON users (email);
+
+CREATE TABLE IF NOT EXISTS courses (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    is_open INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS enrollments (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    course_id INTEGER NOT NULL,
+    enrolled_date TEXT NOT NULL,
+    completed INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS enrollments_user_course ON enrollments (user_id, course_id);
+CREATE INDEX IF NOT EXISTS enrollments_course ON enrollments (course_id);
+CREATE INDEX IF NOT EXISTS enrollments_enrolled_date ON enrollments (enrolled_date);
+
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO counters (name, value) VALUES ('users', 1), ('courses', 1), ('enrollments', 1);
+
+-- Per-course counters, kept up to date by the triggers below in the same transaction as each write
+CREATE TABLE IF NOT EXISTS course_stats (
+    course_id INTEGER PRIMARY KEY,
+    enrolled INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    active INTEGER NOT NULL DEFAULT 0
+);
+-- Walked in order by get_top_courses, so ranking stops after the first open courses it finds
+CREATE INDEX IF NOT EXISTS course_stats_enrolled ON course_stats (enrolled DESC, course_id);
+CREATE INDEX IF NOT EXISTS course_stats_completed ON course_stats (completed DESC, course_id);
+-- Every course has a row, so courses nobody enrolled in yet are ranked too
+INSERT OR IGNORE INTO course_stats (course_id) SELECT id FROM courses;
+
+CREATE TRIGGER IF NOT EXISTS courses_stats_insert AFTER INSERT ON courses BEGIN
+    INSERT OR IGNORE INTO course_stats (course_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS enrollments_stats_insert AFTER INSERT ON enrollments BEGIN
+    INSERT OR IGNORE INTO course_stats (course_id) VALUES (NEW.course_id);
+    UPDATE course_stats SET
+        enrolled = enrolled + 1,
+        completed = completed + NEW.completed,
+        active = active + (NOT NEW.completed AND COALESCE((SELECT is_active FROM users WHERE id = NEW.user_id), 0))
+    WHERE course_id = NEW.course_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS enrollments_stats_update AFTER UPDATE OF completed ON enrollments BEGIN
+    UPDATE course_stats SET
+        completed = completed + NEW.completed - OLD.completed,
+        active = active + (OLD.completed - NEW.completed) * COALESCE((SELECT is_active FROM users WHERE id = NEW.user_id), 0)
+    WHERE course_id = NEW.course_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS enrollments_stats_delete AFTER DELETE ON enrollments BEGIN
+    UPDATE course_stats SET
+        enrolled = enrolled - 1,
+        completed = completed - OLD.completed,
+        active = active - (NOT OLD.completed AND COALESCE((SELECT is_active FROM users WHERE id = OLD.user_id), 0))
+    WHERE course_id = OLD.course_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS users_stats_update AFTER UPDATE OF is_active ON users
+WHEN NEW.is_active != OLD.is_active BEGIN
+    UPDATE course_stats SET active = active + (CASE WHEN NEW.is_active THEN 1 ELSE -1 END)
+    WHERE course_id IN (SELECT course_id FROM enrollments WHERE user_id = NEW.id AND NOT completed);
+END;
+
+CREATE TRIGGER IF NOT EXISTS courses_stats_delete AFTER DELETE ON courses BEGIN
+    DELETE FROM course_stats WHERE course_id = OLD.id;
+END;
+
+-- Recent writes, read by the other processes sharing the file to keep their caches coherent
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    record_id INTEGER,
+    operation TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    changed_at REAL NOT NULL
+);
+
+-- Versions shared by every process on the file: the seq of the change that
+-- set them. An entity without a row has the reset_version of its collection.
+CREATE TABLE IF NOT EXISTS collection_versions (
+    collection TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    reset_version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO collection_versions (collection, version, reset_version)
+VALUES ('users', 0, 0), ('courses', 0, 0), ('enrollments', 0, 0);
+
+CREATE TABLE IF NOT EXISTS entity_versions (
+    collection TEXT NOT NULL,
+    record_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (collection, record_id)
+);
+
+CREATE TABLE IF NOT EXISTS metadata (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+INSERT OR IGNORE INTO metadata (name, value) VALUES ('version_epoch', lower(hex(randomblob(4))));
+"""
+
+# Columns services may change through update_*; anything else is rejected
+UPDATABLE_COLUMNS = {
+    "users": {"name", "email", "is_active"},
+    "courses": {"title", "description", "is_open"},
+    "enrollments": {"completed"},
+}
+
+
+def _row_to_user(row: sqlite3.Row) -> UserRecord:
+    return UserRecord(
+        id=row["id"],
+        name=row["name"],
+        email=row["email"],
+        is_active=bool(row["is_active"]),
+        created_at=datetime.fromisoformat(row["created_at"])
+    )
+
+
+def _row_to_course(row: sqlite3.Row) -> CourseRecord:
+    return CourseRecord(
+        id=row["id"],
+        title=row["title"],
+        description=row["description"],
+        is_open=bool(row["is_open"]),
+        created_at=datetime.fromisoformat(row["created_at"])
+    )
+
+
+def _row_to_enrollment(row: sqlite3.Row) -> EnrollmentRecord:
+    return EnrollmentRecord(
+        id=row["id"],
+        user_id=row["user_id"],
+        course_id=row["course_id"],
+        enrolled_date=date.fromisoformat(row["enrolled_date"]),
+        completed=bool(row["completed"]),
+        created_at=datetime.fromisoformat(row["created_at"])
+    )
+
+
+class ConnectionPool:
+    """A fixed-size pool of SQLite connections shared between threads"""
+    
+    def __init__(self, path: str, size: int):
+        self._connections: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=size)
+        for _ in range(size):
+            self._connections.put(self._connect(path))
+    
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        """Open a connection in autocommit mode with WAL journaling"""
+        # Statements are compiled once per connection and reused from its statement cache
+        connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, cached_statements=256)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("PRAGMA busy_timeout = 5000")
+        return connection
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection for the duration of the block"""
+        connection = self._connections.get()
+        try:
+            yield connection
+        finally:
+            self._connections.put(connection)
+    
+    def close(self):
+        """Close every pooled connection"""
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
+
+
+class ProcessLock:
+    """Re-entrant lock held across the threads of this process and, through
+    flock on a lock file, across every process using the same database"""
+    
+    def __init__(self, path: Optional[str]):
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = open(path, "a+b") if path is not None and fcntl is not None else None
+    
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0 and self._file is not None:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._lock.release()
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class ChangeFeed:
+    """Background poller delivering changes written by other processes to the backend's listeners.
+
+    PRAGMA data_version makes an idle poll a single cheap statement. If this
+    process falls so far behind that changes were pruned before it read
+    them, every collection is reported as changed.
+    """
+    
+    def __init__(self, database: "SQLiteDatabase", path: str, interval: float):
+        self._database = database
+        self._interval = interval
+        self._connection = ConnectionPool._connect(path)
+        self._last_seq = self._connection.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+        self._data_version = None
+        self._next_prune = 0.0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sqlite-change-feed", daemon=True)
+        self._thread.start()
+    
+    def poll(self):
+        """Deliver every change committed by another process since the last poll"""
+        data_version = self._connection.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._data_version = data_version
+            rows = self._connection.execute(
+                "SELECT seq, collection, record_id, operation, origin FROM changes WHERE seq > ? ORDER BY seq",
+                (self._last_seq,)
+            ).fetchall()
+            if rows and rows[0]["seq"] > self._last_seq + 1:
+                for collection in LOCK_ORDER:
+                    self._database._notify(collection, None, "c")
+            for row in rows:
+                if row["origin"] != self._database._origin:
+                    self._database._notify(row["collection"], row["record_id"], row["operation"])
+            if rows:
+                self._last_seq = rows[-1]["seq"]
+        
+        if time.monotonic() >= self._next_prune:
+            self._next_prune = time.monotonic() + CHANGE_RETENTION / 2
+            self._connection.execute("DELETE FROM changes WHERE changed_at < ?", (time.time() - CHANGE_RETENTION,))
+    
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+        self._connection.close()
+    
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Change feed poll failed")
+
+
+class SQLiteTable(Mapping):
+    """Read-only mapping view of a table, keyed by ID"""
+    
+    def __init__(self, database: "SQLiteDatabase", table: str, from_row: Callable):
+        self._database = database
+        self._table = table
+        self._from_row = from_row
+    
+    def __getitem__(self, record_id):
+        row = self._database._fetchone(f"SELECT * FROM {self._table} WHERE id = ?", (record_id,))
+        if row is None:
+            raise KeyError(record_id)
+        return self._from_row(row)
+    
+    def __contains__(self, record_id) -> bool:
+        return self._database._fetchone(f"SELECT 1 FROM {self._table} WHERE id = ?", (record_id,)) is not None
+    
+    def __iter__(self):
+        rows = self._database._fetchall(f"SELECT id FROM {self._table} ORDER BY id")
+        return iter([row["id"] for row in rows])
+    
+    def __len__(self) -> int:
+        return self._database._fetchone(f"SELECT COUNT(*) FROM {self._table}")[0]
+    
+    def values(self):
+        rows = self._database._fetchall(f"SELECT * FROM {self._table} ORDER BY id")
+        return [self._from_row(row) for row in rows]
+    
+    def get_many(self, ids: Iterable[int]) -> Dict[int, Any]:
+        """Fetch records by ID with one query per MAX_IN_IDS IDs"""
+        ids = list(ids)
+        records = {}
+        for start in range(0, len(ids), MAX_IN_IDS):
+            chunk = ids[start:start + MAX_IN_IDS]
+            rows = self._database._fetchall(
+                f"SELECT * FROM {self._table} WHERE id IN ({', '.join('?' * len(chunk))})", tuple(chunk)
+            )
+            for row in rows:
+                records[row["id"]] = self._from_row(row)
+        return records
+
+
+class SQLiteDatabase(StorageBackend):
+    """Persistent storage backend on a SQLite database in WAL mode.
+
+    Several processes may share one database file: IDs come from the
+    counters table, collection locks are also file locks, and each write
+    is recorded in the changes table for the other processes' listeners.
+    """
+    
+    def __init__(self, path: str, pool_size: int = 40, change_poll_interval: float = 0.05):
+        super().__init__()
+        lock_paths = {name: None if path == ":memory:" else f"{path}-{name}.lock" for name in LOCK_ORDER}
+        self._locks = {name: ProcessLock(lock_path) for name, lock_path in lock_paths.items()}
+        self._path = path
+        self._change_poll_interval = change_poll_interval
+        self._change_feed: Optional[ChangeFeed] = None
+        # Identifies this instance's rows in the changes table
+        self._origin = uuid.uuid4().hex
+        self._pool = ConnectionPool(path, pool_size)
+        
+        self.users = SQLiteTable(self, "users", _row_to_user)
+        self.courses = SQLiteTable(self, "courses", _row_to_course)
+        self.enrollments = SQLiteTable(self, "enrollments", _row_to_enrollment)
+        
+        # Workers starting together must not all seed a brand new database
+        with self.locked(*LOCK_ORDER):
+            is_new = not self._table_exists("users")
+            has_stats = self._table_exists("course_stats")
+            self._create_schema()
+            if is_new:
+                self._initialize_example_data()
+            elif not has_stats:
+                self._backfill_course_stats()
+        # Every process on the file tags versions with the same epoch
+        self.version_epoch = self._fetchone("SELECT value FROM metadata WHERE name = 'version_epoch'")[0]
+    
+    def _create_schema(self):
+        """Create the tables, indexes and counters if they do not exist yet"""
+        with self._pool.connection() as connection:
+            connection.executescript(SCHEMA)
+    
+    def _table_exists(self, table: str) -> bool:
+        return self._fetchone("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)) is not None
+    
+    def _backfill_course_stats(self):
+        """Compute the course counters of a database created before they were kept"""
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO course_stats (course_id, enrolled, completed, active) "
+                "SELECT e.course_id, COUNT(*), SUM(e.completed), SUM(NOT e.completed AND COALESCE(u.is_active, 0)) "
+                "FROM enrollments e LEFT JOIN users u ON u.id = e.user_id GROUP BY e.course_id"
+            )
+    
+    def close(self):
+        """Stop the change feed and close the connection pool"""
+        if self._change_feed is not None:
+            self._change_feed.close()
+        self._pool.close()
+        for lock in self._locks.values():
+            lock.close()
+    
+    def get_many(self, collection: str, ids: Iterable[int]) -> Dict[int, Any]:
+        """Look up records of a collection by ID with `IN (...)` queries instead of one query per ID"""
+        return getattr(self, collection).get_many(ids)
+    
+    def add_change_listener(self, listener: ChangeListener):
+        """Register a change callback, starting the feed of other processes' changes"""
+        super().add_change_listener(listener)
+        if self._change_feed is None:
+            self._change_feed = ChangeFeed(self, self._path, self._change_poll_interval)
+    
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run the block as one write transaction"""
+        with self._pool.connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+    
+    @contextmanager
+    def _write(self, changes: List[Tuple[str, Optional[int], str]]) -> Iterator[sqlite3.Connection]:
+        """Run the block as one write transaction that also records `changes`
+        as (collection, record_id, operation) tuples"""
+        with self._transaction() as connection:
+            yield connection
+            changed_at = time.time()
+            connection.executemany(
+                "INSERT INTO changes (collection, record_id, operation, origin, changed_at) VALUES (?, ?, ?, ?, ?)",
+                [change + (self._origin, changed_at) for change in changes]
+            )
+            # The changes just inserted hold consecutive seqs: the write lock is held
+            last_seq = connection.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self._record_versions(connection, changes, last_seq - len(changes) + 1)
+        for collection, record_id, operation in changes:
+            self._notify(collection, record_id, operation)
+    
+    @staticmethod
+    def _record_versions(
+        connection: sqlite3.Connection, changes: List[Tuple[str, Optional[int], str]], first_seq: int
+    ):
+        """Store the versions set by `changes`, whose seqs start at `first_seq`, in the write's transaction"""
+        for seq, (collection, record_id, operation) in enumerate(changes, first_seq):
+            if record_id is None:
+                connection.execute("DELETE FROM entity_versions WHERE collection = ?", (collection,))
+                connection.execute(
+                    "UPDATE collection_versions SET reset_version = ? WHERE collection = ?", (seq, collection)
+                )
+            elif operation in ("u", "d"):
+                # Deletes keep a row too, as in StorageBackend._bump_version
+                connection.execute(
+                    "INSERT OR REPLACE INTO entity_versions (collection, record_id, version) VALUES (?, ?, ?)",
+                    (collection, record_id, seq)
+                )
+            # A new record needs no row, as in StorageBackend._bump_version
+        last_seqs = {}
+        for seq, (collection, _, _) in enumerate(changes, first_seq):
+            last_seqs[collection] = seq
+        connection.executemany(
+            "UPDATE collection_versions SET version = ? WHERE collection = ?",
+            [(seq, collection) for collection, seq in last_seqs.items()]
+        )
+    
+    def get_version(self, collection: str, record_id: Optional[int] = None) -> int:
+        """Read a version from the database, so every process sees the same one as soon as a write commits"""
+        if record_id is None:
+            return self._fetchone(
+                "SELECT version FROM collection_versions WHERE collection = ?", (collection,)
+            )[0]
+        return self._fetchone(
+            "SELECT COALESCE((SELECT version FROM entity_versions WHERE collection = ? AND record_id = ?), "
+            "(SELECT reset_version FROM collection_versions WHERE collection = ?))",
+            (collection, record_id, collection)
+        )[0]
+    
+    def get_versions(self, collection: str, ids: Iterable[int]) -> Dict[int, int]:
+        """Read the versions of many entities with one query per MAX_IN_IDS IDs"""
+        ids = list(ids)
+        reset_version = self._fetchone(
+            "SELECT reset_version FROM collection_versions WHERE collection = ?", (collection,)
+        )[0]
+        versions = dict.fromkeys(ids, reset_version)
+        for start in range(0, len(ids), MAX_IN_IDS):
+            chunk = ids[start:start + MAX_IN_IDS]
+            rows = self._fetchall(
+                f"SELECT record_id, version FROM entity_versions "
+                f"WHERE collection = ? AND record_id IN ({', '.join('?' * len(chunk))})",
+                (collection,) + tuple(chunk)
+            )
+            for row in rows:
+                versions[row["record_id"]] = row["version"]
+        return versions
+    
+    def _bump_version(self, collection: str, record_id: Optional[int], operation: str):
+        # Versions live in the database and are written with each change
+        pass
+    
+    # Every read goes through these two, which count the rows returned (a
+    # probe counts even when it finds nothing). Rows SQLite skips inside a
+    # query are not counted; EXPLAIN QUERY PLAN shows whether it scanned.
+    
+    def _fetchone(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        examined()
+        with self._pool.connection() as connection:
+            return connection.execute(sql, params).fetchone()
+    
+    def _fetchall(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._pool.connection() as connection:
+            rows = connection.execute(sql, params).fetchall()
+        examined(len(rows))
+        return rows
+    
+    def _update(self, table: str, record_id: int, fields: dict):
+        """Write changed columns of one row"""
+        unknown = set(fields) - UPDATABLE_COLUMNS[table]
+        if unknown:
+            raise ValueError(f"Cannot update {table} columns: {sorted(unknown)}")
+        if not fields:
+            return
+        assignments = ", ".join(f"{name} = ?" for name in sorted(fields))
+        params = tuple(fields[name] for name in sorted(fields)) + (record_id,)
+        with self._write([(table, record_id, "u")]) as connection:
+            connection.execute(f"UPDATE {table} SET {assignments} WHERE id = ?", params)
+    
+    def _page(self, table: str, from_row: Callable, after_id: Optional[int], limit: int) -> Page:
+        """Seek past `after_id` on the primary key and return the next page"""
+        rows = self._fetchall(
+            f"SELECT * FROM {table} WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id if after_id is not None else 0, limit + 1)
+        )
+        has_more = len(rows) > limit
+        items = [from_row(row) for row in rows[:limit]]
+        return Page(items, items[-1].id if has_more else None)
+    
+    def clear(self):
+        """Remove all data and reset the ID counters"""
+        with self._write([(collection, None, "c") for collection in LOCK_ORDER]) as connection:
+            connection.execute("DELETE FROM users")
+            connection.execute("DELETE FROM courses")
+            connection.execute("DELETE FROM enrollments")
+            connection.execute("DELETE FROM course_stats")
+            connection.execute("UPDATE counters SET value = 1")
+    
+    # Users
+    
+    def add_user(self, user: UserRecord):
+        """Store a new user"""
+        self.add_users([user])
+    
+    def add_users(self, users: List[UserRecord]):
+        """Store a batch of new users in one transaction"""
+        with self._write([("users", user.id, "i") for user in users]) as connection:
+            connection.executemany(
+                "INSERT INTO users (id, name, email, is_active, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(user.id, user.name, user.email, user.is_active, user.created_at.isoformat()) for user in users]
+            )
+    
+    def update_user(self, user_id: int, **fields) -> UserRecord:
+        """Apply field changes to a stored user"""
+        self._update("users", user_id, fields)
+        return self.users[user_id]
+    
+    def delete_user(self, user_id: int):
+        """Remove a user"""
+        with self._write([("users", user_id, "d")]) as connection:
+            connection.execute("DELETE FROM users WHERE id = ?", (user_id,))
+    
+    def get_user_id_by_email(self, email: str) -> Optional[int]:
+        """Look up a user ID through the unique email index"""
+        row = self._fetchone("SELECT id FROM users WHERE email = ?", (email,))
+        return row["id"] if row is not None else None
+    
+    def get_users_page(self, after_id: Optional[int], limit: int) -> Page:
+        """Get up to `limit` users with an ID greater than `after_id`"""
+        return self._page("users", _row_to_user, after_id, limit)
+    
+    # Courses
+    
+    def add_course(self, course: CourseRecord):
+        """Store a new course"""
+        with self._write([("courses", course.id, "i")]) as connection:
+            connection.execute(
+                "INSERT INTO courses (id, title, description, is_open, created_at) VALUES (?, ?, ?, ?, ?)",
+                (course.id, course.title, course.description, course.is_open, course.created_at.isoformat())
+            )
+    
+    def update_course(self, course_id: int, **fields) -> CourseRecord:
+        """Apply field changes to a stored course"""
+        self._update("courses", course_id, fields)
+        return self.courses[course_id]
+    
+    def delete_course(self, course_id: int):
+        """Remove a course"""
+        with self._write([("courses", course_id, "d")]) as connection:
+            connection.execute("DELETE FROM courses WHERE id = ?", (course_id,))
+    
+    def get_courses_page(self, after_id: Optional[int], limit: int) -> Page:
+        """Get up to `limit` courses with an ID greater than `after_id`"""
+        return self._page("courses", _row_to_course, after_id, limit)
+    
+    # Enrollments
+    
+    def add_enrollment(self, enrollment: EnrollmentRecord):
+        """Store a new enrollment"""
+        self.add_enrollments([enrollment])
+    
+    def add_enrollments(self, enrollments: List[EnrollmentRecord]):
+        """Store a batch of new enrollments in one transaction"""
+        with self._write([("enrollments", enrollment.id, "i") for enrollment in enrollments]) as connection:
+            connection.executemany(
+                "INSERT INTO enrollments (id, user_id, course_id, enrolled_date, completed, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        enrollment.id, enrollment.user_id, enrollment.course_id,
+                        enrollment.enrolled_date.isoformat(), enrollment.completed,
+                        enrollment.created_at.isoformat()
+                    )
+                    for enrollment in enrollments
+                ]
+            )
+    
+    def update_enrollment(self, enrollment_id: int, **fields) -> EnrollmentRecord:
+        """Apply field changes to a stored enrollment"""
+        self._update("enrollments", enrollment_id, fields)
+        return self.enrollments[enrollment_id]
+    
+    def delete_enrollment(self, enrollment_id: int):
+        """Remove an enrollment"""
+        with self._write([("enrollments", enrollment_id, "d")]) as connection:
+            connection.execute("DELETE FROM enrollments WHERE id = ?", (enrollment_id,))
+    
+    def get_enrollment_id(self, user_id: int, course_id: int) -> Optional[int]:
+        """Look up the enrollment of a user in a course through the unique index"""
+        row = self._fetchone(
+            "SELECT id FROM enrollments WHERE user_id = ? AND course_id = ?", (user_id, course_id)
+        )
+        return row["id"] if row is not None else None
+    
+    def get_user_enrollment_ids(self, user_id: int) -> List[int]:
+        """Get the IDs of a user's enrollments in ID order"""
+        rows = self._fetchall("SELECT id FROM enrollments WHERE user_id = ? ORDER BY id", (user_id,))
+        return [row["id"] for row in rows]
+    
+    def get_course_enrollment_ids(self, course_id: int) -> List[int]:
+        """Get the IDs of a course's enrollments in ID order"""
+        rows = self._fetchall("SELECT id FROM enrollments WHERE course_id = ? ORDER BY id", (course_id,))
+        return [row["id"] for row in rows]
+    
+    def get_enrollments_page(self, after_id: Optional[int], limit: int) -> Page:
+        """Get up to `limit` enrollments with an ID greater than `after_id`"""
+        return self._page("enrollments", _row_to_enrollment, after_id, limit)
+    
+    def find_enrollments_page(self, filters: EnrollmentFilter, after_id: Optional[int], limit: int) -> Page:
+        """Get a page of matching enrollments with one query; SQLite picks the user, course or date index"""
+        conditions = ["id > ?"]
+        params: list = [after_id if after_id is not None else 0]
+        for condition, value in (
+            ("course_id = ?", filters.course_id),
+            ("user_id = ?", filters.user_id),
+            ("completed = ?", filters.completed),
+            ("enrolled_date >= ?", filters.enrolled_from and filters.enrolled_from.isoformat()),
+            ("enrolled_date <= ?", filters.enrolled_to and filters.enrolled_to.isoformat())
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        rows = self._fetchall(
+            f"SELECT * FROM enrollments WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?",
+            (*params, limit + 1)
+        )
+        has_more = len(rows) > limit
+        items = [_row_to_enrollment(row) for row in rows[:limit]]
+        return Page(items, items[-1].id if has_more else None)
+    
+    def count_enrollments_by_course(
+        self, enrolled_from: Optional[date], enrolled_to: Optional[date]
+    ) -> Dict[int, Tuple[int, int]]:
+        """Count (enrolled, completed) per course with one GROUP BY query"""
+        rows = self._fetchall(
+            "SELECT course_id, COUNT(*) AS enrolled, SUM(completed) AS completed FROM enrollments "
+            "WHERE enrolled_date >= ? AND enrolled_date <= ? GROUP BY course_id",
+            (
+                (enrolled_from or date.min).isoformat(),
+                (enrolled_to or date.max).isoformat()
+            )
+        )
+        # The enrollments each group summarizes
+        examined(sum(row["enrolled"] for row in rows))
+        return {row["course_id"]: (row["enrolled"], row["completed"]) for row in rows}
+    
+    def get_course_stats(self, course_id: int) -> Tuple[int, int, int]:
+        """Read a course's trigger-maintained counters with one primary key lookup"""
+        row = self._fetchone("SELECT enrolled, completed, active FROM course_stats WHERE course_id = ?", (course_id,))
+        return (row["enrolled"], row["completed"], row["active"]) if row is not None else (0, 0, 0)
+    
+    def get_top_courses(self, by: str, n: int) -> List[Tuple[int, int]]:
+        """Rank open courses by walking the course_stats index on the chosen counter"""
+        column = "enrolled" if by == "enrollments" else "completed"
+        # CROSS JOIN keeps course_stats as the outer loop, so its index gives
+        # the order and the scan stops after `n` open courses
+        rows = self._fetchall(
+            f"SELECT s.course_id, s.{column} AS count FROM course_stats s CROSS JOIN courses c "
+            f"WHERE c.id = s.course_id AND c.is_open ORDER BY s.{column} DESC, s.course_id LIMIT ?",
+            (n,)
+        )
+        return [(row["course_id"], row["count"]) for row in rows]
+    
+    def user_has_enrollments(self, user_id: int) -> bool:
+        """Check if a user has any enrollments"""
+        return self._fetchone("SELECT 1 FROM enrollments WHERE user_id = ? LIMIT 1", (user_id,)) is not None
+    
+    def course_has_enrollments(self, course_id: int) -> bool:
+        """Check if a course has any enrollments"""
+        return self._fetchone("SELECT 1 FROM enrollments WHERE course_id = ? LIMIT 1", (course_id,)) is not None
+    
+    # ID counters
+    
+    def _get_counter(self, name: str) -> int:
+        return self._fetchone("SELECT value FROM counters WHERE name = ?", (name,))["value"]
+    
+    def _increment_counter(self, name: str):
+        with self._transaction() as connection:
+            connection.execute("UPDATE counters SET value = value + 1 WHERE name = ?", (name,))
+    
+    def _allocate(self, name: str) -> int:
+        """Take the next value of a counter in a single statement"""
+        with self._transaction() as connection:
+            return connection.execute(
+                "UPDATE counters SET value = value + 1 WHERE name = ? RETURNING value - 1", (name,)
+            ).fetchone()[0]
+    
+    def allocate_user_id(self) -> int:
+        """Atomically take the next user ID"""
+        return self._allocate("users")
+    
+    def allocate_course_id(self) -> int:
+        """Atomically take the next course ID"""
+        return self._allocate("courses")
+    
+    def allocate_enrollment_id(self) -> int:
+        """Atomically take the next enrollment ID"""
+        return self._allocate("enrollments")
+    
+    def get_next_user_id(self) -> int:
+        """Get the next available user ID"""
+        return self._get_counter("users")
+    
+    def get_next_course_id(self) -> int:
+        """Get the next available course ID"""
+        return self._get_counter("courses")
+    
+    def get_next_enrollment_id(self) -> int:
+        """Get the next available enrollment ID"""
+        return self._get_counter("enrollments")
+    
+    def increment_user_counter(self):
+        """Increment the user counter"""
+        self._increment_counter("users")
+    
+    def increment_course_counter(self):
+        """Increment the course counter"""
+        self._increment_counter("courses")
+    
+    def increment_enrollment_counter(self):
+        """Increment the enrollment counter"""
+        self._increment_counter("enrollments")
@@ -0,0 +1,417 @@
+import heapq
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import ExitStack, contextmanager
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+from schemas.enrollment import CourseEnrollmentCounts, EnrollmentSummary
+from services.pagination import Page
+from services.records import CourseRecord, EnrollmentRecord, UserRecord
+
+# Collections are always locked in this order so multi-collection locks cannot deadlock
+LOCK_ORDER = ("users", "courses", "enrollments")
+
+# Called as listener(collection, record_id) after a change; a record_id of
+# None means any record of the collection may have changed
+ChangeListener = Callable[[str, Optional[int]], None]
+
+# Counts courses can be ranked by, in the order of the first two course stats
+TOP_COURSE_METRICS = ("enrollments", "completions")
+
+
+class EnrollmentFilter(NamedTuple):
+    """Conditions on enrollments; None leaves a field unconstrained and the date bounds are inclusive"""
+    course_id: Optional[int] = None
+    user_id: Optional[int] = None
+    completed: Optional[bool] = None
+    enrolled_from: Optional[date] = None
+    enrolled_to: Optional[date] = None
+    
+    @property
+    def is_empty(self) -> bool:
+        return all(value is None for value in self)
+    
+    def matches(self, enrollment: EnrollmentRecord) -> bool:
+        return (
+            (self.course_id is None or enrollment.course_id == self.course_id)
+            and (self.user_id is None or enrollment.user_id == self.user_id)
+            and (self.completed is None or enrollment.completed == self.completed)
+            and (self.enrolled_from is None or enrollment.enrolled_date >= self.enrolled_from)
+            and (self.enrolled_to is None or enrollment.enrolled_date <= self.enrolled_to)
+        )
+
+
+class StorageBackend(ABC):
+    """Interface the services use to read and write users, courses and enrollments.
+
+    Reads go through the `users`, `courses` and `enrollments` mappings; every
+    write goes through the add/update/delete methods so a backend can keep
+    its indexes (or its tables) consistent. Backends count the records
+    their mappings and index lookups read with `scan_cost.examined`, so
+    service operations are charged for whatever they walk.
+    """
+    
+    users: Mapping[int, UserRecord]
+    courses: Mapping[int, CourseRecord]
+    enrollments: Mapping[int, EnrollmentRecord]
+    
+    def __init__(self):
+        self._locks = {name: threading.RLock() for name in LOCK_ORDER}
+        self._change_listeners: List[ChangeListener] = []
+        
+        # Versions are values of one clock that ticks on every change; the
+        # epoch tells versions of this instance from those of another process.
+        # Backends shared between processes keep both in the shared store.
+        self.version_epoch = uuid.uuid4().hex[:8]
+        self._version_lock = threading.Lock()
+        self._version_clock = 0
+        self._collection_versions = dict.fromkeys(LOCK_ORDER, 0)
+        # Only entities changed since their collection was last reset have
+        # an entry; any other entity has the version of that reset
+        self._entity_versions: Dict[str, Dict[int, int]] = {name: {} for name in LOCK_ORDER}
+        self._reset_versions = dict.fromkeys(LOCK_ORDER, 0)
+    
+    @contextmanager
+    def locked(self, *collections: str) -> Iterator[None]:
+        """Hold the write locks of the given collections for the duration of the block.
+
+        Locks are re-entrant, so the add/update/delete methods (which lock
+        their own collection) can be called inside. Services use this to
+        make check-then-write sequences atomic.
+        """
+        with ExitStack() as stack:
+            for name in LOCK_ORDER:
+                if name in collections:
+                    stack.enter_context(self._locks[name])
+            yield
+    
+    @contextmanager
+    def atomic(self, *collections: str) -> Iterator[None]:
+        """Hold the write locks of `collections`, undoing the block's writes if it raises where the backend can.
+
+        This generic version only locks. On backends without an undo journal,
+        make the write that can fail a single batch call (SQLite commits
+        each one in a transaction).
+        """
+        with self.locked(*collections):
+            yield
+    
+    def add_change_listener(self, listener: ChangeListener):
+        """Register a callback run after every change to the data.
+
+        Backends shared between processes also report changes made by the
+        other processes, so per-process caches can be invalidated.
+        """
+        self._change_listeners.append(listener)
+    
+    def get_version(self, collection: str, record_id: Optional[int] = None) -> int:
+        """Get the version of a collection, or of one of its entities, which grows on every change to it"""
+        if record_id is None:
+            return self._collection_versions[collection]
+        return self._entity_versions[collection].get(record_id, self._reset_versions[collection])
+    
+    def get_versions(self, collection: str, ids: Iterable[int]) -> Dict[int, int]:
+        """Get the versions of many entities of a collection at once"""
+        return {record_id: self.get_version(collection, record_id) for record_id in ids}
+    
+    def _notify(self, collection: str, record_id: Optional[int], operation: str = "u"):
+        """Report a change: operation is "i", "u" or "d" (insert, update, delete)
+        for one record, or "c" with a record_id of None when the whole collection changed"""
+        self._bump_version(collection, record_id, operation)
+        for listener in self._change_listeners:
+            listener(collection, record_id)
+    
+    def _bump_version(self, collection: str, record_id: Optional[int], operation: str):
+        with self._version_lock:
+            self._version_clock += 1
+            self._collection_versions[collection] = self._version_clock
+            entity_versions = self._entity_versions[collection]
+            if record_id is None:
+                entity_versions.clear()
+                self._reset_versions[collection] = self._version_clock
+            elif operation in ("u", "d"):
+                # A deleted record keeps its entry, so its last tag never matches again
+                entity_versions[record_id] = self._version_clock
+            # A new record needs no entry: its ID was never tagged before or,
+            # when Database.restore() hands it out again, the delete that
+            # undid its earlier insert left an entry no earlier tag matches
+    
+    def _initialize_example_data(self):
+        """Initialize with the example data provided in requirements"""
+        # Create example user
+        user = UserRecord(
+            id=self.allocate_user_id(),
+            name="Alice",
+            email="alice@example.com",
+            is_active=True,
+            created_at=datetime.now()
+        )
+        self.add_user(user)
+        
+        # Create example course
+        course = CourseRecord(
+            id=self.allocate_course_id(),
+            title="Python Basics",
+            description="Learn Python",
+            is_open=True,
+            created_at=datetime.now()
+        )
+        self.add_course(course)
+        
+        # Create example enrollment
+        enrollment = EnrollmentRecord(
+            id=self.allocate_enrollment_id(),
+            user_id=user.id,
+            course_id=course.id,
+            enrolled_date=datetime.now().date(),
+            completed=False,
+            created_at=datetime.now()
+        )
+        self.add_enrollment(enrollment)
+    
+    @abstractmethod
+    def clear(self):
+        """Remove all data and indexes and reset the ID counters"""
+    
+    def close(self):
+        """Flush and release anything the backend holds open"""
+    
+    def get_many(self, collection: str, ids: Iterable[int]) -> Dict[int, Any]:
+        """Look up records of a collection by ID; IDs without a record are left out.
+
+        This generic version looks the IDs up one by one; backends where a
+        lookup is a round trip override it to fetch them together.
+        """
+        table = getattr(self, collection)
+        records = {}
+        for record_id in ids:
+            record = table.get(record_id)
+            if record is not None:
+                records[record_id] = record
+        return records
+    
+    # Users
+    
+    @abstractmethod
+    def add_user(self, user: UserRecord):
+        """Store a new user"""
+    
+    def add_users(self, users: List[UserRecord]):
+        """Store a batch of new users"""
+        for user in users:
+            self.add_user(user)
+    
+    @abstractmethod
+    def update_user(self, user_id: int, **fields) -> UserRecord:
+        """Apply field changes to a stored user and return it"""
+    
+    @abstractmethod
+    def delete_user(self, user_id: int):
+        """Remove a user"""
+    
+    @abstractmethod
+    def get_user_id_by_email(self, email: str) -> Optional[int]:
+        """Look up a user ID by email"""
+    
+    @abstractmethod
+    def get_users_page(self, after_id: Optional[int], limit: int) -> Page:
+        """Get up to `limit` users with an ID greater than `after_id`"""
+    
+    # Courses
+    
+    @abstractmethod
+    def add_course(self, course: CourseRecord):
+        """Store a new course"""
+    
+    @abstractmethod
+    def update_course(self, course_id: int, **fields) -> CourseRecord:
+        """Apply field changes to a stored course and return it"""
+    
+    @abstractmethod
+    def delete_course(self, course_id: int):
+        """Remove a course"""
+    
+    @abstractmethod
+    def get_courses_page(self, after_id: Optional[int], limit: int) -> Page:
+        """Get up to `limit` courses with an ID greater than `after_id`"""
+    
+    # Enrollments
+    
+    @abstractmethod
+    def add_enrollment(self, enrollment: EnrollmentRecord):
+        """Store a new enrollment"""
+    
+    def add_enrollments(self, enrollments: List[EnrollmentRecord]):
+        """Store a batch of new enrollments"""
+        for enrollment in enrollments:
+            self.add_enrollment(enrollment)
+    
+    @abstractmethod
+    def update_enrollment(self, enrollment_id: int, **fields) -> EnrollmentRecord:
+        """Apply field changes to a stored enrollment and return it"""
+    
+    @abstractmethod
+    def delete_enrollment(self, enrollment_id: int):
+        """Remove an enrollment"""
+    
+    @abstractmethod
+    def get_enrollment_id(self, user_id: int, course_id: int) -> Optional[int]:
+        """Look up the enrollment of a user in a course"""
+    
+    @abstractmethod
+    def get_user_enrollment_ids(self, user_id: int) -> List[int]:
+        """Get the IDs of a user's enrollments in ID order"""
+    
+    @abstractmethod
+    def get_course_enrollment_ids(self, course_id: int) -> List[int]:
+        """Get the IDs of a course's enrollments in ID order"""
+    
+    @abstractmethod
+    def get_enrollments_page(self, after_id: Optional[int], limit: int) -> Page:
+        """Get up to `limit` enrollments with an ID greater than `after_id`"""
+    
+    def find_enrollments_page(self, filters: EnrollmentFilter, after_id: Optional[int], limit: int) -> Page:
+        """Get up to `limit` enrollments matching `filters` with an ID greater than `after_id`.
+
+        This generic version walks every enrollment page by page; backends
+        override it to start from their indexes.
+        """
+        if filters.is_empty:
+            return self.get_enrollments_page(after_id, limit)
+        items: List[EnrollmentRecord] = []
+        while True:
+            page = self.get_enrollments_page(after_id, 1000)
+            for enrollment in page.items:
+                if filters.matches(enrollment):
+                    if len(items) == limit:
+                        return Page(items, items[-1].id)
+                    items.append(enrollment)
+            if page.next_after_id is None:
+                return Page(items, None)
+            after_id = page.next_after_id
+    
+    def count_enrollments_by_course(
+        self, enrolled_from: Optional[date], enrolled_to: Optional[date]
+    ) -> Dict[int, Tuple[int, int]]:
+        """Count (enrolled, completed) per course for enrollments in a date range"""
+        counts: Dict[int, List[int]] = {}
+        for enrollment in self.enrollments.values():
+            if enrolled_from is not None and enrollment.enrolled_date < enrolled_from:
+                continue
+            if enrolled_to is not None and enrollment.enrolled_date > enrolled_to:
+                continue
+            course_counts = counts.setdefault(enrollment.course_id, [0, 0])
+            course_counts[0] += 1
+            course_counts[1] += enrollment.completed
+        return {course_id: (enrolled, completed) for course_id, (enrolled, completed) in counts.items()}
+    
+    def get_course_stats(self, course_id: int) -> Tuple[int, int, int]:
+        """Count (enrolled, completed, active learners) for a course.
+
+        Active learners have not completed the course and their account is
+        active. This generic version scans the course's enrollments; backends
+        override it with counters kept up to date by their writes.
+        """
+        enrolled = completed = active = 0
+        for enrollment_id in self.get_course_enrollment_ids(course_id):
+            enrollment = self.enrollments.get(enrollment_id)
+            if enrollment is None:
+                continue
+            user = self.users.get(enrollment.user_id)
+            enrolled += 1
+            completed += enrollment.completed
+            active += not enrollment.completed and user is not None and user.is_active
+        return enrolled, completed, active
+    
+    def get_top_courses(self, by: str, n: int) -> List[Tuple[int, int]]:
+        """Rank open courses by enrollment or completion count.
+
+        Returns up to `n` (course_id, count) pairs, highest count first and
+        ties in ID order. This generic version reads every course; backends
+        override it with an ordered structure kept up to date by their writes.
+        """
+        column = TOP_COURSE_METRICS.index(by)
+        counts = []
+        after_id = None
+        while True:
+            page = self.get_courses_page(after_id, 1000)
+            for course in page.items:
+                if course.is_open:
+                    counts.append((course.id, self.get_course_stats(course.id)[column]))
+            if page.next_after_id is None:
+                break
+            after_id = page.next_after_id
+        return heapq.nsmallest(n, counts, key=lambda ranked: (-ranked[1], ranked[0]))
+    
+    def summarize_enrollments(
+        self, enrolled_from: Optional[date] = None, enrolled_to: Optional[date] = None
+    ) -> EnrollmentSummary:
+        """Summarize enrollment and completion counts, overall and per course"""
+        counts = self.count_enrollments_by_course(enrolled_from, enrolled_to)
+        courses = [
+            CourseEnrollmentCounts(course_id=course_id, enrolled=enrolled, completed=completed)
+            for course_id, (enrolled, completed) in sorted(counts.items())
+        ]
+        return EnrollmentSummary(
+            enrolled_from=enrolled_from,
+            enrolled_to=enrolled_to,
+            enrolled=sum(course.enrolled for course in courses),
+            completed=sum(course.completed for course in courses),
+            courses=courses
+        )
+    
+    @abstractmethod
+    def user_has_enrollments(self, user_id: int) -> bool:
+        """Check if a user has any enrollments"""
+    
+    @abstractmethod
+    def course_has_enrollments(self, course_id: int) -> bool:
+        """Check if a course has any enrollments"""
+    
+    # ID counters
+    
+    def allocate_user_id(self) -> int:
+        """Atomically take the next user ID"""
+        with self.locked("users"):
+            user_id = self.get_next_user_id()
+            self.increment_user_counter()
+            return user_id
+    
+    def allocate_course_id(self) -> int:
+        """Atomically take the next course ID"""
+        with self.locked("courses"):
+            course_id = self.get_next_course_id()
+            self.increment_course_counter()
+            return course_id
+    
+    def allocate_enrollment_id(self) -> int:
+        """Atomically take the next enrollment ID"""
+        with self.locked("enrollments"):
+            enrollment_id = self.get_next_enrollment_id()
+            self.increment_enrollment_counter()
+            return enrollment_id
+    
+    @abstractmethod
+    def get_next_user_id(self) -> int:
+        """Get the next available user ID"""
+    
+    @abstractmethod
+    def get_next_course_id(self) -> int:
+        """Get the next available course ID"""
+    
+    @abstractmethod
+    def get_next_enrollment_id(self) -> int:
+        """Get the next available enrollment ID"""
+    
+    @abstractmethod
+    def increment_user_counter(self):
+        """Increment the user counter"""
+    
+    @abstractmethod
+    def increment_course_counter(self):
+        """Increment the course counter"""
+    
+    @abstractmethod
+    def increment_enrollment_counter(self):
+        """Increment the enrollment counter"""
@@ -0,0 +1,308 @@
+import csv
+import io
+import itertools
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from schemas.user import UserCreate, UserImportError, UserImportProgress, UserImportResult
+from services.database import db
+from services.records import UserRecord
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+MAX_LINE_BYTES = 64 * 1024
+# Finished imports whose progress is kept for the status endpoint
+MAX_TRACKED_IMPORTS = 100
+
+CONTENT_TYPE_FORMATS = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+# Latest progress of each import by ID, oldest first
+_progress: "OrderedDict[int, UserImportProgress]" = OrderedDict()
+_progress_lock = threading.Lock()
+_import_ids = itertools.count(1)
+
+
+def get_import_progress(import_id: int) -> UserImportProgress:
+    """Get the progress of a running or recent import"""
+    with _progress_lock:
+        progress = _progress.get(import_id)
+    if progress is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import not found"
+        )
+    return progress
+
+
+def list_import_progress() -> List[UserImportProgress]:
+    """Get the progress of the running and recent imports, newest first"""
+    with _progress_lock:
+        return list(reversed(_progress.values()))
+
+
+class _ChunkStream(io.RawIOBase):
+    """A readable binary stream over an iterable of byte chunks, pulled as they are read"""
+    
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._chunk = b""
+        self._offset = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        while self._offset == len(self._chunk):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._chunk, self._offset = chunk, 0
+        size = min(len(buffer), len(self._chunk) - self._offset)
+        buffer[:size] = self._chunk[self._offset:self._offset + size]
+        self._offset += size
+        return size
+
+
+class UserImporter:
+    """Incrementally parse a CSV or NDJSON upload and create users in chunks.
+    
+    The upload is pulled in arbitrary byte chunks; only the current record
+    and one chunk of pending users are held in memory, so an import of any
+    size runs in constant memory. CSV goes through csv.reader over a text
+    wrapper of the stream, so quoted fields may span lines. Progress is
+    published after every committed chunk, for the import status endpoint.
+    """
+    
+    def __init__(self, format: str, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.id = next(_import_ids)
+        self.format = format
+        self.chunk_size = chunk_size
+        self._line_number = 0
+        self._pending: List[Tuple[int, UserCreate]] = []  # (line number, row)
+        self._pending_emails = set()
+        self._rows = 0
+        self._created = 0
+        self._chunks = 0
+        self._errors: List[UserImportError] = []
+        self._error_count = 0
+        self._publish("running")
+    
+    @staticmethod
+    def detect_format(requested: Optional[str], content_type: Optional[str]) -> str:
+        """Pick the upload format from the query parameter or the Content-Type header"""
+        if requested:
+            return requested
+        media_type = (content_type or "").split(";")[0].strip().lower()
+        if media_type in CONTENT_TYPE_FORMATS:
+            return CONTENT_TYPE_FORMATS[media_type]
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Upload must be CSV (text/csv) or NDJSON (application/x-ndjson)"
+        )
+    
+    def run(self, chunks: Iterable[bytes]) -> UserImportResult:
+        """Import an upload given as byte chunks, commit the last chunk and return the summary"""
+        stream = io.BufferedReader(_ChunkStream(chunks))
+        try:
+            if self.format == "csv":
+                self._import_csv(stream)
+            else:
+                self._import_ndjson(stream)
+            self._commit()
+        except BaseException:
+            self._publish("failed")
+            raise
+        self._publish("done")
+        return UserImportResult(
+            id=self.id,
+            format=self.format,
+            rows=self._rows,
+            created=self._created,
+            rejected=self._error_count,
+            chunks=self._chunks,
+            errors=self._errors,
+            errors_truncated=self._error_count > len(self._errors)
+        )
+    
+    def _import_ndjson(self, stream: io.BufferedReader):
+        """Parse, validate and queue each line of an NDJSON upload"""
+        for raw in self._read_lines(stream, b"\n"):
+            self._line_number += 1
+            try:
+                line = raw.decode("utf-8-sig" if self._line_number == 1 else "utf-8").rstrip("\r\n")
+            except UnicodeDecodeError:
+                self._rows += 1
+                self._reject("Line is not valid UTF-8")
+                continue
+            if not line.strip():
+                continue
+            
+            self._rows += 1
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("Row must be a JSON object")
+            except ValueError as exc:
+                self._reject(self._describe_error(exc))
+                continue
+            self._queue(row)
+    
+    def _import_csv(self, stream: io.BufferedReader):
+        """Parse, validate and queue each record of a CSV upload"""
+        # Undecodable bytes become lone surrogates, so a bad record is
+        # rejected on its own instead of failing the whole upload
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="surrogateescape", newline="")
+        reader = csv.reader(self._read_lines(text, ("\n", "\r")))
+        header: Optional[List[str]] = None
+        while True:
+            # Errors are reported at the line a record starts on
+            self._line_number = reader.line_num + 1
+            try:
+                values = next(reader)
+            except StopIteration:
+                break
+            except csv.Error as exc:
+                self._rows += 1
+                self._reject(str(exc))
+                continue
+            if not values or (len(values) == 1 and not values[0].strip()):
+                continue
+            
+            valid_utf8 = self._is_utf8(values)
+            if header is None:
+                if not valid_utf8:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="CSV header is not valid UTF-8"
+                    )
+                header = [name.strip() for name in values]
+                continue
+            
+            self._rows += 1
+            if not valid_utf8:
+                self._reject("Row is not valid UTF-8")
+            elif len(values) != len(header):
+                self._reject(f"Expected {len(header)} columns, got {len(values)}")
+            else:
+                # Empty cells fall back to the schema defaults
+                self._queue({name: value for name, value in zip(header, values) if value != ""})
+    
+    @staticmethod
+    def _read_lines(stream, line_endings) -> Iterator:
+        """Yield the lines of a binary or text stream, refusing any longer than MAX_LINE_BYTES"""
+        for line_number in itertools.count(1):
+            line = stream.readline(MAX_LINE_BYTES + 1)
+            if not line:
+                return
+            if len(line) > MAX_LINE_BYTES and not line.endswith(line_endings):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Line {line_number} is longer than {MAX_LINE_BYTES} bytes"
+                )
+            yield line
+    
+    @staticmethod
+    def _is_utf8(values: List[str]) -> bool:
+        try:
+            for value in values:
+                value.encode("utf-8")
+        except UnicodeEncodeError:
+            return False
+        return True
+    
+    def _queue(self, row: Dict):
+        """Validate one parsed row and queue it for the next chunk"""
+        try:
+            user_data = UserCreate.model_validate(row)
+        except ValidationError as exc:
+            self._reject(self._describe_error(exc))
+            return
+        
+        if user_data.email in self._pending_emails or db.get_user_id_by_email(user_data.email) is not None:
+            self._reject("Email already exists")
+            return
+        
+        self._pending.append((self._line_number, user_data))
+        self._pending_emails.add(user_data.email)
+        if len(self._pending) >= self.chunk_size:
+            self._commit()
+    
+    @staticmethod
+    def _describe_error(exc: Exception) -> str:
+        """Flatten a parse or validation error into a single message"""
+        if isinstance(exc, ValidationError):
+            return "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                for error in exc.errors()
+            )
+        if isinstance(exc, json.JSONDecodeError):
+            return f"Invalid JSON: {exc.msg}"
+        return str(exc)
+    
+    def _reject(self, error: str, row: Optional[int] = None):
+        """Record a row-level error, keeping at most MAX_REPORTED_ERRORS of them"""
+        self._error_count += 1
+        if len(self._errors) < MAX_REPORTED_ERRORS:
+            self._errors.append(UserImportError(row=row or self._line_number, error=error))
+    
+    def _commit(self):
+        """Create the pending users in one batch"""
+        if not self._pending:
+            return
+        users = []
+        # Emails were checked when queued; check again under the lock in
+        # case a concurrent request created one of them since
+        with db.locked("users"):
+            for line_number, user_data in self._pending:
+                if db.get_user_id_by_email(user_data.email) is not None:
+                    self._reject("Email already exists", row=line_number)
+                    continue
+                users.append(UserRecord(
+                    id=db.allocate_user_id(),
+                    name=user_data.name,
+                    email=user_data.email,
+                    is_active=user_data.is_active,
+                    created_at=datetime.now()
+                ))
+            db.add_users(users)
+        
+        self._created += len(users)
+        self._chunks += 1
+        self._pending.clear()
+        self._pending_emails.clear()
+        self._publish("running")
+        logger.info(
+            "User import %d: chunk %d committed, %d rows processed, %d created, %d rejected",
+            self.id, self._chunks, self._rows, self._created, self._error_count
+        )
+    
+    def _publish(self, state: str):
+        """Make the current progress visible to the status endpoint"""
+        progress = UserImportProgress(
+            id=self.id,
+            format=self.format,
+            status=state,
+            rows=self._rows,
+            created=self._created,
+            rejected=self._error_count,
+            chunks=self._chunks
+        )
+        with _progress_lock:
+            _progress[self.id] = progress
+            # Forget the oldest finished imports; running ones stay listed
+            finished = [import_id for import_id, entry in _progress.items() if entry.status != "running"]
+            for import_id in finished[:max(0, len(finished) - MAX_TRACKED_IMPORTS)]:
+                del _progress[import_id]
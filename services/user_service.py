@@ -1,115 +1,141 @@
 from datetime import datetime
 from typing import List, Optional
 from fastapi import HTTPException, status
-from schemas.user import User, UserCreate, UserUpdate
+from schemas.user import UserCreate, UserUpdate
+from services.batch_loader import Batch, BatchLoader
 from services.database import db
+from services.pagination import DEFAULT_PAGE_SIZE, Page
+from services.records import UserRecord
+from services.search_index import get_search_index
+from services.scan_cost import accounted
 
 
 class UserService:
     @staticmethod
-    def create_user(user_data: UserCreate) -> User:
+    @accounted
+    def create_user(user_data: UserCreate) -> UserRecord:
         """Create a new user"""
-        # Check if email already exists
-        for existing_user in db.users.values():
-            if existing_user.email == user_data.email:
+        with db.locked("users"):
+            # Check if email already exists
+            if db.get_user_id_by_email(user_data.email) is not None:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Email already exists"
                 )
-        
-        user_id = db.get_next_user_id()
-        user = User(
-            id=user_id,
-            name=user_data.name,
-            email=user_data.email,
-            is_active=user_data.is_active,
-            created_at=datetime.now()
-        )
-        
-        db.users[user_id] = user
-        db.increment_user_counter()
-        return user
+            
+            user = UserRecord(
+                id=db.allocate_user_id(),
+                name=user_data.name,
+                email=user_data.email,
+                is_active=user_data.is_active,
+                created_at=datetime.now()
+            )
+            
+            db.add_user(user)
+            return user
     
     @staticmethod
-    def get_user(user_id: int) -> User:
+    @accounted
+    def get_user(user_id: int) -> UserRecord:
         """Get a user by ID"""
-        if user_id not in db.users:
+        user = db.users.get(user_id)
+        if user is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
-        return db.users[user_id]
+        return user
     
     @staticmethod
-    def get_all_users() -> List[User]:
-        """Get all users"""
-        return list(db.users.values())
+    @accounted
+    def get_users(user_ids: List[int]) -> Batch:
+        """Get many users by ID at once, in the requested order, listing the IDs without a user"""
+        users = BatchLoader(db, "users").load_many(user_ids)
+        return Batch(
+            items=[user for user in users if user is not None],
+            missing=[user_id for user_id, user in zip(user_ids, users) if user is None]
+        )
+    
+    @staticmethod
+    @accounted
+    def get_all_users(after_id: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE) -> Page:
+        """Get a page of users in ID order, starting after `after_id`"""
+        return db.get_users_page(after_id, limit)
     
     @staticmethod
-    def update_user(user_id: int, user_data: UserUpdate) -> User:
+    @accounted
+    def search_users(query: str, limit: int = 20) -> List[UserRecord]:
+        """Find users whose name or email has words starting with every word of `query`"""
+        return get_search_index(db, "users").search(query, limit)
+    
+    @staticmethod
+    @accounted
+    def update_user(user_id: int, user_data: UserUpdate) -> UserRecord:
         """Update a user"""
-        if user_id not in db.users:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-        
-        user = db.users[user_id]
-        
-        # Check if email is being updated and if it already exists
-        if user_data.email and user_data.email != user.email:
-            for existing_user in db.users.values():
-                if existing_user.id != user_id and existing_user.email == user_data.email:
+        with db.locked("users"):
+            if user_id not in db.users:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User not found"
+                )
+            
+            user = db.users[user_id]
+            
+            # Check if email is being updated and if it already exists
+            if user_data.email and user_data.email != user.email:
+                existing_user_id = db.get_user_id_by_email(user_data.email)
+                if existing_user_id is not None and existing_user_id != user_id:
                     raise HTTPException(
                         status_code=status.HTTP_400_BAD_REQUEST,
                         detail="Email already exists"
                     )
-        
-        # Update fields
-        if user_data.name is not None:
-            user.name = user_data.name
-        if user_data.email is not None:
-            user.email = user_data.email
-        if user_data.is_active is not None:
-            user.is_active = user_data.is_active
-        
-        return user
+            
+            # Update fields
+            changes = {}
+            if user_data.name is not None:
+                changes["name"] = user_data.name
+            if user_data.email is not None:
+                changes["email"] = user_data.email
+            if user_data.is_active is not None:
+                changes["is_active"] = user_data.is_active
+            
+            return db.update_user(user_id, **changes)
     
     @staticmethod
+    @accounted
     def delete_user(user_id: int) -> None:
         """Delete a user"""
-        if user_id not in db.users:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-        
-        # Check if user has any enrollments
-        for enrollment in db.enrollments.values():
-            if enrollment.user_id == user_id:
+        with db.locked("users", "enrollments"):
+            if user_id not in db.users:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User not found"
+                )
+            
+            # Check if user has any enrollments
+            if db.user_has_enrollments(user_id):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Cannot delete user with existing enrollments"
                 )
-        
-        del db.users[user_id]
+            
+            db.delete_user(user_id)
     
     @staticmethod
-    def deactivate_user(user_id: int) -> User:
+    @accounted
+    def deactivate_user(user_id: int) -> UserRecord:
         """Deactivate a user"""
-        if user_id not in db.users:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-        
-        user = db.users[user_id]
-        user.is_active = False
-        return user
+        with db.locked("users"):
+            if user_id not in db.users:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User not found"
+                )
+            
+            return db.update_user(user_id, is_active=False)
     
     @staticmethod
     def is_user_active(user_id: int) -> bool:
         """Check if a user is active"""
-        if user_id not in db.users:
-            return False
-        return db.users[user_id].is_active
+        user = db.users.get(user_id)
+        return user is not None and user.is_active
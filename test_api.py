@@ -1,26 +1,179 @@
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import queue
+import threading
 import pytest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from fastapi import APIRouter, FastAPI
 from fastapi.testclient import TestClient
 from main import app
-from services.database import db
+from schemas.course import Course
+from schemas.enrollment import Enrollment, EnrollmentWithDetails
+from schemas.user import User
+from routes import debug, profiles
+from services.database import Database, db
+from services.durable_database import DurableDatabase
+from services.enrollment_export import EnrollmentExporter
+from services.enrollment_view import get_enrollment_view
+from services.json_cache import JsonCache
+from services.leaderboard import Leaderboard
+from services.metrics import UNMATCHED_ROUTE, request_metrics
+from services.scan_cost import accounted, scan_costs
+from services.profiling import PROFILE_HEADER, ProfiledRoute, ProfilingMiddleware, RequestProfiler
+from services.records import CourseRecord, EnrollmentRecord, UserRecord, to_model
+from services.course_service import CourseService
+from services.search_index import get_search_index, start_search_indexes, tokenize
+from services.user_import import UserImporter
+from services.user_service import UserService
+from services.sqlite_database import SQLiteDatabase
+from services.storage import EnrollmentFilter, StorageBackend
 
 client = TestClient(app)
 
+# Modules that import the global `db`; fixtures patch them to run against another backend
+SERVICE_MODULES = (
+    "user_service", "course_service", "enrollment_service", "user_import", "etags", "json_cache",
+    "enrollment_export", "enrollment_view",
+)
+
+
+def _allocate_user_ids(path):
+    """Allocate a batch of user IDs from a separate process"""
+    database = SQLiteDatabase(path, pool_size=1)
+    try:
+        return [database.allocate_user_id() for _ in range(50)]
+    finally:
+        database.close()
+
+
+@pytest.fixture(scope="session")
+def example_data():
+    """Load the example data once and checkpoint it, where the backend supports checkpoints"""
+    db.clear()
+    db._initialize_example_data()
+    if isinstance(db, Database):
+        db.checkpoint("example_data")
+        yield
+        db.release("example_data")
+    else:
+        yield
+
 
 @pytest.fixture(autouse=True)
-def reset_database():
+def reset_database(example_data):
     """Reset database before each test"""
-    # Clear all data
-    db.users.clear()
-    db.courses.clear()
-    db.enrollments.clear()
+    if isinstance(db, Database):
+        # Undo whatever the previous test wrote
+        db.restore("example_data")
+    else:
+        db.clear()
+        db._initialize_example_data()
+
+
+def _exercise_course_stats():
+    """Enroll, complete, deactivate and unenroll learners in course 1; return the stats response"""
+    user_ids = [
+        client.post("/users/", json={"name": f"Learner {i}", "email": f"learner{i}@example.com"}).json()["id"]
+        for i in range(3)
+    ]
+    enrollment_ids = [
+        client.post("/enrollments/", json={"user_id": user_id, "course_id": 1}).json()["id"]
+        for user_id in user_ids
+    ]
+    client.patch(f"/enrollments/{enrollment_ids[0]}/complete")
+    client.patch(f"/users/{user_ids[1]}/deactivate")
+    client.delete(f"/enrollments/{enrollment_ids[2]}")
+    return client.get("/courses/1/stats")
+
+
+def _exercise_top_courses():
+    """Build rankings over four courses, checking them through the API along the way"""
+    course_ids = [
+        client.post("/courses/", json={"title": f"Course {i}", "description": "Ranked"}).json()["id"]
+        for i in range(2, 5)
+    ]
+    user_ids = [
+        client.post("/users/", json={"name": f"Ranker {i}", "email": f"ranker{i}@example.com"}).json()["id"]
+        for i in range(2)
+    ]
+    for user_id in user_ids:
+        client.post("/enrollments/", json={"user_id": user_id, "course_id": course_ids[0]})
+    enrollment_id = client.post("/enrollments/", json={"user_id": user_ids[0], "course_id": course_ids[1]}).json()["id"]
+    client.patch(f"/enrollments/{enrollment_id}/complete")
     
-    # Reset counters
-    db._user_counter = 1
-    db._course_counter = 1
-    db._enrollment_counter = 1
+    def top(**params):
+        return [(course["course_id"], course["enrolled"], course["completed"]) for course in
+                client.get("/courses/top", params=params).json()]
     
-    # Reinitialize example data
-    db._initialize_example_data()
+    # Ties are broken by course ID; courses without enrollments are ranked too
+    assert top() == [(2, 2, 0), (1, 1, 0), (3, 1, 1), (4, 0, 0)]
+    assert top(n=2) == [(2, 2, 0), (1, 1, 0)]
+    assert top(by="completions", n=2) == [(3, 1, 1), (1, 1, 0)]
+    
+    client.patch("/courses/2/close")
+    client.delete("/courses/4")
+    client.patch(f"/enrollments/{enrollment_id}/complete", params={"completed": False})
+    assert top() == [(1, 1, 0), (3, 1, 0)]
+    assert top(by="completions") == [(1, 1, 0), (3, 1, 0)]
+    
+    client.put("/courses/2", json={"is_open": True})
+    assert top(n=1) == [(2, 2, 0)]
+
+
+def _exercise_enrollment_filters(database):
+    """Query enrollments with each filter through the API and check the backend against a full scan"""
+    bob = client.post("/users/", json={"name": "Bob", "email": "bob@example.com"}).json()["id"]
+    carol = client.post("/users/", json={"name": "Carol", "email": "carol@example.com"}).json()["id"]
+    course = client.post("/courses/", json={"title": "Rust", "description": "Systems"}).json()["id"]
+    
+    def enroll(user_id, course_id, enrolled_date):
+        response = client.post(
+            "/enrollments/", json={"user_id": user_id, "course_id": course_id, "enrolled_date": enrolled_date}
+        )
+        return response.json()["id"]
+    
+    bob_python = enroll(bob, 1, "2020-01-15")
+    bob_rust = enroll(bob, course, "2020-03-01")
+    carol_python = enroll(carol, 1, "2020-02-10")
+    client.patch(f"/enrollments/{bob_python}/complete")
+    
+    def find(**params):
+        response = client.get("/enrollments/", params=params)
+        assert response.status_code == 200
+        return [enrollment["id"] for enrollment in response.json()]
+    
+    assert find(course_id=1) == [1, bob_python, carol_python]
+    assert find(course_id=1, completed=False) == [1, carol_python]
+    assert find(completed=True) == [bob_python]
+    assert find(enrolled_from="2020-01-15", enrolled_to="2020-02-10") == [bob_python, carol_python]
+    assert find(enrolled_to="2020-02-01") == [bob_python]
+    assert find(user_id=bob) == [bob_python, bob_rust]
+    assert find(user_id=bob, enrolled_from="2020-02-01") == [bob_rust]
+    assert find(user_id=carol, course_id=course) == []
+    
+    # The cursor carries on with the same filters
+    response = client.get("/enrollments/", params={"course_id": 1, "limit": 2})
+    assert [e["id"] for e in response.json()] == [1, bob_python]
+    cursor = response.headers["X-Next-Cursor"]
+    assert find(course_id=1, limit=2, after=cursor) == [carol_python]
+    assert "X-Next-Cursor" not in client.get("/enrollments/", params={"course_id": 1, "limit": 3}).headers
+    
+    response = client.get("/enrollments/", params={"enrolled_from": "2020-03-01", "enrolled_to": "2020-01-01"})
+    assert response.status_code == 400
+    
+    for filters in (
+        EnrollmentFilter(course_id=1),
+        EnrollmentFilter(completed=False, enrolled_from=date(2020, 1, 1)),
+        EnrollmentFilter(user_id=bob, enrolled_to=date(2020, 12, 31)),
+        EnrollmentFilter(course_id=course, completed=False),
+    ):
+        for after_id in (None, bob_python):
+            assert database.find_enrollments_page(filters, after_id, 1) == \
+                StorageBackend.find_enrollments_page(database, filters, after_id, 1)
 
 
 class TestUserEndpoints:
@@ -51,6 +204,93 @@ class TestUserEndpoints:
         assert response.status_code == 400
         assert "Email already exists" in response.json()["detail"]
 
+    def test_import_users_csv(self):
+        """Test importing users from a CSV upload with row-level errors"""
+        body = (
+            "name,email,is_active\n"
+            "Bob,bob@example.com,true\n"
+            "Carol,carol@example.com,\n"
+            "Dup,bob@example.com,true\n"
+            "Alice Again,alice@example.com,true\n"
+            "Broken,not-an-email,true\n"
+            "Dan,dan@example.com,false\n"
+        )
+        response = client.post("/users/import", content=body, headers={"Content-Type": "text/csv"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["format"] == "csv"
+        assert data["rows"] == 6
+        assert data["created"] == 3
+        assert data["rejected"] == 3
+        assert [error["row"] for error in data["errors"]] == [4, 5, 6]
+        assert data["errors"][0]["error"] == "Email already exists"
+        assert data["errors"][2]["error"].startswith("email:")
+        
+        users = client.get("/users/").json()
+        assert [user["email"] for user in users[1:]] == ["bob@example.com", "carol@example.com", "dan@example.com"]
+        assert users[2]["is_active"] is True
+        assert users[3]["is_active"] is False
+
+    def test_import_users_ndjson_chunked(self):
+        """Test importing NDJSON split across arbitrary upload chunks"""
+        def upload():
+            yield b'{"name": "Bob", "email": "bob@exa'
+            yield b'mple.com"}\n{"name": "Carol", "email": "carol@example.com"}\n[1, 2]\n'
+            yield b'{"name": "Dan"'
+            yield b', "email": "dan@example.com"}'
+        
+        response = client.post("/users/import", params={"format": "ndjson"}, content=upload())
+        assert response.status_code == 200
+        data = response.json()
+        assert data["created"] == 3
+        assert data["errors"] == [{"row": 3, "error": "Row must be a JSON object"}]
+
+    def test_import_users_csv_quoted_newline(self):
+        """Test that a quoted CSV field may span lines and chunks"""
+        def upload():
+            yield b'name,email\n"Bob\nBuilder",bob@exa'
+            yield b'mple.com\n"Carol, \r\n""CJ""",carol@example.com\r\nDan,\xff@example.com\nBroken,"x\ny"\n'
+        
+        response = client.post("/users/import", params={"format": "csv"}, content=upload())
+        data = response.json()
+        assert data["rows"] == 4
+        assert data["created"] == 2
+        assert [error["row"] for error in data["errors"]] == [6, 7]
+        assert data["errors"][0]["error"] == "Row is not valid UTF-8"
+        users = client.get("/users/").json()
+        assert [user["name"] for user in users[1:]] == ["Bob\nBuilder", 'Carol, \r\n"CJ"']
+
+    def test_import_progress(self):
+        """Test that progress is published after every committed chunk and kept once done"""
+        importer = UserImporter("ndjson", chunk_size=2)
+        seen = []
+        
+        def upload():
+            for index in range(5):
+                progress = client.get(f"/users/import/{importer.id}").json()
+                seen.append((progress["status"], progress["created"]))
+                yield json.dumps({"name": f"User {index}", "email": f"user{index}@example.com"}).encode() + b"\n"
+        
+        result = importer.run(upload())
+        assert result.id == importer.id and result.created == 5 and result.chunks == 3
+        # Users are committed two at a time, and each commit is visible while the upload continues
+        assert seen == [("running", 0), ("running", 0), ("running", 2), ("running", 2), ("running", 4)]
+        progress = client.get(f"/users/import/{importer.id}").json()
+        assert (progress["status"], progress["rows"], progress["created"], progress["chunks"]) == ("done", 5, 5, 3)
+        assert client.get("/users/import").json()[0]["id"] == importer.id
+        assert client.get("/users/import/0").status_code == 404
+
+        response = client.post("/users/import", params={"format": "ndjson"}, content=b"\n" * (70 * 1024))
+        assert response.status_code == 200
+        response = client.post("/users/import", params={"format": "ndjson"}, content=b"x" * (70 * 1024))
+        assert response.status_code == 400
+        assert client.get("/users/import").json()[0]["status"] == "failed"
+
+    def test_import_users_unknown_format(self):
+        """Test that an upload without a recognised format is rejected"""
+        response = client.post("/users/import", content=b"x", headers={"Content-Type": "text/plain"})
+        assert response.status_code == 415
+
     def test_get_all_users(self):
         """Test getting all users"""
         response = client.get("/users/")
@@ -59,6 +299,48 @@ class TestUserEndpoints:
         assert len(data) == 1  # Only the example user
         assert data[0]["name"] == "Alice"
 
+    def test_get_all_users_paginated(self):
+        """Test walking the user list page by page with the cursor header"""
+        for i in range(4):
+            client.post("/users/", json={"name": f"User {i}", "email": f"user{i}@example.com"})
+        
+        response = client.get("/users/", params={"limit": 2})
+        assert [user["id"] for user in response.json()] == [1, 2]
+        cursor = response.headers["X-Next-Cursor"]
+        
+        response = client.get("/users/", params={"limit": 2, "after": cursor})
+        assert [user["id"] for user in response.json()] == [3, 4]
+        cursor = response.headers["X-Next-Cursor"]
+        
+        response = client.get("/users/", params={"limit": 2, "after": cursor})
+        assert [user["id"] for user in response.json()] == [5]
+        assert "X-Next-Cursor" not in response.headers
+
+    def test_cached_json_follows_updates(self):
+        """Test that list and item responses reflect changes after their JSON was cached"""
+        assert client.get("/users/").json()[0]["name"] == "Alice"
+        assert client.get("/users/1").json()["name"] == "Alice"
+        
+        client.put("/users/1", json={"name": "Alicia"})
+        assert client.get("/users/").json()[0]["name"] == "Alicia"
+        response = client.get("/users/1")
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == {
+            "id": 1, "name": "Alicia", "email": "alice@example.com", "is_active": True,
+            "created_at": db.users[1].created_at.isoformat()
+        }
+
+    def test_get_all_users_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        response = client.get("/users/", params={"after": "not-a-cursor"})
+        assert response.status_code == 400
+        assert "Invalid cursor" in response.json()["detail"]
+
+    def test_get_all_users_limit_bounded(self):
+        """Test that the page size cannot exceed the maximum"""
+        response = client.get("/users/", params={"limit": 100000})
+        assert response.status_code == 422
+
     def test_get_user(self):
         """Test getting a specific user"""
         response = client.get("/users/1")
@@ -67,12 +349,51 @@ class TestUserEndpoints:
         assert data["name"] == "Alice"
         assert data["email"] == "alice@example.com"
 
+    def test_records_convert_to_models(self):
+        """Test that unvalidated conversion gives the same models as validation"""
+        for model, record in ((User, db.users[1]), (Course, db.courses[1]), (Enrollment, db.enrollments[1])):
+            converted = to_model(record)
+            assert type(converted) is model
+            assert converted == model.model_validate(record)
+            assert converted.model_dump_json() == model.model_validate(record).model_dump_json()
+    
     def test_get_user_not_found(self):
         """Test getting a non-existent user"""
         response = client.get("/users/999")
         assert response.status_code == 404
         assert "User not found" in response.json()["detail"]
 
+    def test_get_deleted_user_with_old_etag(self):
+        """Test that a deleted user answers 404 to the tag it had, not 304"""
+        user_id = client.post("/users/", json={"name": "Gone", "email": "gone@example.com"}).json()["id"]
+        etag = client.get(f"/users/{user_id}").headers["ETag"]
+        assert client.get(f"/users/{user_id}", headers={"If-None-Match": etag}).status_code == 304
+        assert client.delete(f"/users/{user_id}").status_code == 204
+        assert client.get(f"/users/{user_id}", headers={"If-None-Match": etag}).status_code == 404
+        # The deleted ID keeps a version of its own, unlike IDs never tagged
+        assert db.get_version("users", user_id) > db.get_version("users", 999)
+
+    def test_get_unknown_user_with_foreign_etag(self):
+        """Test that an unknown ID answers 404 to another user's tag, or to any tag"""
+        etag = client.get("/users/1").headers["ETag"]
+        assert client.get("/users/999", headers={"If-None-Match": etag}).status_code == 404
+        assert client.get("/users/999", headers={"If-None-Match": "*"}).status_code == 404
+
+    def test_get_users_batch(self):
+        """Test getting many users in one request, in the requested order"""
+        client.post("/users/", json={"name": "Bob", "email": "bob@example.com"})
+        response = client.get("/users/batch", params={"ids": "2,999,1,2"})
+        assert response.status_code == 200
+        data = response.json()
+        assert [user["id"] for user in data["items"]] == [2, 1]
+        assert data["items"][0]["name"] == "Bob"
+        assert data["missing"] == [999]
+        
+        # Repeated parameters work too
+        assert [user["id"] for user in client.get("/users/batch?ids=1&ids=2").json()["items"]] == [1, 2]
+        assert client.get("/users/batch", params={"ids": "1,x"}).status_code == 400
+        assert client.get("/users/batch", params={"ids": ",".join(map(str, range(1, 1002)))}).status_code == 400
+
     def test_update_user(self):
         """Test updating a user"""
         update_data = {
@@ -86,6 +407,18 @@ class TestUserEndpoints:
         assert data["is_active"] is False
         assert data["email"] == "alice@example.com"  # Should remain unchanged
 
+    def test_update_user_email_reindexed(self):
+        """Test that a changed email is freed and the new one is taken"""
+        response = client.put("/users/1", json={"email": "alice@new.com"})
+        assert response.status_code == 200
+        
+        response = client.post("/users/", json={"name": "Bob", "email": "alice@example.com"})
+        assert response.status_code == 201
+        
+        response = client.post("/users/", json={"name": "Carol", "email": "alice@new.com"})
+        assert response.status_code == 400
+        assert "Email already exists" in response.json()["detail"]
+
     def test_deactivate_user(self):
         """Test deactivating a user"""
         response = client.patch("/users/1/deactivate")
@@ -93,6 +426,61 @@ class TestUserEndpoints:
         data = response.json()
         assert data["is_active"] is False
 
+    def test_search_users(self):
+        """Test prefix search over names and emails as users are added, renamed and deleted"""
+        def search(q, **params):
+            return [user["name"] for user in client.get("/users/search", params={"q": q, **params}).json()]
+        
+        assert search("ali") == ["Alice"]
+        grace_id = client.post("/users/", json={"name": "Grace Hopper", "email": "grace@navy.mil"}).json()["id"]
+        client.post("/users/", json={"name": "Alan Turing", "email": "alan@example.com"})
+        
+        assert search("gra") == ["Grace Hopper"]
+        assert search("HOP gr") == ["Grace Hopper"]
+        assert search("navy") == ["Grace Hopper"]
+        assert search("example") == ["Alice", "Alan Turing"]
+        assert search("example", limit=1) == ["Alice"]
+        assert search("grace turing") == []
+        assert search("@.") == []
+        
+        client.put(f"/users/{grace_id}", json={"name": "Grace Brewster"})
+        assert search("hopper") == []
+        assert search("brew") == ["Grace Brewster"]
+        client.delete(f"/users/{grace_id}")
+        assert search("grace") == []
+        assert client.get("/users/search").status_code == 422
+
+    @pytest.mark.parametrize("union_limit, check_limit", [(20_000, 2_000), (1, 1), (5, 2)])
+    def test_search_plans_agree(self, monkeypatch, union_limit, check_limit):
+        """Test that walking records, checking candidates and intersecting postings find the same users"""
+        monkeypatch.setattr("services.search_index.UNION_LIMIT", union_limit)
+        monkeypatch.setattr("services.search_index.CHECK_LIMIT", check_limit)
+        names = ["Grace Hopper", "Grace Lovelace", "Ada Lovelace", "Ada Hopper", "Alan Turing", "Hopper Grace"]
+        for i, name in enumerate(names * 3):
+            db.add_user(UserRecord(db.allocate_user_id(), name, f"user{i}@example.com", True, datetime.now()))
+        db.delete_user(3)
+
+        for query in ["a", "gr", "grace hop", "hopper lovelace", "lovelace ada", "ex user1", "zz", "ada ada"]:
+            for limit in (1, 4, 50):
+                expected = [
+                    user.id for user in sorted(db.users.values(), key=lambda user: user.id)
+                    if all(
+                        any(token.startswith(term) for token in tokenize(f"{user.name} {user.email}"))
+                        for term in tokenize(query)
+                    )
+                ][:limit]
+                assert [user.id for user in UserService.search_users(query, limit)] == expected, (query, limit)
+
+    def test_search_index_built_in_background(self, monkeypatch):
+        """Test that startup builds the search indexes so searches never read the whole collection"""
+        database = Database()
+        start_search_indexes(database)
+        for thread in threading.enumerate():
+            if thread.name.startswith("search-index-"):
+                thread.join()
+        monkeypatch.setattr(database, "get_users_page", None)
+        assert [user.name for user in get_search_index(database, "users").search("ali", 10)] == ["Alice"]
+
     def test_delete_user(self):
         """Test deleting a user"""
         response = client.delete("/users/1")
@@ -130,6 +518,74 @@ class TestCourseEndpoints:
         assert len(data) == 1  # Only the example course
         assert data[0]["title"] == "Python Basics"
 
+    def test_get_all_courses_not_modified(self):
+        """Test that an unchanged course list answers 304 to a matching If-None-Match"""
+        etag = client.get("/courses/").headers["ETag"]
+        response = client.get("/courses/", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+        
+        client.patch("/courses/1/close")
+        response = client.get("/courses/", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert response.json()[0]["is_open"] is False
+
+    def test_search_courses(self):
+        """Test prefix search over course titles and descriptions"""
+        def search(q, **params):
+            return [course["id"] for course in client.get("/courses/search", params={"q": q, **params}).json()]
+        
+        course_id = client.post(
+            "/courses/", json={"title": "Advanced Python", "description": "Decorators and generators"}
+        ).json()["id"]
+        assert search("pyth") == [1, course_id]
+        assert search("pyth", limit=1) == [1]
+        assert search("python adv") == [course_id]
+        assert search("decor") == [course_id]
+        
+        client.put(f"/courses/{course_id}", json={"title": "Advanced Rust"})
+        assert search("pyth") == [1]
+        client.delete(f"/courses/{course_id}")
+        assert search("rust") == []
+
+    def test_get_course_stats(self):
+        """Test per-course counters through enroll, complete, deactivate and delete"""
+        response = _exercise_course_stats()
+        assert response.status_code == 200
+        # Alice (active), learner 0 (completed), learner 1 (deactivated)
+        assert response.json() == {
+            "course_id": 1, "enrolled": 3, "completed": 1, "active_learners": 1, "completion_rate": 1 / 3
+        }
+        assert db.get_course_stats(1) == StorageBackend.get_course_stats(db, 1)
+        
+        client.patch("/enrollments/1/complete", params={"completed": True})
+        client.patch("/users/3/deactivate")
+        assert client.get("/courses/1/stats").json()["active_learners"] == 0
+        assert client.get("/courses/999/stats").status_code == 404
+
+    def test_get_top_courses(self):
+        """Test that rankings follow enrollments, completions, closing and deletion"""
+        _exercise_top_courses()
+        assert db.get_top_courses("enrollments", 10) == StorageBackend.get_top_courses(db, "enrollments", 10)
+        assert client.get("/courses/top", params={"by": "title"}).status_code == 422
+        assert client.get("/courses/top", params={"n": 0}).status_code == 422
+
+    def test_leaderboard_ties(self):
+        """Test that a large tied bucket ranks by lowest ID and stays ordered as items move"""
+        leaderboard = Leaderboard()
+        for item_id in reversed(range(1, 10_001)):
+            leaderboard.set(item_id, 0)
+        leaderboard.set(5, 2)
+        leaderboard.set(7, 1)
+        leaderboard.set(3, 1)
+        leaderboard.remove(1)
+        assert leaderboard.top(5) == [(5, 2), (3, 1), (7, 1), (2, 0), (4, 0)]
+        leaderboard.set(5, 0)
+        assert leaderboard.top(4) == [(3, 1), (7, 1), (2, 0), (4, 0)]
+        assert leaderboard.top(3)[-1] == (2, 0) and len(leaderboard) == 9_999
+
     def test_get_course(self):
         """Test getting a specific course"""
         response = client.get("/courses/1")
@@ -144,6 +600,14 @@ class TestCourseEndpoints:
         assert response.status_code == 404
         assert "Course not found" in response.json()["detail"]
 
+    def test_get_courses_batch(self):
+        """Test getting many courses in one request"""
+        response = client.get("/courses/batch", params={"ids": "1,5"})
+        assert response.status_code == 200
+        data = response.json()
+        assert [course["title"] for course in data["items"]] == ["Python Basics"]
+        assert data["missing"] == [5]
+
     def test_update_course(self):
         """Test updating a course"""
         update_data = {
@@ -270,6 +734,34 @@ class TestEnrollmentEndpoints:
         assert response.status_code == 400
         assert "User is already enrolled in this course" in response.json()["detail"]
 
+    def test_bulk_enroll(self):
+        """Test bulk enrollment with per-item results"""
+        bob_id = client.post("/users/", json={"name": "Bob", "email": "bob@example.com"}).json()["id"]
+        carol_id = client.post("/users/", json={"name": "Carol", "email": "carol@example.com"}).json()["id"]
+        client.patch(f"/users/{carol_id}/deactivate")
+        
+        items = [
+            {"user_id": bob_id, "course_id": 1},
+            {"user_id": bob_id, "course_id": 1},
+            {"user_id": 1, "course_id": 1},
+            {"user_id": carol_id, "course_id": 1},
+            {"user_id": bob_id, "course_id": 999},
+        ]
+        response = client.post("/enrollments/bulk", json=items)
+        assert response.status_code == 200
+        results = response.json()
+        assert [result["index"] for result in results] == [0, 1, 2, 3, 4]
+        assert results[0]["status"] == "created"
+        assert results[0]["enrollment"]["user_id"] == bob_id
+        assert [result["status"] for result in results[1:]] == ["rejected"] * 4
+        assert results[1]["reason"] == "User is already enrolled in this course"
+        assert results[2]["reason"] == "User is already enrolled in this course"
+        assert results[3]["reason"] == "User not found or not active"
+        assert results[4]["reason"] == "Course not found or not open for enrollment"
+        
+        response = client.get("/enrollments/course/1")
+        assert [enrollment["user_id"] for enrollment in response.json()] == [1, bob_id]
+
     def test_get_all_enrollments(self):
         """Test getting all enrollments"""
         response = client.get("/enrollments/")
@@ -279,6 +771,90 @@ class TestEnrollmentEndpoints:
         assert data[0]["user_id"] == 1
         assert data[0]["course_id"] == 1
 
+    def test_get_all_enrollments_skips_deleted(self):
+        """Test that a page resumes correctly after the cursor's enrollment is deleted"""
+        for i in range(3):
+            user_id = client.post("/users/", json={"name": f"User {i}", "email": f"user{i}@example.com"}).json()["id"]
+            client.post("/enrollments/", json={"user_id": user_id, "course_id": 1})
+        
+        response = client.get("/enrollments/", params={"limit": 2})
+        cursor = response.headers["X-Next-Cursor"]
+        client.delete("/enrollments/2")
+        
+        response = client.get("/enrollments/", params={"after": cursor})
+        assert [enrollment["id"] for enrollment in response.json()] == [3, 4]
+
+    def test_get_enrollment_summary(self):
+        """Test per-course enrollment and completion counts within a date range"""
+        user_id = client.post("/users/", json={"name": "Bob", "email": "bob@example.com"}).json()["id"]
+        client.post("/enrollments/", json={"user_id": user_id, "course_id": 1, "enrolled_date": "2020-01-15"})
+        client.patch("/enrollments/1/complete")
+        
+        data = client.get("/enrollments/summary").json()
+        assert data["enrolled"] == 2
+        assert data["completed"] == 1
+        assert data["courses"] == [{"course_id": 1, "enrolled": 2, "completed": 1}]
+        
+        data = client.get("/enrollments/summary", params={"enrolled_to": "2020-12-31"}).json()
+        assert data["enrolled"] == 1
+        assert data["completed"] == 0
+        
+        response = client.get("/enrollments/summary", params={"enrolled_from": "2021-01-01", "enrolled_to": "2020-01-01"})
+        assert response.status_code == 400
+
+    def test_filter_enrollments(self):
+        """Test filtering enrollments by course, user, completion and date range"""
+        _exercise_enrollment_filters(db)
+        # Changing a date moves the enrollment within the date index
+        db.update_enrollment(1, enrolled_date=date(2019, 6, 1))
+        assert [e["id"] for e in client.get("/enrollments/", params={"enrolled_to": "2019-12-31"}).json()] == [1]
+
+    def test_export_enrollments(self):
+        """Test streaming the enrollment export as NDJSON and CSV with filters"""
+        course_id = client.post("/courses/", json={"title": "Go", "description": "Learn Go"}).json()["id"]
+        for i in range(3):
+            user_id = client.post("/users/", json={"name": f"User {i}", "email": f"user{i}@example.com"}).json()["id"]
+            client.post("/enrollments/", json={"user_id": user_id, "course_id": course_id})
+        client.patch("/enrollments/3/complete")
+        
+        response = client.get("/enrollments/export")
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["id"] for row in rows] == [1, 2, 3, 4]
+        assert rows[1]["user_name"] == "User 0"
+        assert rows[1]["course_title"] == "Go"
+        assert b"".join(EnrollmentExporter("ndjson", batch_size=3)) == response.content
+        
+        response = client.get("/enrollments/export", params={"course_id": course_id, "completed": False})
+        assert [json.loads(line)["id"] for line in response.text.splitlines()] == [2, 4]
+        
+        response = client.get("/enrollments/export", params={"format": "csv", "user_id": 1})
+        assert response.headers["content-type"].startswith("text/csv")
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == 1
+        assert rows[0]["user_name"] == "Alice"
+        assert rows[0]["course_title"] == "Python Basics"
+        assert rows[0]["completed"] == "false"
+
+    def test_export_joins_each_batch_once(self, monkeypatch):
+        """Test that the export loads each batch's users and courses in one lookup and fills every field by name"""
+        for i in range(3):
+            user_id = client.post("/users/", json={"name": f"User {i}", "email": f"user{i}@example.com"}).json()["id"]
+            client.post("/enrollments/", json={"user_id": user_id, "course_id": 1})
+        lookups = []
+        get_many = db.get_many
+        monkeypatch.setattr(db, "get_many", lambda collection, ids: lookups.append(collection) or get_many(collection, ids))
+
+        lines = b"".join(EnrollmentExporter("ndjson", batch_size=2)).splitlines()
+        assert lookups == ["users", "courses"] * 2
+        rows = [EnrollmentWithDetails.model_validate_json(line) for line in lines]
+        enrollment = db.enrollments[4]
+        assert rows[3].model_dump() == {
+            "id": 4, "user_id": enrollment.user_id, "course_id": 1, "enrolled_date": enrollment.enrolled_date,
+            "completed": False, "created_at": enrollment.created_at, "user_name": "User 2",
+            "course_title": "Python Basics"
+        }
+
     def test_get_enrollment(self):
         """Test getting a specific enrollment"""
         response = client.get("/enrollments/1")
@@ -305,6 +881,25 @@ class TestEnrollmentEndpoints:
         assert data[0]["user_name"] == "Alice"
         assert data[0]["course_title"] == "Python Basics"
 
+    def test_get_user_enrollments_not_modified(self):
+        """Test that a user's enrollments are revalidated by ETag and invalidated by related changes"""
+        etag = client.get("/enrollments/user/1").headers["ETag"]
+        assert client.get("/enrollments/user/1", headers={"If-None-Match": etag}).status_code == 304
+        
+        # Another user's profile does not affect this response
+        bob_id = client.post("/users/", json={"name": "Bob", "email": "bob@example.com"}).json()["id"]
+        client.put(f"/users/{bob_id}", json={"name": "Robert"})
+        assert client.get("/enrollments/user/1", headers={"If-None-Match": etag}).status_code == 304
+        
+        client.put("/courses/1", json={"title": "Python Fundamentals"})
+        response = client.get("/enrollments/user/1", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()[0]["course_title"] == "Python Fundamentals"
+        
+        etag = response.headers["ETag"]
+        client.patch("/enrollments/1/complete")
+        assert client.get("/enrollments/user/1", headers={"If-None-Match": etag}).status_code == 200
+
     def test_get_course_enrollments(self):
         """Test getting enrollments for a specific course"""
         response = client.get("/enrollments/course/1")
@@ -315,6 +910,43 @@ class TestEnrollmentEndpoints:
         assert data[0]["user_name"] == "Alice"
         assert data[0]["course_title"] == "Python Basics"
 
+    def test_enrollment_details_loaded_once(self, monkeypatch):
+        """Test that each user and course of an enrollment list is fetched once, in one batch"""
+        # Start from an empty enrollment view; rows of the example data may be kept from earlier tests
+        get_enrollment_view(db).reset()
+        for i in range(3):
+            user_id = client.post("/users/", json={"name": f"Batched {i}", "email": f"batched{i}@example.com"}).json()["id"]
+            client.post("/enrollments/", json={"user_id": user_id, "course_id": 1})
+        
+        lookups = []
+        get_many = db.get_many
+        monkeypatch.setattr(db, "get_many", lambda collection, ids: lookups.append((collection, ids)) or get_many(collection, ids))
+        data = client.get("/enrollments/course/1").json()
+        assert [row["user_name"] for row in data] == ["Alice", "Batched 0", "Batched 1", "Batched 2"]
+        assert lookups == [("enrollments", [1, 2, 3, 4]), ("users", [1, 2, 3, 4]), ("courses", [1])]
+        
+        lookups.clear()
+        client.get("/enrollments/user/1")
+        assert lookups == []
+    
+    def test_enrollment_details_view(self):
+        """Test that materialized enrollment rows follow renames, retitles, enrollments and unenrollments"""
+        assert client.get("/enrollments/course/1").json()[0]["user_name"] == "Alice"
+        
+        client.put("/users/1", json={"name": "Alice Renamed"})
+        client.put("/courses/1", json={"title": "Retitled"})
+        data = client.get("/enrollments/user/1").json()
+        assert [(row["user_name"], row["course_title"]) for row in data] == [("Alice Renamed", "Retitled")]
+        
+        user_id = client.post("/users/", json={"name": "Late", "email": "late@example.com"}).json()["id"]
+        enrollment_id = client.post("/enrollments/", json={"user_id": user_id, "course_id": 1}).json()["id"]
+        data = client.get("/enrollments/course/1").json()
+        assert [row["user_name"] for row in data] == ["Alice Renamed", "Late"]
+        assert {row["course_title"] for row in data} == {"Retitled"}
+        
+        client.delete(f"/enrollments/{enrollment_id}")
+        assert [row["id"] for row in client.get("/enrollments/course/1").json()] == [1]
+
     def test_update_enrollment(self):
         """Test updating an enrollment"""
         update_data = {
@@ -330,6 +962,451 @@ class TestEnrollmentEndpoints:
         response = client.delete("/enrollments/1")
         assert response.status_code == 204
 
+    def test_delete_enrollment_updates_indexes(self):
+        """Test that a deleted enrollment no longer blocks deletes or re-enrollment"""
+        client.delete("/enrollments/1")
+        
+        response = client.get("/enrollments/user/1")
+        assert response.json() == []
+        
+        response = client.post("/enrollments/", json={"user_id": 1, "course_id": 1})
+        assert response.status_code == 201
+        
+        client.delete(f"/enrollments/{response.json()['id']}")
+        assert client.delete("/users/1").status_code == 204
+        assert client.delete("/courses/1").status_code == 204
+
+
+class TestConcurrency:
+    def test_concurrent_duplicate_email(self):
+        """Test that racing creates with one email produce exactly one user"""
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(
+                lambda i: client.post("/users/", json={"name": f"Racer {i}", "email": "racer@example.com"}),
+                range(16)
+            ))
+        assert sorted(response.status_code for response in responses) == [201] + [400] * 15
+        assert db.get_user_id_by_email("racer@example.com") is not None
+
+    def test_concurrent_enrollments_get_unique_ids(self):
+        """Test that enrollments created from many threads get distinct IDs"""
+        user_ids = [
+            client.post("/users/", json={"name": f"User {i}", "email": f"user{i}@example.com"}).json()["id"]
+            for i in range(40)
+        ]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(
+                lambda user_id: client.post("/enrollments/", json={"user_id": user_id, "course_id": 1}),
+                user_ids
+            ))
+        ids = [response.json()["id"] for response in responses]
+        assert all(response.status_code == 201 for response in responses)
+        assert len(set(ids)) == len(ids)
+        assert len(db.get_course_enrollment_ids(1)) == 41
+
+
+class TestSQLiteBackend:
+    @pytest.fixture
+    def sqlite_db(self, tmp_path, monkeypatch):
+        """Run the services against a SQLite database instead of the in-memory one"""
+        database = SQLiteDatabase(str(tmp_path / "edutrack.db"), pool_size=4)
+        for module in SERVICE_MODULES:
+            monkeypatch.setattr(f"services.{module}.db", database)
+        yield database
+        database.close()
+
+    def test_filter_enrollments(self, sqlite_db):
+        """Test the filtered enrollment query on SQLite"""
+        _exercise_enrollment_filters(sqlite_db)
+
+    def test_crud_through_services(self, sqlite_db):
+        """Test the user, course and enrollment endpoints on the SQLite backend"""
+        assert client.get("/users/1").json()["name"] == "Alice"
+        
+        user_id = client.post("/users/", json={"name": "Bob", "email": "bob@example.com"}).json()["id"]
+        assert user_id == 2
+        response = client.post("/users/", json={"name": "Bob", "email": "bob@example.com"})
+        assert response.status_code == 400
+        
+        response = client.post("/enrollments/", json={"user_id": user_id, "course_id": 1})
+        assert response.status_code == 201
+        response = client.post("/enrollments/", json={"user_id": user_id, "course_id": 1})
+        assert "User is already enrolled in this course" in response.json()["detail"]
+        
+        client.patch("/enrollments/2/complete")
+        enrollments = client.get("/enrollments/course/1").json()
+        assert [(e["user_name"], e["completed"]) for e in enrollments] == [("Alice", False), ("Bob", True)]
+        
+        response = client.get("/users/", params={"limit": 1})
+        cursor = response.headers["X-Next-Cursor"]
+        assert [user["id"] for user in client.get("/users/", params={"after": cursor}).json()] == [2]
+        
+        assert client.delete("/courses/1").status_code == 400
+
+    def test_get_many(self, sqlite_db, monkeypatch):
+        """Test batched lookups by ID, split into several IN queries"""
+        monkeypatch.setattr("services.sqlite_database.MAX_IN_IDS", 2)
+        for i in range(3):
+            client.post("/users/", json={"name": f"Batched {i}", "email": f"batched{i}@example.com"})
+        users = sqlite_db.get_many("users", [4, 99, 1, 2, 3])
+        assert sorted(users) == [1, 2, 3, 4]
+        assert users[4].name == "Batched 2"
+        assert client.get("/users/batch", params={"ids": "3,1,7"}).json()["missing"] == [7]
+
+    def test_enrollment_details_view(self, sqlite_db):
+        """Test that materialized enrollment rows follow renames on SQLite"""
+        assert client.get("/enrollments/user/1").json()[0]["course_title"] == "Python Basics"
+        client.put("/courses/1", json={"title": "Retitled"})
+        assert client.get("/enrollments/user/1").json()[0]["course_title"] == "Retitled"
+    
+    def test_course_stats_triggers(self, sqlite_db, tmp_path):
+        """Test that the trigger-maintained counters match a scan, including after a backfill"""
+        assert _exercise_course_stats().json()["active_learners"] == 1
+        assert sqlite_db.get_course_stats(1) == StorageBackend.get_course_stats(sqlite_db, 1) == (3, 1, 1)
+        
+        with sqlite_db._transaction() as connection:
+            connection.execute("DROP TABLE course_stats")
+        reopened = SQLiteDatabase(str(tmp_path / "edutrack.db"), pool_size=1)
+        try:
+            assert reopened.get_course_stats(1) == (3, 1, 1)
+        finally:
+            reopened.close()
+
+    def test_search(self, sqlite_db):
+        """Test that the search index is built from and kept in step with the SQLite tables"""
+        assert [user["id"] for user in client.get("/users/search", params={"q": "alice"}).json()] == [1]
+        client.put("/users/1", json={"name": "Alicia"})
+        assert client.get("/users/search", params={"q": "alicia"}).json()[0]["name"] == "Alicia"
+        assert [course["id"] for course in client.get("/courses/search", params={"q": "basics"}).json()] == [1]
+
+    def test_top_courses_index(self, sqlite_db):
+        """Test that the indexed ranking matches the generic scan"""
+        _exercise_top_courses()
+        for by in ("enrollments", "completions"):
+            assert sqlite_db.get_top_courses(by, 10) == StorageBackend.get_top_courses(sqlite_db, by, 10)
+
+    def test_data_survives_reopen(self, sqlite_db, tmp_path):
+        """Test that a second connection to the same file sees committed data"""
+        client.put("/users/1", json={"email": "alice@new.com"})
+        
+        reopened = SQLiteDatabase(str(tmp_path / "edutrack.db"), pool_size=1)
+        try:
+            assert reopened.users[1].email == "alice@new.com"
+            assert reopened.get_user_id_by_email("alice@new.com") == 1
+            assert reopened.get_user_id_by_email("alice@example.com") is None
+            assert reopened.get_next_user_id() == 2
+            assert len(reopened.enrollments) == 1
+        finally:
+            reopened.close()
+
+    def test_change_feed_between_instances(self, sqlite_db, tmp_path):
+        """Test that a second instance on the same file hears about the first one's writes"""
+        other = SQLiteDatabase(str(tmp_path / "edutrack.db"), pool_size=1, change_poll_interval=0.01)
+        changes = queue.Queue()
+        other.add_change_listener(lambda collection, record_id: changes.put((collection, record_id)))
+        try:
+            client.post("/courses/", json={"title": "Go", "description": "Learn Go"})
+            assert changes.get(timeout=5) == ("courses", 2)
+            client.patch("/users/1/deactivate")
+            assert changes.get(timeout=5) == ("users", 1)
+        finally:
+            other.close()
+    
+    def test_versions_shared_between_instances(self, sqlite_db, tmp_path):
+        """Test that instances on the same file issue the same ETags and see new versions at once"""
+        other = SQLiteDatabase(str(tmp_path / "edutrack.db"), pool_size=1)
+        try:
+            assert other.version_epoch == sqlite_db.version_epoch
+            etag = client.get("/users/1").headers["ETag"]
+            courses_version = other.get_version("courses")
+
+            client.put("/users/1", json={"name": "Alice Updated"})
+            # No change feed runs, so the new versions come from the database itself
+            assert client.get("/users/1", headers={"If-None-Match": etag}).status_code == 200
+            assert other.get_version("users", 1) == sqlite_db.get_version("users", 1) > 0
+            assert other.get_versions("users", [1, 2]) == {
+                1: other.get_version("users", 1), 2: other.get_version("users", 2)
+            }
+            assert other.get_version("courses") == courses_version
+
+            other.delete_enrollment(1)
+            other.delete_user(1)
+            # The deleted user keeps a version newer than that of untouched users
+            assert sqlite_db.get_version("users", 1) == other.get_version("users", 1) > sqlite_db.get_version("users", 2)
+            assert sqlite_db.get_version("users") == other.get_version("users") > sqlite_db.get_version("courses")
+        finally:
+            other.close()
+
+    def test_view_rows_checked_against_shared_versions(self, sqlite_db, tmp_path):
+        """Test that view rows changed by another instance are rebuilt before their notification arrives"""
+        other = SQLiteDatabase(str(tmp_path / "edutrack.db"), pool_size=1)
+        try:
+            response = client.get("/enrollments/user/1")
+            assert {row["user_name"] for row in response.json()} == {"Alice"}
+            etag = response.headers["ETag"]
+
+            # No change feed runs, so the view hears of neither change
+            other.update_user(1, name="Alice Renamed")
+            other.update_enrollment(1, completed=True)
+            response = client.get("/enrollments/user/1", headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert {row["user_name"] for row in response.json()} == {"Alice Renamed"}
+            assert next(row for row in response.json() if row["id"] == 1)["completed"] is True
+        finally:
+            other.close()
+
+    def test_ids_unique_across_processes(self, sqlite_db, tmp_path):
+        """Test that processes sharing the file never allocate the same ID"""
+        path = str(tmp_path / "edutrack.db")
+        with multiprocessing.get_context("spawn").Pool(3) as pool:
+            batches = pool.map(_allocate_user_ids, [path] * 3)
+        ids = [user_id for batch in batches for user_id in batch]
+        assert len(set(ids)) == len(ids) == 150
+
+
+class TestColumnarEnrollments:
+    @pytest.fixture
+    def columnar_db(self, monkeypatch):
+        """Run the services against an in-memory database with columnar enrollments"""
+        database = Database(columnar_enrollments=True)
+        for module in SERVICE_MODULES:
+            monkeypatch.setattr(f"services.{module}.db", database)
+        return database
+
+    def test_json_cache_with_racing_update(self):
+        """Test that a copy read before an update is never cached as the updated version"""
+        database = Database(columnar_enrollments=True)
+        cache = JsonCache(database)
+        
+        # The store returns a copy; the update commits after it is read
+        version = database.get_version("enrollments", 1)
+        enrollment = database.enrollments[1]
+        database.update_enrollment(1, completed=True)
+        assert json.loads(cache.encode("enrollments", enrollment, version))["completed"] is False
+        current = database.get_version("enrollments", 1)
+        assert json.loads(cache.encode("enrollments", database.enrollments[1], current))["completed"] is True
+        
+        # The same for a page: its stale copy is served once but not cached
+        as_of = database.get_version("enrollments")
+        page = database.get_enrollments_page(None, 10)
+        database.update_enrollment(1, completed=False)
+        assert json.loads(cache.encode_list("enrollments", page.items, as_of))[0]["completed"] is True
+        as_of = database.get_version("enrollments")
+        page = database.get_enrollments_page(None, 10)
+        assert json.loads(cache.encode_list("enrollments", page.items, as_of))[0]["completed"] is False
+
+    def test_filter_enrollments(self, columnar_db):
+        """Test the date index over enrollments stored as columns"""
+        _exercise_enrollment_filters(columnar_db)
+
+    def test_enrollment_lifecycle(self, columnar_db):
+        """Test enrolling, completing, listing and deleting on the columnar store"""
+        user_id = client.post("/users/", json={"name": "Bob", "email": "bob@example.com"}).json()["id"]
+        response = client.post("/enrollments/", json={"user_id": user_id, "course_id": 1, "enrolled_date": "2020-01-15"})
+        enrollment_id = response.json()["id"]
+        
+        response = client.patch(f"/enrollments/{enrollment_id}/complete")
+        assert response.json()["completed"] is True
+        assert columnar_db.enrollments[enrollment_id].completed is True
+        
+        enrollments = client.get("/enrollments/course/1").json()
+        assert [(e["user_name"], e["enrolled_date"], e["completed"]) for e in enrollments] == [
+            ("Alice", enrollments[0]["enrolled_date"], False),
+            ("Bob", "2020-01-15", True),
+        ]
+        
+        summary = client.get("/enrollments/summary", params={"enrolled_to": "2020-12-31"}).json()
+        assert summary["courses"] == [{"course_id": 1, "enrolled": 1, "completed": 1}]
+        
+        assert client.delete("/enrollments/1").status_code == 204
+        assert [e["id"] for e in client.get("/enrollments/").json()] == [enrollment_id]
+        assert 1 not in columnar_db.enrollments
+        assert len(columnar_db.enrollments) == 1
+
+    def test_course_stats(self, columnar_db):
+        """Test that course counters stay correct when enrollments are stored as columns"""
+        _exercise_course_stats()
+        assert columnar_db.get_course_stats(1) == StorageBackend.get_course_stats(columnar_db, 1) == (3, 1, 1)
+
+    def test_deleted_slots_are_reused(self, columnar_db):
+        """Test that a freed slot is reused without disturbing other rows"""
+        store = columnar_db.enrollments
+        first = store[1]
+        del store[1]
+        first.id = 5
+        store[5] = first
+        assert len(store._ids) == 1
+        assert list(store) == [5]
+        assert store[5].created_at == first.created_at
+
+
+class TestDurableDatabase:
+    def test_restart_replays_log(self, tmp_path):
+        """Test that writes survive a restart through the write-ahead log alone"""
+        database = DurableDatabase(str(tmp_path), fsync_interval=0, snapshot_interval=0)
+        database.update_user(1, name="Alice Updated", email="alice@new.com")
+        database.update_enrollment(1, completed=True)
+        database.delete_enrollment(1)
+        database.close()
+        
+        restarted = DurableDatabase(str(tmp_path), fsync_interval=0, snapshot_interval=0)
+        assert restarted.users[1].name == "Alice Updated"
+        assert restarted.get_user_id_by_email("alice@new.com") == 1
+        assert len(restarted.enrollments) == 0
+        assert not restarted.user_has_enrollments(1)
+        assert restarted.get_next_user_id() == 2
+        restarted.close()
+
+    def test_restart_from_snapshot_and_log_tail(self, tmp_path):
+        """Test that a snapshot truncates the log and the tail is replayed on top of it"""
+        database = DurableDatabase(str(tmp_path), fsync_interval=0, snapshot_interval=0)
+        database.update_course(1, title="Python Basics Updated")
+        database.snapshot()
+        assert sorted(path.name for path in tmp_path.glob("wal-*.log")) == ["wal-00000002.log"]
+        
+        database.update_enrollment(1, completed=True)
+        database.close()
+        
+        restarted = DurableDatabase(str(tmp_path), fsync_interval=0, snapshot_interval=0)
+        assert restarted.courses[1].title == "Python Basics Updated"
+        assert restarted.enrollments[1].completed is True
+        assert restarted.get_enrollment_id(1, 1) == 1
+        assert restarted.get_next_enrollment_id() == 2
+        restarted.close()
+
+    def test_restart_restores_records_exactly(self, tmp_path):
+        """Test that records come back from the log and from a snapshot equal to those stored"""
+        database = DurableDatabase(str(tmp_path), fsync_interval=0, snapshot_interval=0)
+        stored = (database.users[1], database.courses[1], database.enrollments[1])
+        database.close()
+        
+        for take_snapshot in (False, True):
+            restarted = DurableDatabase(str(tmp_path), fsync_interval=0, snapshot_interval=0)
+            assert (restarted.users[1], restarted.courses[1], restarted.enrollments[1]) == stored
+            if take_snapshot:
+                restarted.snapshot()
+            restarted.close()
+
+    def test_snapshot_loop_survives_errors(self, tmp_path, monkeypatch, caplog):
+        """Test that a failed snapshot of any kind is logged and the loop carries on"""
+        database = DurableDatabase(str(tmp_path), fsync_interval=0, snapshot_interval=0)
+        attempts = []
+
+        def failing_snapshot():
+            attempts.append(1)
+            if len(attempts) == 2:
+                database._stopped.set()
+            raise RuntimeError("dictionary changed size during iteration")
+
+        monkeypatch.setattr(database, "snapshot", failing_snapshot)
+        database._snapshot_loop(0.001)
+        assert len(attempts) == 2
+        assert "Snapshot failed" in caplog.text
+        database.close()
+
+    def test_torn_log_tail_is_ignored(self, tmp_path):
+        """Test that a partially written last record does not prevent startup"""
+        database = DurableDatabase(str(tmp_path), fsync_interval=0, snapshot_interval=0)
+        database.update_user(1, name="Alice Updated")
+        database.close()
+        with open(tmp_path / "wal-00000001.log", "ab") as segment:
+            segment.write(b'["u","users",1,{"name":"Tor')
+        
+        restarted = DurableDatabase(str(tmp_path), fsync_interval=0, snapshot_interval=0)
+        assert restarted.users[1].name == "Alice Updated"
+        restarted.update_user(1, name="Alice Again")
+        restarted.close()
+        
+        restarted = DurableDatabase(str(tmp_path), fsync_interval=0, snapshot_interval=0)
+        assert restarted.users[1].name == "Alice Again"
+        restarted.close()
+
+
+class TestCheckpoints:
+    def test_restore_resets_tags_of_reused_ids(self):
+        """Test that a record given an ID again after a restore does not match the old record's ETag"""
+        db.checkpoint("reuse")
+        user_id = client.post("/users/", json={"name": "First", "email": "first@example.com"}).json()["id"]
+        etag = client.get(f"/users/{user_id}").headers["ETag"]
+        db.restore("reuse")
+        db.release("reuse")
+        
+        assert client.post("/users/", json={"name": "Second", "email": "second@example.com"}).json()["id"] == user_id
+        response = client.get(f"/users/{user_id}", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["name"] == "Second"
+    
+    @pytest.mark.parametrize("columnar", [False, True])
+    def test_restore_undoes_writes(self, columnar):
+        """Test that restoring a checkpoint undoes writes, clears and ID allocations, indexes included"""
+        database = Database(columnar_enrollments=columnar)
+        database.checkpoint("start")
+        user = UserRecord(database.allocate_user_id(), "Bo", "bo@example.com", True, datetime.now())
+        database.add_user(user)
+        database.add_enrollment(
+            EnrollmentRecord(database.allocate_enrollment_id(), user.id, 1, date.today(), False, datetime.now())
+        )
+        database.update_user(1, name="Alice Updated", email="alice@new.com", is_active=False)
+        database.update_course(1, is_open=False)
+        database.update_enrollment(1, completed=True)
+        database.checkpoint("later")
+        database.delete_enrollment(1)
+        database.clear()
+        
+        database.restore("start")
+        assert sorted(database.users) == [1] and database.users[1].name == "Alice"
+        assert database.get_user_id_by_email("alice@example.com") == 1
+        assert database.get_user_id_by_email("alice@new.com") is None
+        assert database.get_course_enrollment_ids(1) == [1]
+        assert database.get_course_stats(1) == (1, 0, 1)
+        assert database.get_top_courses("enrollments", 5) == [(1, 1)]
+        assert database.enrollments[1].completed is False
+        assert database.get_next_user_id() == 2
+        
+        # The checkpoint can be restored again; later ones are gone
+        database.add_course(CourseRecord(database.allocate_course_id(), "Rust", "Learn Rust", True, datetime.now()))
+        database.restore("start")
+        assert sorted(database.courses) == [1]
+        with pytest.raises(KeyError):
+            database.restore("later")
+        database.release("start")
+        assert database._undo_log is None
+    
+    def test_atomic_rolls_back_on_error(self):
+        """Test that an atomic block that raises leaves no trace, while an inner block rolls back alone"""
+        database = Database()
+        with pytest.raises(RuntimeError):
+            with database.atomic("users", "enrollments"):
+                database.update_user(1, is_active=False)
+                with pytest.raises(ValueError):
+                    with database.atomic("courses"):
+                        database.update_course(1, title="Inner")
+                        raise ValueError
+                assert database.courses[1].title == "Python Basics"
+                database.delete_enrollment(1)
+                raise RuntimeError
+        assert database.users[1].is_active is True
+        assert database.get_user_enrollment_ids(1) == [1]
+        assert database.get_course_stats(1) == (1, 0, 1)
+        
+        with database.atomic("users"):
+            database.update_user(1, name="Kept")
+        assert database.users[1].name == "Kept"
+    
+    def test_restore_is_logged(self, tmp_path):
+        """Test that undone writes reach the write-ahead log, so a restart sees the restored state"""
+        database = DurableDatabase(str(tmp_path), fsync_interval=0, snapshot_interval=0)
+        database.checkpoint("start")
+        database.update_user(1, name="Alice Updated")
+        database.delete_enrollment(1)
+        database.restore("start")
+        database.close()
+        
+        restarted = DurableDatabase(str(tmp_path), fsync_interval=0, snapshot_interval=0)
+        assert restarted.users[1].name == "Alice"
+        assert restarted.get_user_enrollment_ids(1) == [1]
+        restarted.close()
+
 
 class TestRootEndpoints:
     def test_root_endpoint(self):
@@ -347,3 +1424,222 @@ class TestRootEndpoints:
         assert response.status_code == 200
         data = response.json()
         assert data["status"] == "healthy"
+
+    def test_metrics(self):
+        """Test request counts, latency histograms and collection gauges at /metrics"""
+        request_metrics.reset()
+        client.get("/enrollments/course/1")
+        client.get("/enrollments/course/1")
+        client.get("/enrollments/course/999")
+        client.get("/no-such-route")
+        client.post("/users/", json={"name": "Metered", "email": "metered@example.com"})
+        
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        samples = {}
+        for line in response.text.splitlines():
+            if not line.startswith("#"):
+                name, value = line.rsplit(" ", 1)
+                samples[name] = float(value)
+        
+        route = 'method="GET",route="/enrollments/course/{course_id}"'
+        assert samples[f'edutrack_http_requests_total{{{route},status="200"}}'] == 2
+        assert samples[f'edutrack_http_requests_total{{{route},status="404"}}'] == 1
+        assert samples[f'edutrack_http_requests_total{{method="GET",route="{UNMATCHED_ROUTE}",status="404"}}'] == 1
+        assert samples['edutrack_http_requests_total{method="POST",route="/users/",status="201"}'] == 1
+        
+        buckets = [value for name, value in samples.items()
+                   if name.startswith(f"edutrack_http_request_duration_seconds_bucket{{{route},")]
+        assert buckets == sorted(buckets) and buckets[-1] == 3
+        assert samples[f"edutrack_http_request_duration_seconds_count{{{route}}}"] == 3
+        assert samples[f"edutrack_http_request_duration_seconds_sum{{{route}}}"] > 0
+        
+        assert samples['edutrack_collection_size{collection="users"}'] == 2
+        assert samples['edutrack_collection_size{collection="courses"}'] == 1
+        assert samples['edutrack_collection_size{collection="enrollments"}'] == 1
+
+
+class TestProfiling:
+    @pytest.fixture
+    def profiled_client(self, tmp_path, monkeypatch):
+        """A client for an app with profiling enabled, serving course 1's learners and the profiles routes"""
+        profiler = RequestProfiler(str(tmp_path), token="secret", keep=2)
+        monkeypatch.setattr("services.profiling.request_profiler", profiler)
+        monkeypatch.setattr("routes.profiles.request_profiler", profiler)
+        router = APIRouter(route_class=ProfiledRoute)
+        
+        @router.get("/courses/{course_id}/enrolled-users")
+        def get_enrolled_users(course_id: int):
+            return CourseService.get_enrolled_users(course_id)
+        
+        profiled_app = FastAPI()
+        profiled_app.add_middleware(ProfilingMiddleware, profiler=profiler)
+        profiled_app.include_router(router)
+        profiled_app.include_router(profiles.router)
+        return TestClient(profiled_app)
+    
+    def test_profile_request(self, profiled_client):
+        """Test that a request carrying the token is profiled, listed and downloadable"""
+        assert profiled_client.get("/courses/1/enrolled-users").status_code == 200
+        assert profiled_client.get("/courses/1/enrolled-users", headers={PROFILE_HEADER: "wrong"}).status_code == 200
+        assert profiled_client.get("/profiles/").status_code == 403
+        assert profiled_client.get("/profiles/", headers={PROFILE_HEADER: "secret"}).json() == []
+        
+        response = profiled_client.get("/courses/1/enrolled-users", headers={PROFILE_HEADER: "secret"})
+        assert response.status_code == 200
+        listed = profiled_client.get("/profiles/", headers={PROFILE_HEADER: "secret"}).json()
+        assert len(listed) == 1
+        assert listed[0]["route"] == "/courses/{course_id}/enrolled-users"
+        assert listed[0]["path"] == "/courses/1/enrolled-users"
+        assert listed[0]["status"] == 200
+        assert listed[0]["trigger"] == "header"
+        
+        text = profiled_client.get(
+            f"/profiles/{listed[0]['id']}", params={"format": "text"}, headers={PROFILE_HEADER: "secret"}
+        )
+        # The endpoint ran in the threadpool; its service calls are in the profile
+        assert "course_service.py" in text.text
+        # So are the parsing of the request and the serialization of the response around it
+        assert "solve_dependencies" in text.text
+        assert "serialize_response" in text.text
+        download = profiled_client.get(f"/profiles/{listed[0]['id']}", headers={PROFILE_HEADER: "secret"})
+        assert download.status_code == 200 and download.content
+        assert profiled_client.get("/profiles/0000000000000-000000", headers={PROFILE_HEADER: "secret"}).status_code == 404
+        
+        # Only the newest `keep` profiles are kept
+        for _ in range(3):
+            profiled_client.get("/courses/1/enrolled-users", headers={PROFILE_HEADER: "secret"})
+        assert len(profiled_client.get("/profiles/", headers={PROFILE_HEADER: "secret"}).json()) == 2
+    
+    def test_profiling_disabled(self):
+        """Test that without a profile directory routes are not wrapped and profiles are not served"""
+        assert not any(hasattr(getattr(route, "endpoint", None), "profiled") for route in app.routes)
+        assert client.get("/courses/1/enrolled-users", headers={PROFILE_HEADER: "anything"}).status_code == 200
+        assert client.get("/profiles/").status_code == 404
+
+
+class TestScanCosts:
+    @pytest.fixture
+    def debug_client(self):
+        """A client for an app serving the debug routes, which the main app leaves out by default"""
+        debug_app = FastAPI()
+        debug_app.include_router(debug.router)
+        return TestClient(debug_app)
+    
+    def test_scan_costs(self, debug_client, caplog, monkeypatch):
+        """Test records examined and returned per service operation, and the warning for scans"""
+        debug_client.delete("/debug/scan-costs")
+        # Start from an empty enrollment view; rows of the example data may be kept from earlier tests
+        get_enrollment_view(db).reset()
+        for i in range(10):
+            user_id = client.post("/users/", json={"name": f"Scanned {i}", "email": f"scanned{i}@example.com"}).json()["id"]
+            client.post("/enrollments/", json={"user_id": user_id, "course_id": 1})
+        client.get("/enrollments/course/1")
+        client.get("/users/batch", params={"ids": "1,2,999"})
+        
+        # No enrollment is completed, so the filter walks all eleven and returns none
+        monkeypatch.setattr(scan_costs, "warn_examined", 10)
+        with caplog.at_level(logging.WARNING, logger="services.scan_cost"):
+            client.get("/enrollments/", params={"completed": True})
+        assert "Probable full scan: operation=EnrollmentService.get_all_enrollments examined=11 returned=0" in caplog.text
+        
+        costs = {cost["operation"]: cost for cost in debug_client.get("/debug/scan-costs").json()}
+        # The course, the eleven posting entries, and each enrollment, user and course read to build the rows
+        course_enrollments = costs["EnrollmentService.get_course_enrollments"]
+        assert (course_enrollments["calls"], course_enrollments["examined"], course_enrollments["returned"]) == (1, 35, 11)
+        assert course_enrollments["examined_per_returned"] == pytest.approx(35 / 11)
+        # One email index probe per user, not a walk over the users
+        assert costs["UserService.create_user"]["calls"] == 10
+        assert costs["UserService.create_user"]["examined"] == 10
+        # The user, the course and the (user, course) probe, then the user and
+        # the course again to update the course's counters and rankings
+        assert costs["EnrollmentService.enroll_user"]["examined"] == 50
+        assert costs["EnrollmentService.get_all_enrollments"]["examined_per_returned"] is None
+        # A batch returns its items
+        users_batch = costs["UserService.get_users"]
+        assert (users_batch["examined"], users_batch["returned"]) == (3, 2)
+        
+        assert debug_client.delete("/debug/scan-costs").status_code == 204
+        assert debug_client.get("/debug/scan-costs").json() == []
+    
+    @pytest.mark.parametrize("columnar", [False, True])
+    def test_walks_counted_by_storage(self, columnar):
+        """Test that walking a collection is counted by the storage, not by the code walking it"""
+        database = Database(columnar_enrollments=columnar)
+        
+        @accounted
+        def walk_enrollments():
+            return [enrollment for enrollment in database.enrollments.values() if enrollment.completed]
+        
+        scan_costs.reset()
+        completed = walk_enrollments()
+        cost, = scan_costs.snapshot()
+        assert (cost.examined, cost.returned) == (len(database.enrollments), len(completed))
+        # Outside a service operation nothing is counted
+        assert len(list(database.enrollments.values())) == len(database.enrollments)
+        assert scan_costs.snapshot()[0].examined == cost.examined
+    
+    def test_debug_endpoints_disabled(self):
+        """Test that the scan costs are not served unless EDUTRACK_DEBUG_ENDPOINTS is set"""
+        assert client.get("/debug/scan-costs").status_code == 404
+        assert client.delete("/debug/scan-costs").status_code == 404
+
+
+class TestBenchmarks:
+    def test_suite_covers_every_route(self, tmp_path):
+        """Test a tiny benchmark run: every route is measured and a baseline compares cleanly"""
+        from benchmarks import suite
+        output, baseline = tmp_path / "results.json", tmp_path / "baseline.json"
+        assert suite.main([
+            "--sizes", "100", "--repeat", "3", "--max-seconds", "0",
+            "--output", str(output), "--baseline", str(baseline), "--save-baseline"
+        ]) == 0
+        results = [suite.Result(**result) for result in json.loads(output.read_text())["results"]]
+        
+        measured = {result.name.split(" (")[0] for result in results}
+        for path, operations in app.openapi()["paths"].items():
+            for method in operations:
+                assert f"{method.upper()} {path}" in measured
+        assert "EnrollmentService.get_course_enrollments" in measured
+        assert all(result.iterations >= 3 and result.median_us > 0 for result in results)
+        
+        saved = json.loads(baseline.read_text())
+        assert suite.compare(results, saved) == ([], [])
+        for result in saved["results"]:
+            result["median_us"] /= 10
+        regressions, _ = suite.compare(results, saved, floor_us=0)
+        assert len(regressions) == len(results)
+        # The global database was swapped back
+        assert client.get("/users/1").json()["name"] == "Alice"
+
+    def test_load_generator(self):
+        """Test a short mixed-workload run against the in-process app"""
+        import asyncio
+        import httpx
+        from benchmarks.load import Workload, percentile, run_load
+        from benchmarks.seed import SeedSizes
+        
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://edutrack") as async_client:
+                return await run_load(
+                    async_client, workload, "user_enrollments=3,get_user=1,enroll=1,complete=1",
+                    concurrency=4, duration=None, total_requests=60
+                )
+        
+        workload = Workload(SeedSizes(users=1, courses=1, enrollments=1))
+        report = asyncio.run(run())
+        assert report["overall"]["requests"] == sum(route["requests"] for route in report["routes"]) == 60
+        routes = {route["route"]: route for route in report["routes"]}
+        reads = routes["GET /enrollments/user/{user_id}"]
+        assert reads["statuses"] == {"200": reads["requests"]}
+        # Alice is already enrolled in course 1
+        assert set(routes["POST /enrollments/"]["statuses"]) == {"400"}
+        overall = report["overall"]
+        assert 0 < overall["p50_ms"] <= overall["p95_ms"] <= overall["p99_ms"] <= overall["max_ms"]
+        
+        assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 2.0
+        assert percentile([1.0, 2.0, 3.0, 4.0], 0.99) == 4.0
+        with pytest.raises(ValueError):
+            workload.parse_mix("user_enrollments=1,teleport=2")